@@ -0,0 +1,46 @@
+'''
+Compare transfer sizes of pages and static assets with and without
+compression.
+
+    flask assets build
+    python -m benchmarks.compression
+'''
+from flaskr import app
+from flaskr.assets import asset_url
+
+PAGES = ['/', '/venues', '/artists', '/shows']
+ASSETS = [
+    'css/bootstrap.min.css',
+    'css/main.css',
+    'js/libs/moment.min.js',
+    'js/libs/modernizr-2.8.2.min.js',
+    'js/script.js',
+]
+
+
+def fetch(client, path, encoding):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    res = client.get(path, headers=headers)
+    return len(res.get_data()), res.headers.get('Content-Encoding', 'identity')
+
+
+def report(client, label, path):
+    raw, _ = fetch(client, path, None)
+    gzipped, gzip_encoding = fetch(client, path, 'gzip')
+    brotlied, br_encoding = fetch(client, path, 'br, gzip')
+    print(f'{label:32} {raw:9} | {gzip_encoding:8} {gzipped:8} '
+          f'({1 - gzipped / raw:4.0%}) | {br_encoding:8} {brotlied:8} '
+          f'({1 - brotlied / raw:4.0%})')
+    return raw, gzipped, brotlied
+
+
+if __name__ == '__main__':
+    app.config['SQLALCHEMY_ECHO'] = False
+    client = app.test_client()
+    totals = [0, 0, 0]
+    with app.test_request_context():
+        asset_paths = [(name, asset_url(name)) for name in ASSETS]
+    for label, path in [(page, page) for page in PAGES] + asset_paths:
+        for i, size in enumerate(report(client, label, path)):
+            totals[i] += size
+    print(f'{"total":32} {totals[0]:9} | gzip {totals[1]} | best {totals[2]}')
@@ -0,0 +1,80 @@
+'''
+Measure throughput of the listing and search pages under concurrent load.
+
+Start the app (e.g. `flask run --with-threads` or gunicorn) and run:
+
+    python -m benchmarks.concurrency --base-url http://localhost:5000 -c 100
+
+Run it once against the previous revision and once against the current one
+to compare requests/sec for the same endpoints.
+
+To compare the sync handlers with the async read path (flaskr/asgi.py),
+start that too, with as many worker processes, and pass its url:
+
+    gunicorn wsgi:app --bind :8000 --workers 4
+    uvicorn flaskr.asgi:application --port 8001 --workers 4
+    python -m benchmarks.concurrency --base-url http://localhost:8000 \
+        --async-url http://localhost:8001 -c 100
+'''
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+ENDPOINTS = [
+    ('GET', '/', None),
+    ('GET', '/venues', None),
+    ('GET', '/artists', None),
+    ('GET', '/shows', None),
+    ('POST', '/venues/search', {'search_term': 'a'}),
+    ('POST', '/artists/search', {'search_term': 'a'}),
+]
+
+
+def hit(base_url, method, path, form):
+    '''Issue a single request, returning (latency, ok)'''
+    data = urlencode(form).encode() if form else None
+    req = Request(base_url + path, data=data, method=method)
+    start = time.perf_counter()
+    try:
+        with urlopen(req, timeout=30) as res:
+            res.read()
+            ok = res.status == 200
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run(label, base_url, method, path, form, concurrency, total):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(
+            lambda _: hit(base_url, method, path, form), range(total)))
+        elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    errors = len([ok for _, ok in results if not ok])
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f'{label:5} {method:4} {path:18} {total / elapsed:8.1f} req/s  '
+          f'p50 {p50 * 1000:7.1f}ms  p99 {p99 * 1000:7.1f}ms  errors {errors}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--async-url',
+                        help='the async read path, run alongside base-url')
+    parser.add_argument('-c', '--concurrency', type=int, default=100)
+    parser.add_argument('-n', '--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f'{args.concurrency} concurrent clients, '
+          f'{args.requests} requests per endpoint')
+    targets = [('sync', args.base_url)]
+    if args.async_url:
+        targets.append(('async', args.async_url))
+    for method, path, form in ENDPOINTS:
+        for label, base_url in targets:
+            run(label, base_url, method, path, form,
+                args.concurrency, args.requests)
@@ -0,0 +1,48 @@
+'''
+Time genre-based lookups against the configured database.
+
+    python -m benchmarks.genre_lookups
+
+Run before and after upgrading past the genre association keys migration
+to compare. On postgres the query plan of each lookup is printed too.
+'''
+import time
+from sqlalchemy import text
+from flaskr import app
+from flaskr.db import db
+
+LOOKUPS = {
+    'venue ids of a genre':
+        'SELECT venue_id FROM venue_genres WHERE genre_id = :genre_id',
+    'artist ids of a genre':
+        'SELECT artist_id FROM artist_genres WHERE genre_id = :genre_id',
+    'venues of a genre':
+        'SELECT v.id, v.name FROM "Venue" v '
+        'JOIN venue_genres vg ON vg.venue_id = v.id '
+        'WHERE vg.genre_id = :genre_id',
+    'genres of a venue':
+        'SELECT genre_id FROM venue_genres WHERE venue_id = :entity_id',
+}
+
+
+if __name__ == '__main__':
+    app.config['SQLALCHEMY_ECHO'] = False
+    with app.app_context():
+        genre_ids = [row[0] for row in db.session.execute(
+            text('SELECT id FROM "Genre" ORDER BY id'))]
+        is_postgres = db.engine.dialect.name == 'postgresql'
+        for label, sql in LOOKUPS.items():
+            params = [{'genre_id': genre_id, 'entity_id': genre_id}
+                      for genre_id in genre_ids] * 50
+            start = time.perf_counter()
+            for param in params:
+                db.session.execute(text(sql), param).fetchall()
+            elapsed = time.perf_counter() - start
+            print(f'{label:24} {len(params)} lookups  '
+                  f'{elapsed / max(len(params), 1) * 1000:.3f}ms each')
+            if is_postgres and params:
+                plan = db.session.execute(
+                    text(f'EXPLAIN {sql}'), params[0]).fetchall()
+                for (line,) in plan:
+                    print(f'    {line}')
+        db.session.remove()
@@ -0,0 +1,57 @@
+'''
+Time top-N venue matching over a synthetic candidate index.
+
+    python -m benchmarks.matching --candidates 100000
+'''
+import argparse
+import time
+import numpy as np
+from flaskr import app
+from flaskr.enums import State
+from flaskr.matching import CandidateIndex
+
+CITIES = ['Springfield', 'Riverside', 'Franklin', 'Greenville', 'Bristol',
+          'Clinton', 'Fairview', 'Salem', 'Madison', 'Georgetown']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--candidates', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    states = [state.value for state in State]
+    n = args.candidates
+
+    start = time.perf_counter()
+    # ~3 of 20 genres per candidate
+    genre_masks = np.zeros(n, dtype=np.uint64)
+    for _ in range(3):
+        genre_masks |= np.uint64(1) << rng.integers(
+            0, 20, n).astype(np.uint64)
+    index = CandidateIndex(
+        ids=np.arange(1, n + 1),
+        names=[f'Venue {i}' for i in range(n)],
+        cities=rng.choice(CITIES, n),
+        states=rng.choice(states, n),
+        genre_masks=genre_masks,
+        recent_shows=rng.poisson(2, n),
+    )
+    print(f'built index of {n} candidates in '
+          f'{(time.perf_counter() - start) * 1000:.1f}ms')
+
+    timings = []
+    with app.app_context():
+        for _ in range(args.queries):
+            mask = int(genre_masks[rng.integers(0, n)])
+            city, state = rng.choice(CITIES), rng.choice(states)
+            start = time.perf_counter()
+            index.top(mask, city, state, args.limit)
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    print(f'top-{args.limit} over {n} candidates: '
+          f'p50 {timings[len(timings) // 2] * 1000:.2f}ms  '
+          f'p99 {timings[int(len(timings) * 0.99)] * 1000:.2f}ms')
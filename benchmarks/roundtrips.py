@@ -0,0 +1,40 @@
+'''
+Count the SQL statements each page issues against the configured database,
+and how many of them were served from the compiled statement cache.
+
+    python -m benchmarks.roundtrips
+
+Uses the X-SQL-* headers, which the app adds in debug mode. Every route is
+requested twice: the first pass fills the statement cache.
+'''
+from flaskr import app
+
+ROUTES = [
+    ('GET', '/', None),
+    ('GET', '/venues', None),
+    ('GET', '/artists', None),
+    ('GET', '/shows', None),
+    ('GET', '/venues/1', None),
+    ('GET', '/artists/1', None),
+    ('GET', '/venues/1/edit', None),
+    ('GET', '/artists/1/edit', None),
+    ('POST', '/venues/search', {'search_term': 'a'}),
+    ('POST', '/artists/search', {'search_term': 'a'}),
+]
+
+
+if __name__ == '__main__':
+    app.debug = True
+    app.config['SQLALCHEMY_ECHO'] = False
+    client = app.test_client()
+    for run in ('cold', 'warm'):
+        print(run)
+        for method, path, form in ROUTES:
+            res = client.open(path, method=method, data=form)
+            statements = res.headers.get('X-SQL-Statements', '?')
+            cache_hits = res.headers.get('X-SQL-Cache-Hits', '?')
+            saved = res.headers.get('X-SQL-Compile-Saved', '?')
+            print(f'  {method:4} {path:18} {res.status_code}  '
+                  f'{statements} statements  {cache_hits} cached  '
+                  f'{saved} compile saved')
+    print('hit rate', res.headers.get('X-SQL-Cache-Hit-Rate'))
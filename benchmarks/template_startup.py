@@ -0,0 +1,46 @@
+'''
+First-load latency of each template in a freshly started worker, compiling
+from source versus loading from the bytecode cache.
+
+    python -m benchmarks.template_startup
+
+Each mode runs in a new process, as a new worker would.
+'''
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+WORKER = '''
+import json, time
+from flaskr import app
+timings = {}
+for name in app.jinja_env.list_templates():
+    start = time.perf_counter()
+    app.jinja_env.get_template(name)
+    timings[name] = time.perf_counter() - start
+print(json.dumps(timings))
+'''
+
+
+def fresh_worker(cache_dir):
+    env = dict(os.environ, TEMPLATE_BYTECODE_CACHE_DIR=cache_dir)
+    output = subprocess.run([sys.executable, '-c', WORKER], env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as cache_dir:
+        compiled = fresh_worker('')
+        # the first cached run fills the cache, like `flask templates compile`
+        fresh_worker(cache_dir)
+        cached = fresh_worker(cache_dir)
+
+    print(f'{"template":35} {"compile":>9} {"cached":>9}')
+    for name in sorted(compiled):
+        print(f'{name:35} {compiled[name] * 1000:7.2f}ms '
+              f'{cached[name] * 1000:7.2f}ms')
+    print(f'{"total":35} {sum(compiled.values()) * 1000:7.2f}ms '
+          f'{sum(cached.values()) * 1000:7.2f}ms')
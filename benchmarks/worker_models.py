@@ -0,0 +1,130 @@
+'''
+Memory and throughput of the app under gunicorn with different worker
+models: sync vs threaded workers, with and without preloading the app.
+
+    python -m benchmarks.worker_models --workers 4 --threads 4
+
+Each model is started in turn from gunicorn.conf.py (pointing at the
+configured database), loaded with concurrent requests for --duration
+seconds, and then measured. Memory is read from /proc, so Linux only:
+RSS counts pages shared copy-on-write with the master once per process,
+PSS splits them between the processes sharing them.
+'''
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from urllib.error import HTTPError
+from urllib.request import urlopen
+from benchmarks.concurrency import ENDPOINTS, hit
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def children(pid):
+    found = []
+    for task in os.listdir(f'/proc/{pid}/task'):
+        with open(f'/proc/{pid}/task/{task}/children') as f:
+            found.extend(int(child) for child in f.read().split())
+    return found
+
+
+def memory_kb(pid, field):
+    '''A field of /proc/<pid>/smaps_rollup (Rss, Pss, ...) in kB'''
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+    return 0
+
+
+def wait_until_up(base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urlopen(base_url + '/', timeout=5):
+                return
+        except HTTPError:
+            # serving, if unhappy; the errors show up in the results
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f'{base_url} did not come up')
+
+
+def load(base_url, concurrency, duration):
+    '''Requests/sec and error count with `concurrency` clients'''
+    requests = cycle(ENDPOINTS)
+    deadline = time.monotonic() + duration
+
+    def client(_):
+        done = errors = 0
+        while time.monotonic() < deadline:
+            method, path, form = next(requests)
+            _, ok = hit(base_url, method, path, form)
+            done += 1
+            errors += not ok
+        return done, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return (sum(done for done, _ in results) / elapsed,
+            sum(errors for _, errors in results))
+
+
+def run(name, worker_class, workers, threads, preload, args):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ,
+               GUNICORN_BIND=f'127.0.0.1:{port}',
+               WEB_CONCURRENCY=str(workers),
+               GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_THREADS=str(threads),
+               GUNICORN_PRELOAD='1' if preload else '0')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'wsgi:app'], env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(base_url)
+        # let every worker import, compile and connect before measuring
+        load(base_url, args.concurrency, 2)
+        throughput, errors = load(base_url, args.concurrency, args.duration)
+        pids = [server.pid] + children(server.pid)
+        rss = sum(memory_kb(pid, 'Rss') for pid in pids)
+        pss = sum(memory_kb(pid, 'Pss') for pid in pids)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    print(f'{name:24} {throughput:8.1f} req/s  errors {errors:<5} '
+          f'rss {rss / 1024:7.1f}MB  pss {pss / 1024:7.1f}MB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('-c', '--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15)
+    args = parser.parse_args()
+
+    models = [
+        ('sync', 'sync', args.workers, 1, False),
+        ('sync, preload', 'sync', args.workers, 1, True),
+        ('gthread', 'gthread', args.workers, args.threads, False),
+        ('gthread, preload', 'gthread', args.workers, args.threads, True),
+    ]
+    print(f'{args.workers} workers, {args.threads} threads per gthread '
+          f'worker, {args.concurrency} clients for {args.duration:g}s')
+    for model in models:
+        run(*model, args)
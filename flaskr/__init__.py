@@ -1,14 +1,32 @@
 from flask import flash, render_template
-import logging
-from logging import Formatter, FileHandler
 from flaskr.forms import *
 from flaskr.app import app
 from flaskr.db import db
+import flaskr.logs
 import flaskr.filters
+import flaskr.templating
+import flaskr.assets
+import flaskr.compress
+import flaskr.profiler
+import flaskr.recommendations
+import flaskr.archive
+import flaskr.show_search
+import flaskr.changes
+import flaskr.listing
+import flaskr.dedup
+import flaskr.deletion
+import flaskr.autocomplete
+import flaskr.plans
 import flaskr.controllers.venues
 import flaskr.controllers.artists
 import flaskr.controllers.shows
-from flaskr.models import Venue, Artist
+import flaskr.controllers.images
+import flaskr.controllers.exports
+import flaskr.controllers.matches
+import flaskr.controllers.autocomplete
+import flaskr.controllers.changes
+from flaskr import queries
+from flaskr.logs import configure_logging, log_error
 
 
 @app.route('/')
@@ -17,17 +35,13 @@ def index():
     recent_artists = []
     try:
         # show latest venues/artists, most recent first
-        recent_venues = Venue.query.order_by(
-            Venue.created_at.desc()).limit(10).all()
-        recent_artists = Artist.query.order_by(
-            Artist.created_at.desc()).limit(10).all()
+        recent_venues = queries.recent_venues(10)
+        recent_artists = queries.recent_artists(10)
     except Exception as e:
-        print(f'Error [GET] / - {e}')
+        log_error(f'Error [GET] / - {e}')
         # still render the page even if the items can't be fetched
         # but flash an error letting the user know
         flash("Couldn't get recent venues or artists. Refresh or try again later.")
-    finally:
-        db.session.close()
     return render_template('pages/home.html', recent_venues=recent_venues, recent_artists=recent_artists)
 
 
@@ -42,15 +56,7 @@ def server_error(error):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+    configure_logging()
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -0,0 +1,249 @@
+import re
+import time
+import click
+import pytz
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, text, union_all
+from flaskr.app import app
+from flaskr.db import db
+from flaskr.listing import remove_listings
+from flaskr.models import Artist, Show, ShowArchive, ShowListing, Venue
+
+#----------------------------------------------------------------------------#
+# Show history.
+#----------------------------------------------------------------------------#
+
+# On postgres `Show` is partitioned by month of start_time, so queries for a
+# time range only touch the months they cover. Partitions are created ahead
+# of time (`flask shows partitions`); anything outside them lands in the
+# default partition. Shows older than the retention window are moved to the
+# narrower `ShowArchive` table (`flask shows archive`), after which the
+# emptied monthly partitions are dropped. Detail pages list recent past
+# shows and page through the rest, live and archived, on demand.
+
+PARTITION_NAME = re.compile(r'^Show_y(\d{4})m(\d{2})$')
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=pytz.utc)
+
+
+def next_month(month):
+    return month_start(month + timedelta(days=32))
+
+
+def partition_name(month):
+    return f'Show_y{month.year:04d}m{month.month:02d}'
+
+
+def is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def create_partition(month):
+    '''
+    Add the partition for a month, moving any of its rows out of the
+    default partition (postgres won't attach it while they're there)
+    '''
+    name = partition_name(month)
+    bounds = {'start': month, 'end': next_month(month)}
+    db.session.execute(text(
+        f'CREATE TABLE "{name}" '
+        '(LIKE "Show" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    db.session.execute(text(f'''
+        WITH moved AS (
+            DELETE FROM "Show_default"
+            WHERE start_time >= :start AND start_time < :end
+            RETURNING *
+        )
+        INSERT INTO "{name}" SELECT * FROM moved
+    '''), bounds)
+    start, end = (value.isoformat() for value in bounds.values())
+    db.session.execute(text(
+        f'ALTER TABLE "Show" ATTACH PARTITION "{name}" '
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"))
+
+
+def existing_partitions():
+    return set(db.session.execute(text('''
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = '"Show"'::regclass
+    ''')).scalars())
+
+
+def create_partitions(start, months):
+    '''Create missing monthly partitions from start's month on'''
+    existing = existing_partitions()
+    created = []
+    month = month_start(start)
+    for _ in range(months):
+        if partition_name(month) not in existing:
+            create_partition(month)
+            # one short transaction per partition
+            db.session.commit()
+            created.append(partition_name(month))
+        month = next_month(month)
+    return created
+
+
+def drop_archived_partitions(cutoff):
+    '''Drop monthly partitions that ended before cutoff and are empty'''
+    dropped = []
+    for name in sorted(existing_partitions()):
+        match = PARTITION_NAME.match(name)
+        if not match:
+            continue
+        month = datetime(int(match.group(1)), int(match.group(2)), 1,
+                         tzinfo=pytz.utc)
+        if next_month(month) > cutoff:
+            continue
+        if db.session.execute(text(f'SELECT 1 FROM "{name}" LIMIT 1')).first():
+            continue
+        db.session.execute(text(f'DROP TABLE "{name}"'))
+        db.session.commit()
+        dropped.append(name)
+    return dropped
+
+
+#  Archival
+#  ----------------------------------------------------------------
+
+
+def archive_shows(cutoff, batch_size):
+    '''Move shows starting before cutoff to the archive, yielding progress'''
+    total = 0
+    while True:
+        ids = db.session.execute(select(Show.id).where(
+            Show.start_time < cutoff).order_by(Show.start_time).limit(
+            batch_size)).scalars().all()
+        if not ids:
+            break
+        db.session.execute(insert(ShowArchive).from_select(
+            ['id', 'artist_id', 'venue_id', 'start_time', 'end_time'],
+            select(Show.id, Show.artist_id, Show.venue_id,
+                   Show.start_time, Show.end_time).where(
+                Show.id.in_(ids), Show.start_time < cutoff)))
+        # the start_time bound lets postgres prune to the old partitions
+        db.session.execute(delete(Show).where(
+            Show.id.in_(ids), Show.start_time < cutoff))
+        remove_listings(db.session.connection(), ids)
+        db.session.commit()
+        total += len(ids)
+        yield total
+
+
+@app.cli.group()
+def shows():
+    '''Show partitions and archival.'''
+
+
+@shows.command('partitions')
+@click.option('--months', type=int,
+              default=lambda: app.config['SHOW_PARTITION_MONTHS_AHEAD'],
+              help='Months ahead to create partitions for.')
+def partitions_command(months):
+    '''Create the monthly Show partitions for the coming months.'''
+    if not is_postgres():
+        click.echo('Show is only partitioned on postgres, nothing to do.')
+        return
+    try:
+        created = create_partitions(datetime.now(pytz.utc), months)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
+    click.echo(f'Created {len(created)} partitions'
+               + (f': {", ".join(created)}' if created else ''))
+
+
+@shows.command('archive')
+@click.option('--days', type=int,
+              default=lambda: app.config['SHOW_RETENTION_DAYS'],
+              help='Archive shows that started more than this many days ago.')
+@click.option('--batch-size', type=int,
+              default=lambda: app.config['SHOW_ARCHIVE_BATCH'])
+def archive_command(days, batch_size):
+    '''Move old shows to the archive table.'''
+    cutoff = datetime.now(pytz.utc) - timedelta(days=days)
+    start = time.perf_counter()
+    moved = 0
+    try:
+        for moved in archive_shows(cutoff, batch_size):
+            click.echo(f'\rArchived {moved} shows', nl=False)
+        click.echo(f'\rArchived {moved} shows older than {cutoff:%Y-%m-%d} '
+                   f'in {time.perf_counter() - start:.1f}s')
+        if is_postgres():
+            dropped = drop_archived_partitions(month_start(cutoff))
+            click.echo(f'Dropped {len(dropped)} emptied partitions')
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
+
+
+#  Listing
+#  ----------------------------------------------------------------
+
+
+LISTING_COLUMNS = (
+    ShowListing.id,
+    ShowListing.start_time,
+    ShowListing.artist_id,
+    ShowListing.artist_name,
+    ShowListing.artist_image_link,
+    ShowListing.venue_id,
+    ShowListing.venue_name,
+    ShowListing.venue_image_link,
+)
+
+
+def archived_listings():
+    '''Archived shows with the same columns as their live listings'''
+    return select(
+        ShowArchive.id,
+        ShowArchive.start_time,
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+    ).join(Artist, Artist.id == ShowArchive.artist_id).join(
+        Venue, Venue.id == ShowArchive.venue_id).where(
+        Artist.deleted_at.is_(None), Venue.deleted_at.is_(None))
+
+
+def upcoming_shows(entity_key, entity_id, now):
+    '''Upcoming shows of a venue or artist (entity_key 'venue_id' or
+    'artist_id'), soonest first'''
+    return db.session.execute(select(*LISTING_COLUMNS).where(
+        getattr(ShowListing, entity_key) == entity_id,
+        ShowListing.start_time >= now).order_by(
+        ShowListing.start_time)).all()
+
+
+def past_shows_subquery(entity_key, entity_id, now):
+    return union_all(
+        select(*LISTING_COLUMNS).where(
+            getattr(ShowListing, entity_key) == entity_id,
+            ShowListing.end_time <= now),
+        archived_listings().where(
+            getattr(ShowArchive, entity_key) == entity_id),
+    ).subquery()
+
+
+def past_shows(entity_key, entity_id, now, limit, offset=0):
+    '''A page of past shows, live and archived, most recent first'''
+    shows = past_shows_subquery(entity_key, entity_id, now)
+    return db.session.execute(select(shows).order_by(
+        shows.c.start_time.desc(), shows.c.id.desc()).limit(
+        limit).offset(offset)).all()
+
+
+def past_show_count(entity_key, entity_id, now):
+    shows = past_shows_subquery(entity_key, entity_id, now)
+    return db.session.execute(
+        select(func.count()).select_from(shows)).scalar()
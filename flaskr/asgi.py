@@ -0,0 +1,192 @@
+from datetime import datetime
+from urllib.parse import parse_qs
+import pytz
+from flask import render_template
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from flaskr.app import app
+from flaskr.cache import AsyncResultCache
+from flaskr.logs import log_error
+from flaskr import queries
+
+#----------------------------------------------------------------------------#
+# Async read path.
+#----------------------------------------------------------------------------#
+
+# The listing and search pages, served again by a small ASGI app on
+# SQLAlchemy's AsyncSession, so a slow query waits on the event loop rather
+# than pinning a worker thread. Flask 1.1 can't await in a view, hence a
+# separate app (`uvicorn flaskr.asgi:application`) that the proxy routes
+# these paths to (see README); everything else, writes included, stays on
+# the Flask app. It runs the same statements as the sync handlers and
+# renders the same templates, its connections read only.
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+_engine = None
+
+# per process like the sync ones, and only expired by age: writes go
+# through the Flask app
+search_caches = {
+    kind: AsyncResultCache(app.config['SEARCH_CACHE_SIZE'],
+                           app.config['SEARCH_CACHE_TTL'])
+    for kind in queries.SEARCHES
+}
+
+
+def async_database_uri(uri):
+    url = make_url(uri)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            async_database_uri(app.config['SQLALCHEMY_DATABASE_URI']),
+            **app.config['ASYNC_ENGINE_OPTIONS'])
+    return _engine
+
+
+async def dispose_engine():
+    global _engine
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+
+
+#  Pages
+#  ----------------------------------------------------------------
+#  Each takes the session and the parsed form, returning the template and
+#  its context.
+
+
+async def index(session, form):
+    recent_venues = await session.execute(queries.recent_venues_stmt(10))
+    recent_artists = await session.execute(queries.recent_artists_stmt(10))
+    return 'pages/home.html', {'recent_venues': recent_venues.all(),
+                               'recent_artists': recent_artists.all()}
+
+
+async def venues(session, form):
+    all_venues = await session.execute(
+        queries.venue_listing_stmt(datetime.now(pytz.utc)))
+    return 'pages/venues.html', {
+        'areas': queries.venue_areas(all_venues.all())}
+
+
+async def artists(session, form):
+    artists = await session.execute(queries.list_artists_stmt())
+    return 'pages/artists.html', {'artists': artists.all()}
+
+
+async def shows(session, form):
+    shows = await session.execute(queries.show_listing_stmt())
+    return 'pages/shows.html', {'shows': shows.all()}
+
+
+def form_ints(form, name):
+    # like request.form.getlist(name, type=int), skipping what isn't one
+    values = []
+    for value in form.get(name, []):
+        try:
+            values.append(int(value))
+        except ValueError:
+            pass
+    return values
+
+
+async def search(kind, session, form):
+    search_term = form.get('search_term', [''])[0]
+    key = queries.search_key(search_term, form_ints(form, 'genres'),
+                             form.get('genre_match', [''])[0] == 'all')
+    stmt = queries.SEARCHES[kind][1](*key)
+
+    async def run():
+        return tuple((await session.execute(stmt)).all())
+
+    data = await search_caches[kind].get(key, run)
+    return f'pages/search_{kind}.html', {
+        'results': {'count': len(data), 'data': data},
+        'search_term': search_term}
+
+
+async def search_venues(session, form):
+    return await search('venues', session, form)
+
+
+async def search_artists(session, form):
+    return await search('artists', session, form)
+
+
+ROUTES = {
+    ('GET', '/'): index,
+    ('GET', '/venues'): venues,
+    ('GET', '/artists'): artists,
+    ('GET', '/shows'): shows,
+    ('POST', '/venues/search'): search_venues,
+    ('POST', '/artists/search'): search_artists,
+}
+
+
+#  ASGI
+#  ----------------------------------------------------------------
+
+
+def render(method, path, template, context):
+    # synchronous, so concurrent requests never share the pushed context
+    with app.test_request_context(path, method=method):
+        return render_template(template, **context)
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def send_page(send, status, html):
+    body = html.encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/html; charset=utf-8'),
+                            (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await dispose_engine()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    method, path = scope['method'], scope['path']
+    page = ROUTES.get((method, path))
+    if page is None:
+        await send_page(send, 404, render(
+            method, path, 'errors/404.html', {}))
+        return
+
+    form = parse_qs((await read_body(receive)).decode('utf-8'))
+    try:
+        async with AsyncSession(get_engine()) as session:
+            template, context = await page(session, form)
+        status = 200
+    except Exception as e:
+        log_error(f'Error - [{method}] {path} (async) - {e}')
+        template, context, status = 'errors/500.html', {}, 500
+    await send_page(send, status, render(method, path, template, context))
@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import brotli
+import click
+from flask import request, send_from_directory, url_for
+from flaskr.app import app
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+
+# `flask assets build` copies css/js into static/dist under content-hashed
+# names, alongside .gz/.br precompressed variants and a manifest mapping the
+# original paths to the hashed ones. Templates link assets via asset_url(),
+# which falls back to the plain static url when an asset hasn't been built.
+
+ASSET_DIRS = ('css', 'js')
+ASSET_EXTENSIONS = ('.css', '.js', '.map', '.svg')
+PRECOMPRESSED = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+_manifest = None
+
+
+def dist_dir():
+    return os.path.join(app.static_folder, app.config['ASSETS_DIST_DIR'])
+
+
+def load_manifest():
+    global _manifest
+    if _manifest is None or app.debug:
+        try:
+            with open(os.path.join(dist_dir(), 'manifest.json')) as f:
+                _manifest = json.load(f)
+        except FileNotFoundError:
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(filename):
+    '''Url of the fingerprinted build of a static file, if there is one'''
+    hashed = load_manifest().get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=hashed)
+
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+
+@app.route('/assets/<path:filename>', methods=['GET'])
+def asset(filename):
+    directory = dist_dir()
+    if filename not in load_manifest().values() or \
+            not os.path.isfile(os.path.join(directory, filename)):
+        # relative references from built css (e.g. ../fonts/*) land here;
+        # not fingerprinted, so cached like any static file and revalidated
+        # by ETag
+        return send_from_directory(app.static_folder, filename)
+
+    accepted = request.accept_encodings
+    for encoding, suffix in PRECOMPRESSED:
+        if accepted[encoding] and \
+                os.path.isfile(os.path.join(directory, filename + suffix)):
+            response = send_from_directory(directory, filename + suffix)
+            # keep the original type rather than application/gzip etc.
+            response.mimetype = mimetypes.guess_type(filename)[0] or \
+                'application/octet-stream'
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename)
+
+    # the name changes with the content, so it can be cached forever
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['ASSETS_MAX_AGE']
+    response.headers['Cache-Control'] += ', immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def fingerprint(relative_path, data):
+    digest = hashlib.md5(data).hexdigest()[:12]
+    root, ext = os.path.splitext(relative_path)
+    return f'{root}.{digest}{ext}'
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@app.cli.group()
+def assets():
+    '''Static asset pipeline.'''
+
+
+@assets.command('build')
+def build_assets():
+    '''Fingerprint and precompress css/js into the dist directory.'''
+    global _manifest
+    shutil.rmtree(dist_dir(), ignore_errors=True)
+    manifest = {}
+    totals = {'raw': 0, 'gzip': 0, 'br': 0}
+    for asset_dir in ASSET_DIRS:
+        for root, _, files in os.walk(os.path.join(app.static_folder, asset_dir)):
+            for name in sorted(files):
+                if not name.endswith(ASSET_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                relative_path = os.path.relpath(
+                    path, app.static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+
+                hashed = fingerprint(relative_path, data)
+                target = os.path.join(dist_dir(), hashed)
+                gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+                brotlied = brotli.compress(data, quality=11)
+                write_file(target, data)
+                write_file(target + '.gz', gzipped)
+                write_file(target + '.br', brotlied)
+                manifest[relative_path] = hashed
+
+                totals['raw'] += len(data)
+                totals['gzip'] += len(gzipped)
+                totals['br'] += len(brotlied)
+                click.echo(f'{relative_path:45} {len(data):9} '
+                           f'gzip {len(gzipped):8} br {len(brotlied):8}')
+
+    write_file(os.path.join(dist_dir(), 'manifest.json'),
+               json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    _manifest = manifest
+
+    raw = totals['raw'] or 1
+    click.echo(f'{len(manifest)} assets, {totals["raw"]} bytes -> '
+               f'gzip {totals["gzip"]} ({1 - totals["gzip"] / raw:.0%} saved), '
+               f'br {totals["br"]} ({1 - totals["br"] / raw:.0%} saved)')
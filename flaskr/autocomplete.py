@@ -0,0 +1,154 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from flaskr.app import app
+from flaskr.db import db
+from flaskr.hooks import changes_for, on_commit
+from flaskr.models import Artist, Venue
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# Names are kept in a sorted array of (key, id) entries, one per word of the
+# normalized name, so "the musical hop" is found by "mus" and "hop" as well.
+# A prefix lookup is a bisect to the first candidate and a short scan from
+# there. Entries are added/removed as venues and artists are written, and
+# the whole index is rebuilt every so often to pick up writes made by other
+# processes.
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize(text):
+    '''Casefolded words without accents or punctuation'''
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+class PrefixIndex:
+    '''Sorted word-prefix entries over the names of one kind of entity'''
+
+    def __init__(self, rows):
+        self.names = {}
+        self.entries = []
+        # the whole-name entries again, so name-start matches are found
+        # however many mid-name words sort before them
+        self.starts = []
+        self.lock = threading.Lock()
+        for entity_id, name in rows:
+            self.names[entity_id] = name
+            self.entries.extend(self.keys(entity_id, name))
+            self.starts.append(self.start_key(entity_id, name))
+        self.entries.sort()
+        self.starts.sort()
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.names)
+
+    def words(self, name):
+        # cap words per name and key length, bounding memory per entity
+        return normalize(name).split(' ')[:app.config['AUTOCOMPLETE_MAX_WORDS']]
+
+    def keys(self, entity_id, name):
+        words = self.words(name)
+        key_length = app.config['AUTOCOMPLETE_KEY_LENGTH']
+        return {(' '.join(words[i:])[:key_length], entity_id)
+                for i in range(len(words)) if words[i]}
+
+    def start_key(self, entity_id, name):
+        key_length = app.config['AUTOCOMPLETE_KEY_LENGTH']
+        return (' '.join(self.words(name))[:key_length], entity_id)
+
+    def add(self, entity_id, name):
+        with self.lock:
+            self._remove(entity_id)
+            self.names[entity_id] = name
+            for entry in self.keys(entity_id, name):
+                insort(self.entries, entry)
+            insort(self.starts, self.start_key(entity_id, name))
+
+    def remove(self, entity_id):
+        with self.lock:
+            self._remove(entity_id)
+
+    def _remove(self, entity_id):
+        name = self.names.pop(entity_id, None)
+        if name is None:
+            return
+        for entries, keys in ((self.entries, self.keys(entity_id, name)),
+                              (self.starts, [self.start_key(entity_id, name)])):
+            for entry in keys:
+                i = bisect_left(entries, entry)
+                if i < len(entries) and entries[i] == entry:
+                    del entries[i]
+
+    def search(self, prefix, limit):
+        '''Up to `limit` (id, name) pairs, names starting with prefix first'''
+        prefix = normalize(prefix)[:app.config['AUTOCOMPLETE_KEY_LENGTH']]
+        if not prefix:
+            return []
+        # look a little past `limit` so whole-name matches can rank first
+        scan = limit * 4
+        found = {}
+        with self.lock:
+            # names starting with the prefix, then names with a later word
+            # starting with it
+            for entries in (self.starts, self.entries):
+                i = bisect_left(entries, (prefix,))
+                while i < len(entries) and len(found) < scan:
+                    key, entity_id = entries[i]
+                    if not key.startswith(prefix):
+                        break
+                    found.setdefault(entity_id, self.names[entity_id])
+                    i += 1
+        ranked = sorted(found.items(), key=lambda item: (
+            not normalize(item[1]).startswith(prefix), len(item[1]), item[1]))
+        return ranked[:limit]
+
+
+INDEX_SOURCES = {
+    'venues': Venue,
+    'artists': Artist,
+}
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(kind):
+    '''Cached prefix index, rebuilt once it's older than the ttl'''
+    index = _indexes.get(kind)
+    ttl = app.config['AUTOCOMPLETE_INDEX_TTL']
+    if index is None or time.monotonic() - index.built_at > ttl:
+        with _indexes_lock:
+            index = _indexes.get(kind)
+            if index is None or time.monotonic() - index.built_at > ttl:
+                model = INDEX_SOURCES[kind]
+                index = _indexes[kind] = PrefixIndex(
+                    db.session.query(model.id, model.name).filter(
+                        model.deleted_at.is_(None)).all())
+    return index
+
+
+@on_commit
+def update_indexes(changes):
+    for kind, model in INDEX_SOURCES.items():
+        index = _indexes.get(kind)
+        if index is None:
+            # built from the db on first use anyway
+            continue
+        for change in changes_for(changes, model):
+            if change.action == 'deleted':
+                index.remove(change.id)
+            elif 'name' in change.values:
+                index.add(change.id, change.values['name'])
+
+
+def suggest(kind, prefix, limit):
+    return [{'id': entity_id, 'name': name}
+            for entity_id, name in get_index(kind).search(prefix, limit)]
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+#----------------------------------------------------------------------------#
+# Result caching.
+#----------------------------------------------------------------------------#
+
+# what _lookup returns for a value it doesn't have
+MISSING = object()
+
+
+class ResultCache:
+    '''
+    Bounded LRU cache of computed results, each kept for at most `ttl`
+    seconds. Concurrent misses on one key are coalesced: the first caller
+    computes the value while the others wait for it.
+    '''
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        # bumped on invalidation, so results computed from data read before
+        # a write aren't stored after it
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _lookup(self, key, new_event):
+        '''
+        (value, None, None) on a hit, (MISSING, event, None) while another
+        caller computes the key, else claims it: (MISSING, None, generation)
+        '''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], None, None
+            waiting = self.in_flight.get(key)
+            if waiting is not None:
+                return MISSING, waiting, None
+            self.misses += 1
+            self.in_flight[key] = new_event()
+            return MISSING, None, self.generation
+
+    def _store(self, key, value, generation):
+        with self.lock:
+            if generation == self.generation:
+                self.entries[key] = (time.monotonic() + self.ttl, value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+
+    def _release(self, key):
+        with self.lock:
+            done = self.in_flight.pop(key)
+        done.set()
+
+    def get(self, key, compute):
+        while True:
+            value, waiting, generation = self._lookup(key, threading.Event)
+            if waiting is None:
+                break
+            # someone else is computing it, check again once they're done
+            waiting.wait()
+        if value is not MISSING:
+            return value
+
+        try:
+            value = compute()
+            self._store(key, value, generation)
+            return value
+        finally:
+            self._release(key)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+class AsyncResultCache(ResultCache):
+    '''
+    ResultCache for coroutines: compute returns an awaitable, and callers
+    waiting on another's miss await it rather than block the event loop
+    '''
+
+    async def get(self, key, compute):
+        while True:
+            value, waiting, generation = self._lookup(key, asyncio.Event)
+            if waiting is None:
+                break
+            await waiting.wait()
+        if value is not MISSING:
+            return value
+
+        try:
+            value = await compute()
+            self._store(key, value, generation)
+            return value
+        finally:
+            self._release(key)
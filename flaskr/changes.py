@@ -0,0 +1,118 @@
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.orm import Session
+from flaskr.db import db
+from flaskr.models import Artist, ChangeLog, Show, Venue
+
+#----------------------------------------------------------------------------#
+# Change feed.
+#----------------------------------------------------------------------------#
+
+# Every flushed create/update/delete of a venue, artist or show is written
+# to ChangeLog in the same transaction, so the log commits or rolls back
+# with the change itself. Shows removed by the database's ON DELETE CASCADE
+# when their venue/artist is deleted are logged too. Consumers page through
+# the log by id (`/changes?since=<cursor>`), so ids have to become visible
+# in order: a consumer that has seen an id must never find a smaller one
+# later. Entries are queued as changes are flushed and only inserted as the
+# transaction commits, holding a lock (on postgres; sqlite writers take
+# turns anyway) until the commit is visible. Whoever takes ids next waits
+# for it, so every id below a visible one is visible too, or rolled back.
+
+ENTITY_TYPES = {
+    Venue: 'venues',
+    Artist: 'artists',
+    Show: 'shows',
+}
+
+# pg_advisory_xact_lock key serializing the log's writers
+CHANGE_LOG_LOCK = 0x6368616e6765
+
+# show columns the database cascades a venue/artist delete through
+CASCADED_SHOWS = {
+    Venue: Show.venue_id,
+    Artist: Show.artist_id,
+}
+
+
+@event.listens_for(Session, 'before_flush')
+def collect_cascaded_deletes(session, flush_context, instances):
+    # the shows are gone once the flush has run, note their ids first
+    cascaded = session.info.setdefault('cascaded_show_deletes', set())
+    for obj in session.deleted:
+        column = CASCADED_SHOWS.get(type(obj))
+        if column is not None:
+            cascaded.update(session.connection().execute(
+                select(Show.id).where(column == obj.id)).scalars())
+
+
+@event.listens_for(Session, 'after_flush')
+def queue_change_log(session, flush_context):
+    entries = []
+    for action, objects in (('created', session.new),
+                            ('updated', session.dirty),
+                            ('deleted', session.deleted)):
+        for obj in objects:
+            entity_type = ENTITY_TYPES.get(type(obj))
+            if entity_type is None:
+                continue
+            if action == 'updated' and not session.is_modified(
+                    obj, include_collections=True):
+                continue
+            entries.append({'entity_type': entity_type,
+                            'entity_id': obj.id, 'action': action})
+    logged_shows = {entry['entity_id'] for entry in entries
+                    if entry['entity_type'] == 'shows'}
+    for show_id in session.info.pop('cascaded_show_deletes', ()):
+        if show_id not in logged_shows:
+            entries.append({'entity_type': 'shows',
+                            'entity_id': show_id, 'action': 'deleted'})
+    session.info.setdefault('change_log', []).extend(entries)
+
+
+def log_deletes(session, model, ids):
+    '''
+    Log venues/artists removed by a bulk statement as deleted, with the
+    shows that go with them, without loading either (only the show ids)
+    '''
+    entity_type = ENTITY_TYPES[model]
+    show_ids = session.execute(select(Show.id).where(
+        CASCADED_SHOWS[model].in_(ids))).scalars()
+    session.info.setdefault('change_log', []).extend(
+        [{'entity_type': entity_type, 'entity_id': entity_id,
+          'action': 'deleted'} for entity_id in ids] +
+        [{'entity_type': 'shows', 'entity_id': show_id,
+          'action': 'deleted'} for show_id in show_ids])
+
+
+@event.listens_for(Session, 'before_commit')
+def write_change_log(session):
+    # before_commit runs ahead of the commit's own flush, flush now so its
+    # changes are queued too
+    session.flush()
+    entries = session.info.pop('change_log', None)
+    if not entries:
+        return
+    connection = session.connection()
+    stmt = insert(ChangeLog)
+    if connection.dialect.name == 'postgresql':
+        # released once the commit is visible, after which the next writer
+        # takes its ids
+        connection.execute(select(func.pg_advisory_xact_lock(
+            CHANGE_LOG_LOCK)))
+        # now() would be the transaction's start
+        stmt = stmt.values(changed_at=func.clock_timestamp())
+    connection.execute(stmt, entries)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_queued_changes(session):
+    session.info.pop('cascaded_show_deletes', None)
+    session.info.pop('change_log', None)
+
+
+def changes_since(cursor, limit):
+    '''Up to `limit` log entries after the cursor, oldest first'''
+    return db.session.execute(select(
+        ChangeLog.id, ChangeLog.entity_type, ChangeLog.entity_id,
+        ChangeLog.action, ChangeLog.changed_at).where(
+        ChangeLog.id > cursor).order_by(ChangeLog.id).limit(limit)).all()
@@ -0,0 +1,56 @@
+import zlib
+from flask import Response, get_flashed_messages, request, stream_with_context
+from flaskr.app import app
+
+#----------------------------------------------------------------------------#
+# Response compression.
+#----------------------------------------------------------------------------#
+
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json'}
+
+
+def stream_template(template_name, **context):
+    '''Like render_template, but sends the page out as it renders'''
+    app.update_template_context(context)
+    # pop flashes now, while the session cookie can still be updated
+    get_flashed_messages()
+    template = app.jinja_env.get_template(template_name)
+    stream = template.stream(context)
+    # flush in chunks rather than per template statement
+    stream.enable_buffering(app.config['STREAM_TEMPLATE_BUFFER'])
+    return Response(stream_with_context(stream))
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(app.config['GZIP_COMPRESS_LEVEL'],
+                                  zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.after_request
+def gzip_response(response):
+    if not app.config['GZIP_RESPONSES'] or \
+            response.mimetype not in COMPRESSIBLE_MIMETYPES or \
+            response.status_code != 200 or \
+            response.direct_passthrough or \
+            'Content-Encoding' in response.headers or \
+            not request.accept_encodings['gzip']:
+        return response
+
+    if not response.is_streamed and \
+            response.calculate_content_length() < app.config['GZIP_MIN_SIZE']:
+        # not worth the cpu or the gzip header overhead
+        return response
+
+    response.response = gzip_chunks(response.response)
+    response.content_encoding = 'gzip'
+    # length isn't known up front when compressing on the fly
+    response.headers.pop('Content-Length', None)
+    response.vary.add('Accept-Encoding')
+    return response
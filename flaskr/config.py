@@ -8,7 +8,187 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 DEBUG = True
 SQLALCHEMY_ECHO = True
 
+# Request-scoped session handling (see flaskr/db.py)
+# commit pending changes at the end of successful write requests
+SQLALCHEMY_TRANSACTION_PER_REQUEST = False
+# run GET requests in a READ ONLY transaction (postgres only)
+SQLALCHEMY_READ_ONLY_GETS = True
+# don't autoflush the session while serving GET requests
+SQLALCHEMY_READ_AUTOFLUSH_OFF = True
+
 
 # Connect to the database
 SQLALCHEMY_DATABASE_URI = 'postgresql://{}/{}'.format(
     'localhost:5432', 'fyyur')
+
+# Cap how long a single statement may hold a worker (milliseconds), so a slow
+# listing or search query can't pin a request thread indefinitely
+SQLALCHEMY_STATEMENT_TIMEOUT = int(
+    os.environ.get('SQLALCHEMY_STATEMENT_TIMEOUT', 5000))
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_pre_ping': True,
+    'connect_args': {
+        'options': '-c statement_timeout={}'.format(SQLALCHEMY_STATEMENT_TIMEOUT)
+    },
+}
+# The async read path (flaskr/asgi.py) connects through asyncpg, which takes
+# server settings rather than libpq options; it only ever reads
+ASYNC_ENGINE_OPTIONS = {
+    'pool_pre_ping': True,
+    'connect_args': {
+        'server_settings': {
+            'statement_timeout': str(SQLALCHEMY_STATEMENT_TIMEOUT),
+            'default_transaction_read_only': 'on',
+        },
+    },
+}
+
+# Production server (gunicorn.conf.py, read without importing the app)
+GUNICORN_BIND = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+GUNICORN_WORKERS = int(os.environ.get(
+    'WEB_CONCURRENCY', 2 * (os.cpu_count() or 1) + 1))
+# 'gthread' serves GUNICORN_THREADS requests at once per worker, keep that
+# within the engine's pool (pool_size + max_overflow, 5 + 10 by default)
+GUNICORN_WORKER_CLASS = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+# load the app once in the master, workers share its memory copy-on-write
+GUNICORN_PRELOAD = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+GUNICORN_TIMEOUT = 30
+# recycle workers after this many requests (plus jitter), bounding leaks
+GUNICORN_MAX_REQUESTS = 10000
+GUNICORN_MAX_REQUESTS_JITTER = 1000
+
+# Local thumbnail cache for remote venue/artist images
+IMAGE_CACHE_DIR = os.environ.get(
+    'IMAGE_CACHE_DIR', os.path.join(basedir, os.pardir, 'image_cache'))
+IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# check the cache size after this many new thumbnails
+IMAGE_CACHE_EVICTION_INTERVAL = 50
+# thumbnail urls change with the source link, so they never go stale
+IMAGE_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+IMAGE_THUMBNAIL_SIZE = (400, 400)
+IMAGE_FETCH_TIMEOUT = 5
+IMAGE_FETCH_MAX_REDIRECTS = 3
+# seconds a failed fetch is remembered, the source link is served meanwhile
+IMAGE_FETCH_FAILURE_TTL = 60
+IMAGE_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+# decoded size limit, a small file can still be a huge image
+IMAGE_MAX_SOURCE_PIXELS = 40 * 1000 * 1000
+# source images are only fetched from public addresses, except these hosts
+# (e.g. an internal image server)
+IMAGE_FETCH_TRUSTED_HOSTS = ()
+
+# Fingerprinted, precompressed static assets (`flask assets build`)
+ASSETS_DIST_DIR = 'dist'
+ASSETS_MAX_AGE = 365 * 24 * 60 * 60
+
+# On-the-fly gzip for html/json responses
+GZIP_RESPONSES = True
+GZIP_COMPRESS_LEVEL = 6
+GZIP_MIN_SIZE = 500
+# template events to buffer before flushing a streamed page
+STREAM_TEMPLATE_BUFFER = 20
+
+# Compiled templates, shared by workers (`flask templates compile`);
+# set to an empty string to compile in memory only
+TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get(
+    'TEMPLATE_BYTECODE_CACHE_DIR',
+    os.path.join(basedir, os.pardir, 'template_cache'))
+
+# Rows fetched per round trip when streaming exports and feeds
+EXPORT_BATCH_SIZE = 1000
+
+# Show history (`flask shows archive`, `flask shows partitions`)
+# shows starting longer ago than this move to the archive table
+SHOW_RETENTION_DAYS = 2 * 365
+SHOW_ARCHIVE_BATCH = 1000
+# monthly partitions of the Show table to keep created ahead of time
+SHOW_PARTITION_MONTHS_AHEAD = 12
+# past shows listed on a detail page, the rest are a click away
+SHOW_PAST_PREVIEW = 10
+SHOW_ARCHIVE_PAGE_SIZE = 20
+# shows per page of /shows/search
+SHOW_SEARCH_PAGE_SIZE = 24
+
+# Query plan checks (`flask plans check`, see flaskr/plans.py)
+PLAN_BASELINE = os.path.join(os.path.dirname(basedir), 'query_plans.json')
+# reading every row of a table this big fails the check
+PLAN_LARGE_TABLE_ROWS = 1000
+# estimated cost may grow by this factor over the baseline's
+PLAN_COST_TOLERANCE = 1.5
+
+# Logging (see flaskr/logs.py), json lines written off the request thread,
+# by every worker to the same file; rotate it with logrotate (README)
+LOG_FILE = os.environ.get('LOG_FILE', 'fyyur.log')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+# records waiting to be written; more than this are dropped
+LOG_QUEUE_SIZE = 10000
+# fraction of successful requests logged, slower ones are always logged
+LOG_ACCESS_SAMPLE_RATE = float(os.environ.get('LOG_ACCESS_SAMPLE_RATE', 0.1))
+LOG_SLOW_REQUEST_MS = 500
+
+# Opt-in request profiling (see flaskr/profiler.py)
+# signs X-Profile tokens (`flask profile token`), unset disables them
+PROFILE_SECRET = os.environ.get('PROFILE_SECRET')
+PROFILE_TOKEN_MAX_AGE = 24 * 60 * 60
+# fraction of requests to profile at random
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+# 'sample' for collapsed stacks, 'cprofile' for a pstats dump
+PROFILE_MODE = 'sample'
+# seconds between stack samples
+PROFILE_INTERVAL = 0.002
+PROFILE_DIR = os.environ.get(
+    'PROFILE_DIR', os.path.join(basedir, os.pardir, 'profiles'))
+PROFILE_MAX_FILES = 100
+
+# Catalogue change feed (`/changes?since=`)
+CHANGE_FEED_PAGE_SIZE = 500
+
+# Duplicate venues/artists (`flask dedup find|merge|keys`)
+# minimum name similarity (0-1) for a pair to be reported
+DEDUP_MATCH_THRESHOLD = 0.85
+# neighbours, in name order, each entity is compared with in its city
+DEDUP_WINDOW = 10
+DEDUP_BATCH_SIZE = 1000
+
+# Deleted venues/artists (`flask deleted purge|delete`)
+# days a soft deleted venue/artist is kept before it's purged
+DELETED_RETENTION_DAYS = 30
+# rows removed per purge transaction, each taking its shows with it
+DELETED_PURGE_BATCH = 200
+
+# Venue/artist matchmaking
+MATCH_RESULTS = 10
+# rebuild the in-memory candidate index after this many seconds
+MATCH_INDEX_TTL = 5 * 60
+# shows within this many days count towards a candidate's activity
+MATCH_RECENT_DAYS = 180
+MATCH_WEIGHTS = {
+    'genre': 1.0,
+    'city': 0.5,
+    'state': 0.25,
+    'activity': 0.25,
+}
+
+# Typeahead suggestions for the venue/artist search boxes
+AUTOCOMPLETE_RESULTS = 8
+# rebuild the in-memory name index after this many seconds, picking up
+# writes made by other processes
+AUTOCOMPLETE_INDEX_TTL = 5 * 60
+# words of a name that can be matched, and characters indexed per key
+AUTOCOMPLETE_MAX_WORDS = 6
+AUTOCOMPLETE_KEY_LENGTH = 32
+
+# In-memory venue/artist search results, per process
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_TTL = 60
+
+# Similar artist/venue recommendations (`flask recommendations build`)
+RECOMMENDATION_NEIGHBOURS = 6
+# rows of the similarity matrix computed at once, bounds peak memory
+RECOMMENDATION_CHUNK_SIZE = 512
+RECOMMENDATION_INSERT_BATCH = 5000
+RECOMMENDATION_WEIGHTS = {
+    'shows': 1.0,
+    'genres': 0.5,
+}
@@ -1,9 +1,13 @@
 import pytz
 from datetime import datetime
 from flask import abort, flash, json, redirect, render_template, request, url_for
+from sqlalchemy.orm.exc import StaleDataError
 from flaskr.app import app
+from flaskr.logs import log_error
+from flaskr import archive, dedup, deletion, edits, queries
+from flaskr.recommendations import similar_entities
 from flaskr.db import db
-from flaskr.models import Artist, Genre, Show, Venue
+from flaskr.models import Artist, Show, Venue
 from flaskr.forms import ArtistForm
 
 #  Artists
@@ -13,14 +17,13 @@ from flaskr.forms import ArtistForm
 @app.route('/artists', methods={'GET'})
 def artists():
     try:
-        artists = Artist.query.all()
+        # the listing only shows names, so skip loading each artist's shows
+        artists = queries.list_artists()
         return render_template('pages/artists.html', artists=artists)
     except Exception as e:
-        print(f'Error - [GET] /artists - {e}')
+        log_error(f'Error - [GET] /artists - {e}')
         flash('Artists could not be fetched right now. Refresh or try again later.')
         abort(500)
-    finally:
-        db.session.close()
 
 
 #  Search
@@ -31,47 +34,39 @@ def artists():
 def search_artists():
     try:
         search_term = request.form.get('search_term', '')
-        data = Artist.query.filter(Artist.name.ilike(f'%{search_term}%'))
+        # only the columns the results page needs, in a single round trip
+        # optional genre filter, e.g. genres=1&genres=3&genre_match=all
+        genre_ids = request.form.getlist('genres', type=int)
+        match_all = request.form.get('genre_match') == 'all'
+        data = queries.search_artists(search_term, genre_ids, match_all)
         response = {
-            "count": data.count(),
-            "data": data.all()
+            "count": len(data),
+            "data": data
         }
         return render_template('pages/search_artists.html',
                                results=response, search_term=search_term)
     except Exception as e:
-        print(f'Error - [POST] /artists/search - {e}')
+        log_error(f'Error - [POST] /artists/search - {e}')
         flash('Artists could not be searched at this time. Refresh or try again later.')
         abort(500)
-    finally:
-        db.session.close()
 
 
 #  Artist
 #  ----------------------------------------------------------------
 
-def select_show_details_for_artist(show):
-    venue = show.venue
-    return {
-        'venue_id': venue.id,
-        'venue_name': venue.name,
-        'venue_image_link': venue.image_link,
-        'start_time': show.start_time,
-    }
-
-
 @app.route('/artists/<int:artist_id>', methods=['GET'])
 def show_artist(artist_id):
     try:
-        artist = Artist.query.get(artist_id)
+        artist = queries.get_artist(artist_id)
         if not artist:
             abort(404, 'Artist does not exist')
 
         now = datetime.now(pytz.utc)
 
-        past_shows = [select_show_details_for_artist(
-            show) for show in artist.shows if show.end_time <= now]
-        upcoming_shows = [select_show_details_for_artist(
-            show) for show in artist.shows if show.start_time >= now]
+        # recent past shows only, older ones are paged in on request
+        past_shows = archive.past_shows(
+            'artist_id', artist_id, now, app.config['SHOW_PAST_PREVIEW'])
+        upcoming_shows = archive.upcoming_shows('artist_id', artist_id, now)
 
         data = {
             'id': artist.id,
@@ -87,19 +82,45 @@ def show_artist(artist_id):
             'image_link': artist.image_link,
             'past_shows': past_shows,
             'upcoming_shows': upcoming_shows,
-            'past_shows_count': len(past_shows),
+            'past_shows_count': archive.past_show_count(
+                'artist_id', artist_id, now),
             'upcoming_shows_count': len(upcoming_shows),
+            'similar': similar_entities('artists', artist_id),
         }
         return render_template('pages/show_artist.html', artist=data)
     except Exception as e:
-        print(f'Error - [GET] - /artists/{artist_id} - {e}')
+        log_error(f'Error - [GET] - /artists/{artist_id} - {e}')
         err_message = getattr(
             e, 'message', 'Artist could not be fetched at this time')
         err_status = getattr(e, 'code', 500)
         flash(err_message)
         abort(err_status)
-    finally:
-        db.session.close()
+
+
+@app.route('/artists/<int:artist_id>/archive', methods=['GET'])
+def artist_archive(artist_id):
+    try:
+        name = db.session.query(Artist.name).filter(
+            Artist.id == artist_id, Artist.deleted_at.is_(None)).scalar()
+        if name is None:
+            abort(404, 'Artist does not exist')
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = app.config['SHOW_ARCHIVE_PAGE_SIZE']
+        # one extra row tells whether there's a next page
+        shows = archive.past_shows('artist_id', artist_id,
+                                   datetime.now(pytz.utc), per_page + 1,
+                                   (page - 1) * per_page)
+        return render_template('pages/past_shows.html', kind='artists',
+                               entity={'id': artist_id, 'name': name},
+                               shows=shows[:per_page], page=page,
+                               has_next=len(shows) > per_page)
+    except Exception as e:
+        log_error(f'Error - [GET] /artists/{artist_id}/archive - {e}')
+        err_message = getattr(
+            e, 'message', 'Past shows could not be fetched at this time')
+        err_status = getattr(e, 'code', 500)
+        flash(err_message)
+        abort(err_status)
 
 
 #  Update Artist
@@ -109,8 +130,7 @@ def show_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     try:
-        all_genres = Genre.query.all()
-        data = Artist.query.get(artist_id)
+        data = queries.get_artist(artist_id)
         artist = {
             'id': data.id,
             'name': data.name,
@@ -122,67 +142,82 @@ def edit_artist(artist_id):
             'phone': data.phone,
             'seeking_venue': data.seeking_venue,
             'seeking_description': data.seeking_description,
-            'website': data.website,
+            'website_link': data.website,
+            'version': data.version,
         }
 
         # prepopulate form with existing values from artist data
         form = ArtistForm(data=artist)
         # dynamically populate genre choices
-        form.genres.choices = [(genre.id, genre.name) for genre in all_genres]
+        form.genres.choices = queries.genre_choices()
         return render_template('forms/edit_artist.html',
                                form=form, artist=artist)
     except Exception as e:
-        print(f'Error - [GET] /artists/{artist_id}/edit - {e}')
+        log_error(f'Error - [GET] /artists/{artist_id}/edit - {e}')
         flash('Error getting artist to edit. Refresh or try again later.')
         return redirect(url_for('show_artist', artist_id=artist_id))
-    finally:
-        db.session.close()
+
+
+def edit_artist_conflict(form, artist):
+    '''Re-render an edit made against an outdated version of the artist'''
+    db.session.rollback()
+    # resubmitting overwrites the other edit, so make that a deliberate choice
+    form.version.data = str(artist.version)
+    flash(f'{artist.name} was changed by someone else while you were editing '
+          'it. Check their changes and resubmit to overwrite them.')
+    return render_template('forms/edit_artist.html',
+                           form=form, artist=artist), 409
 
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     try:
-        artist = Artist.query.get(artist_id)
+        artist = queries.get_artist(artist_id)
 
         if not artist:
             abort(404, 'Artist does not exist')
 
-        form_data = request.form
-
-        artist.name = form_data.get('name')
-        artist.facebook_link = form_data.get('facebook_link')
-        artist.image_link = form_data.get('image_link')
-        artist.genres = [Genre.query.get(id)
-                         for id in form_data.getlist('genres')]
-        artist.city = form_data.get('city')
-        artist.state = form_data.get('state')
-        artist.phone = form_data.get('phone')
-        artist.seeking_venue = form_data.get('seeking_venue') == 'y'
-        artist.seeking_description = form_data.get('seeking_description')
-        artist.website = form_data.get('website')
-
         # validate the form inputs
-        form = ArtistForm(data=form_data)
-        all_genres = Genre.query.all()
-        form.genres.choices = [(genre.id, genre.name) for genre in all_genres]
-        if form.validate_on_submit():
-            db.session.commit()
-            return redirect(url_for('show_artist', artist_id=artist_id))
-        else:
-            print(form.errors)
-            db.session.rollback()
+        form = ArtistForm(data=request.form)
+        form.genres.choices = queries.genre_choices()
+        if not form.validate_on_submit():
+            app.logger.info(f'Invalid form: {form.errors}')
             flash(f'Invalid artist details. Fix errors before resubmitting.')
             return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+        if form.version.data and form.version.data != str(artist.version):
+            return edit_artist_conflict(form, artist)
+
+        form_data = request.form
+        # only write the fields that changed
+        changed = edits.apply_changes(artist, {
+            'name': form_data.get('name'),
+            'facebook_link': form_data.get('facebook_link'),
+            'image_link': form_data.get('image_link'),
+            'city': form_data.get('city'),
+            'state': form_data.get('state'),
+            'phone': form_data.get('phone'),
+            'seeking_venue': form_data.get('seeking_venue') == 'y',
+            'seeking_description': form_data.get('seeking_description'),
+            'website': form_data.get('website_link'),
+        })
+        genres_changed = edits.apply_genres(
+            artist, form_data.getlist('genres'))
+        if changed or genres_changed:
+            try:
+                db.session.commit()
+            except StaleDataError:
+                # saved by someone else since it was loaded above
+                return edit_artist_conflict(form, artist)
+        return redirect(url_for('show_artist', artist_id=artist_id))
     except Exception as e:
         db.session.rollback()
-        print(f'Error - [POST] /artists/{artist_id}/edit - {e}')
+        log_error(f'Error - [POST] /artists/{artist_id}/edit - {e}')
         err_message = getattr(
             e, 'message', 'Could not edit artist at this time. Try again later.')
         err_status = getattr(e, 'code', 500)
         flash(err_message)
         abort(err_status)
-    finally:
-        db.session.close()
 
 
 #  Create Artist
@@ -192,15 +227,13 @@ def edit_artist_submission(artist_id):
 @app.route('/artists/create', methods=['GET'])
 def create_artist_form():
     try:
-        genres = [(genre.id, genre.name) for genre in Genre.query.all()]
+        genres = queries.genre_choices()
         form = ArtistForm()
         form.genres.choices = genres
         return render_template('forms/new_artist.html', form=form)
     except Exception as e:
-        print(f'Error - [GET] /artists/create - {e}')
+        log_error(f'Error - [GET] /artists/create - {e}')
         abort(500)
-    finally:
-        db.session.close()
 
 
 @app.route('/artists/create', methods=['POST'])
@@ -220,14 +253,18 @@ def create_artist_submission():
             seeking_description=artist_data.get('seeking_description'),
             website=artist_data.get('website'),
         )
-        artist.genres = [Genre.query.get(id)
-                         for id in request.form.getlist('genres')]
 
         # validate the form inputs
         form = ArtistForm(data=artist_data)
-        form.genres.choices = [(genre.id, genre.name)
-                               for genre in Genre.query.all()]
+        form.genres.choices = queries.genre_choices()
         if form.validate_on_submit():
+            # the ids as checked (and coerced) by the form
+            artist.genres = queries.genres_by_ids(form.genres.data)
+            duplicate = dedup.find_duplicate(artist)
+            if duplicate:
+                db.session.rollback()
+                flash(f'Artist {duplicate.name} is already listed, see /artists/{duplicate.id}.')
+                return render_template('forms/new_artist.html', form=form)
             db.session.add(artist)
             db.session.commit()
             flash(f'Artist {artist.name} was successfully listed!')
@@ -238,34 +275,29 @@ def create_artist_submission():
             return render_template('forms/new_artist.html', form=form)
     except Exception as e:
         db.session.rollback()
-        print(f'Error - [POST] /artists/create - {e}')
         artist_name = artist_data.get('name')
-        print(f'Artist {artist_name}: {e}')
+        log_error(f'Error - [POST] /artists/create - {artist_name}: {e}')
         flash(f'Artist {artist_name} could not be created.')
         abort(500)
-    finally:
-        db.session.close()
 
 
 #  Delete Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<artist_id>', methods=['DELETE'])
+@app.route('/artists/<int:artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
     success = False
     status = 500
     try:
-        artist = Artist.query.get(artist_id)
-        if not artist:
-            abort(404, 'Artist does not exist')
-        db.session.delete(artist)
-        db.session.commit()
-        success = True
-        status = 200
+        # a single UPDATE, neither the artist nor its shows are loaded
+        if deletion.soft_delete(Artist, [artist_id]):
+            db.session.commit()
+            success = True
+            status = 200
+        else:
+            status = 404
     except Exception as e:
         db.session.rollback()
-        print(f'Error - [DELETE] /artist/{artist_id} - {e}')
-    finally:
-        db.session.close()
-        return json.dumps(success), status
+        log_error(f'Error - [DELETE] /artist/{artist_id} - {e}')
+    return json.dumps(success), status
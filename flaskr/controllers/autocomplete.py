@@ -0,0 +1,23 @@
+from flask import abort, jsonify, request
+from flaskr.app import app
+from flaskr.logs import log_error
+from flaskr import autocomplete
+
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+
+@app.route('/<any(venues, artists):kind>/autocomplete', methods=['GET'])
+def autocomplete_names(kind):
+    prefix = request.args.get('q', '')
+    limit = min(request.args.get('limit', app.config['AUTOCOMPLETE_RESULTS'],
+                                 type=int), app.config['AUTOCOMPLETE_RESULTS'])
+    try:
+        suggestions = autocomplete.suggest(kind, prefix, max(limit, 0))
+    except Exception as e:
+        log_error(f'Error - [GET] /{kind}/autocomplete - {e}')
+        abort(500)
+    response = jsonify({'data': suggestions})
+    # suggestions are cheap to recompute but also fine slightly stale
+    response.cache_control.max_age = 30
+    return response
@@ -0,0 +1,32 @@
+from flask import abort, jsonify, request
+from flaskr.app import app
+from flaskr.logs import log_error
+from flaskr import changes
+
+#  Change feed
+#  ----------------------------------------------------------------
+
+
+@app.route('/changes', methods=['GET'])
+def list_changes():
+    cursor = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', app.config['CHANGE_FEED_PAGE_SIZE'],
+                                     type=int), 1),
+                app.config['CHANGE_FEED_PAGE_SIZE'])
+    try:
+        entries = changes.changes_since(cursor, limit)
+    except Exception as e:
+        log_error(f'Error - [GET] /changes - {e}')
+        abort(500)
+    return jsonify({
+        'changes': [{
+            'cursor': entry.id,
+            'entity': entry.entity_type,
+            'id': entry.entity_id,
+            'action': entry.action,
+            'changed_at': entry.changed_at.isoformat(),
+        } for entry in entries],
+        # pass back as `since` for the next page
+        'next': entries[-1].id if entries else cursor,
+        'has_more': len(entries) == limit,
+    })
@@ -0,0 +1,235 @@
+import csv
+import hashlib
+import io
+import json
+import sys
+import click
+import pytz
+from datetime import datetime
+from flask import Response, abort, request, stream_with_context
+from sqlalchemy import func, select
+from flaskr.app import app
+from flaskr.db import db
+from flaskr.models import Artist, Show, Venue
+
+#  Catalogue export
+#  ----------------------------------------------------------------
+#  Rows are streamed straight from a server-side cursor in batches, so an
+#  export never holds more than one batch of a table in memory.
+
+EXPORT_COLUMNS = {
+    'venues': [
+        Venue.id, Venue.name, Venue.address, Venue.city, Venue.state,
+        Venue.phone, Venue.website, Venue.facebook_link, Venue.image_link,
+        Venue.seeking_talent, Venue.seeking_description,
+        Venue.created_at, Venue.updated_at,
+    ],
+    'artists': [
+        Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+        Artist.website, Artist.facebook_link, Artist.image_link,
+        Artist.seeking_venue, Artist.seeking_description,
+        Artist.created_at, Artist.updated_at,
+    ],
+    'shows': [
+        Show.id, Show.artist_id, Show.venue_id, Show.start_time,
+        Show.end_time, Show.created_at, Show.updated_at,
+    ],
+}
+
+# deleted venues/artists, and their shows, aren't exported
+EXPORT_FILTERS = {
+    'venues': [Venue.deleted_at.is_(None)],
+    'artists': [Artist.deleted_at.is_(None)],
+    'shows': [
+        Show.artist_id.in_(select(Artist.id).where(
+            Artist.deleted_at.is_(None))),
+        Show.venue_id.in_(select(Venue.id).where(
+            Venue.deleted_at.is_(None))),
+    ],
+}
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def export_rows(entity):
+    '''Stream every row of an entity's table in primary key order'''
+    columns = EXPORT_COLUMNS[entity]
+    stmt = select(*columns).where(*EXPORT_FILTERS[entity]).order_by(
+        columns[0])
+    result = db.session.execute(
+        stmt, execution_options={'stream_results': True})
+    return result.yield_per(app.config['EXPORT_BATCH_SIZE'])
+
+
+def to_json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def csv_lines(entity, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.key for column in EXPORT_COLUMNS[entity]])
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_lines(entity, rows):
+    keys = [column.key for column in EXPORT_COLUMNS[entity]]
+    for row in rows:
+        record = {key: to_json_value(value) for key, value in zip(keys, row)}
+        yield json.dumps(record) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': csv_lines,
+    'jsonl': jsonl_lines,
+}
+
+
+@app.route('/export/<entity>.<fmt>', methods=['GET'])
+def export_catalogue(entity, fmt):
+    if entity not in EXPORT_COLUMNS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    lines = EXPORT_FORMATS[fmt](entity, export_rows(entity))
+    response = Response(stream_with_context(lines),
+                        mimetype=EXPORT_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename={entity}.{fmt}'
+    return response
+
+
+@app.cli.command('export')
+@click.argument('entity', type=click.Choice(sorted(EXPORT_COLUMNS)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(EXPORT_FORMATS)),
+              default='csv')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='File to write to, defaults to stdout.')
+def export_command(entity, fmt, output):
+    '''Dump all venues, artists or shows.'''
+    out = open(output, 'w', newline='') if output else sys.stdout
+    try:
+        for line in EXPORT_FORMATS[fmt](entity, export_rows(entity)):
+            out.write(line)
+    finally:
+        if output:
+            out.close()
+        db.session.remove()
+
+
+#  iCal feeds
+#  ----------------------------------------------------------------
+
+
+def upcoming_shows_query(columns, filter_column, entity_id):
+    now = datetime.now(pytz.utc)
+    return db.session.query(*columns).select_from(Show).join(
+        Artist, Show.artist_id == Artist.id).join(
+        Venue, Show.venue_id == Venue.id).filter(
+        filter_column == entity_id, Show.start_time >= now,
+        Artist.deleted_at.is_(None), Venue.deleted_at.is_(None))
+
+
+def feed_etag(filter_column, entity_id):
+    '''Cheap fingerprint of the feed, changing with any of its shows'''
+    summary = upcoming_shows_query([
+        func.count(Show.id),
+        func.max(Show.id),
+        func.max(Show.created_at),
+        func.max(Show.updated_at),
+        func.max(Artist.updated_at),
+        func.max(Venue.updated_at),
+        func.min(Show.start_time),
+    ], filter_column, entity_id).one()
+    return hashlib.sha1(repr(tuple(summary)).encode('utf-8')).hexdigest()
+
+
+def ical_escape(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;') \
+        .replace(',', '\\,').replace('\n', '\\n')
+
+
+def ical_time(value):
+    return value.astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def ical_fold(line):
+    '''Split content lines longer than 75 octets, per RFC 5545'''
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        # don't split in the middle of a multi-byte character
+        size = 75 if not parts else 74
+        while size < len(encoded) and (encoded[size] & 0xC0) == 0x80:
+            size -= 1
+        parts.append(encoded[:size].decode('utf-8'))
+        encoded = encoded[size:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def ical_lines(calendar_name, shows):
+    yield ical_fold('BEGIN:VCALENDAR')
+    yield ical_fold('VERSION:2.0')
+    yield ical_fold('PRODID:-//Fyyur//Shows//EN')
+    yield ical_fold(f'X-WR-CALNAME:{ical_escape(calendar_name)}')
+    stamp = ical_time(datetime.now(pytz.utc))
+    for show in shows:
+        location = ', '.join(
+            part for part in (show.address, show.city, show.state) if part)
+        yield ical_fold('BEGIN:VEVENT')
+        yield ical_fold(f'UID:show-{show.id}@fyyur')
+        yield ical_fold(f'DTSTAMP:{stamp}')
+        yield ical_fold(f'DTSTART:{ical_time(show.start_time)}')
+        yield ical_fold(f'DTEND:{ical_time(show.end_time)}')
+        yield ical_fold('SUMMARY:' + ical_escape(
+            f'{show.artist_name} at {show.venue_name}'))
+        yield ical_fold(f'LOCATION:{ical_escape(location)}')
+        yield ical_fold('END:VEVENT')
+    yield ical_fold('END:VCALENDAR')
+
+
+def ical_feed(model, filter_column, entity_id):
+    name = db.session.query(model.name).filter(
+        model.id == entity_id, model.deleted_at.is_(None)).scalar()
+    if name is None:
+        abort(404)
+
+    etag = feed_etag(filter_column, entity_id)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    shows = upcoming_shows_query([
+        Show.id,
+        Show.start_time,
+        Show.end_time,
+        Artist.name.label('artist_name'),
+        Venue.name.label('venue_name'),
+        Venue.address,
+        Venue.city,
+        Venue.state,
+    ], filter_column, entity_id).order_by(Show.start_time).yield_per(
+        app.config['EXPORT_BATCH_SIZE'])
+    response = Response(stream_with_context(ical_lines(f'{name} shows', shows)),
+                        mimetype='text/calendar')
+    response.set_etag(etag)
+    return response
+
+
+@app.route('/venues/<int:venue_id>/shows.ics', methods=['GET'])
+def venue_ical_feed(venue_id):
+    return ical_feed(Venue, Show.venue_id, venue_id)
+
+
+@app.route('/artists/<int:artist_id>/shows.ics', methods=['GET'])
+def artist_ical_feed(artist_id):
+    return ical_feed(Artist, Show.artist_id, artist_id)
@@ -0,0 +1,284 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import threading
+import time
+from urllib.parse import urljoin, urlparse
+from flask import abort, redirect, send_file, url_for
+from PIL import Image
+from flaskr.app import app
+from flaskr.logs import log_error
+from flaskr.db import db
+from flaskr.models import Artist, Venue
+
+#  Image thumbnails
+#  ----------------------------------------------------------------
+#  Remote `image_link`s are fetched once, resized and kept on local disk,
+#  keyed by a hash of the source url + thumbnail size. Since the key changes
+#  whenever the link does, the served files can be cached forever. Links are
+#  user submitted, so they're only fetched from public addresses: every hop
+#  of a redirect is resolved and checked, and the connection goes to the
+#  address that was checked.
+
+IMAGE_MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+}
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+# one [lock, users] entry per cache key, so concurrent misses only fetch
+# the image once; dropped when the last request holding or waiting on it
+# is done
+_fetch_locks = {}
+# cache key -> (expiry, error) of recent failed fetches, so a broken link
+# isn't refetched (and waited on) by every page view
+_failed_fetches = {}
+# also guards the failures and the write count
+_fetch_locks_guard = threading.Lock()
+_writes_since_eviction = 0
+
+
+def thumbnail_key(image_link):
+    '''Content address of the thumbnail for a source image'''
+    width, height = app.config['IMAGE_THUMBNAIL_SIZE']
+    source = f'{image_link}|{width}x{height}'
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:32]
+
+
+def thumbnail_url(kind, entity_id, image_link):
+    '''Url of the cached thumbnail, or the original link if it can't be proxied'''
+    if not image_link or urlparse(image_link).scheme not in ('http', 'https'):
+        return image_link
+    return url_for('image_thumbnail', kind=kind, entity_id=entity_id,
+                   key=thumbnail_key(image_link))
+
+
+app.jinja_env.globals['thumbnail_url'] = thumbnail_url
+
+
+def cache_path(key):
+    return os.path.join(app.config['IMAGE_CACHE_DIR'], key[:2], f'{key}.jpg')
+
+
+class PinnedHTTPConnection(http.client.HTTPConnection):
+    '''Connects to a given address, whatever the host resolves to by now'''
+
+    def __init__(self, host, port, address, **kw):
+        super().__init__(host, port, **kw)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port),
+                                             self.timeout)
+
+
+class PinnedHTTPSConnection(http.client.HTTPSConnection):
+
+    def __init__(self, host, port, address, **kw):
+        super().__init__(host, port, **kw)
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port),
+                                        self.timeout)
+        # the certificate is still checked against the host name
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+CONNECTIONS = {
+    'http': (PinnedHTTPConnection, 80),
+    'https': (PinnedHTTPSConnection, 443),
+}
+
+
+def public_address(host, port):
+    '''An address to reach host at, refusing hosts that resolve to any
+    private, loopback, link-local or otherwise non-public address'''
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    if host in app.config['IMAGE_FETCH_TRUSTED_HOSTS']:
+        return infos[0][4][0]
+    for info in infos:
+        ip = ipaddress.ip_address(info[4][0].split('%')[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f'{host} resolves to non-public address {ip}')
+    return infos[0][4][0]
+
+
+def fetch_image(image_link):
+    '''Download the source image, refusing anything too large'''
+    max_bytes = app.config['IMAGE_MAX_SOURCE_BYTES']
+    url = image_link
+    for _ in range(app.config['IMAGE_FETCH_MAX_REDIRECTS'] + 1):
+        parts = urlparse(url)
+        if parts.scheme not in CONNECTIONS or not parts.hostname:
+            raise ValueError(f'Not an http(s) image url: {url}')
+        connection_class, default_port = CONNECTIONS[parts.scheme]
+        port = parts.port or default_port
+        connection = connection_class(
+            parts.hostname, port, public_address(parts.hostname, port),
+            timeout=app.config['IMAGE_FETCH_TIMEOUT'])
+        try:
+            path = (parts.path or '/') + (f'?{parts.query}' if parts.query
+                                          else '')
+            connection.request('GET', path, headers={
+                'User-Agent': 'fyyur-image-proxy'})
+            res = connection.getresponse()
+            if res.status in REDIRECT_STATUSES:
+                url = urljoin(url, res.getheader('Location', ''))
+                continue
+            if res.status != 200:
+                raise ValueError(f'Image fetch failed with {res.status}')
+            length = res.getheader('Content-Length')
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise ValueError(f'Image larger than {max_bytes} bytes')
+            data = res.read(max_bytes + 1)
+        finally:
+            connection.close()
+        if len(data) > max_bytes:
+            raise ValueError(f'Image larger than {max_bytes} bytes')
+        return data
+    raise ValueError(f'Too many redirects fetching {image_link}')
+
+
+def make_thumbnail(data):
+    '''Resize image bytes down to the configured bounding box as a jpeg'''
+    image = Image.open(io.BytesIO(data))
+    # only the header has been read so far
+    width, height = image.size
+    if width * height > app.config['IMAGE_MAX_SOURCE_PIXELS']:
+        raise ValueError(f'Image too large to resize: {width}x{height}')
+    image.thumbnail(app.config['IMAGE_THUMBNAIL_SIZE'])
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=80, optimize=True)
+    return out.getvalue()
+
+
+def write_atomically(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def evict_thumbnails(keep=None):
+    '''Drop least recently used thumbnails once the cache is over budget,
+    except `keep`, about to be served'''
+    max_bytes = app.config['IMAGE_CACHE_MAX_BYTES']
+    entries = []
+    total = 0
+    for root, _, files in os.walk(app.config['IMAGE_CACHE_DIR']):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return
+    # trim to 90% of the budget so eviction doesn't run on every write
+    for _, size, path in sorted(entries):
+        if total <= max_bytes * 0.9:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def remember_failure(key, error):
+    now = time.monotonic()
+    with _fetch_locks_guard:
+        for stale in [k for k, (expiry, _) in _failed_fetches.items()
+                      if expiry <= now]:
+            del _failed_fetches[stale]
+        _failed_fetches[key] = (
+            now + app.config['IMAGE_FETCH_FAILURE_TTL'], error)
+
+
+def get_thumbnail(key, image_link):
+    '''Path of the cached thumbnail, fetching and resizing it on a miss'''
+    global _writes_since_eviction
+    path = cache_path(key)
+    if os.path.exists(path):
+        # bump mtime so eviction treats it as recently used
+        os.utime(path)
+        return path
+
+    with _fetch_locks_guard:
+        entry = _fetch_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    evict = False
+    try:
+        with entry[0]:
+            with _fetch_locks_guard:
+                expiry, error = _failed_fetches.get(key, (0, None))
+            if expiry > time.monotonic():
+                raise ValueError(f'{error} (failed recently)')
+            # another request may have filled the cache while we waited
+            if not os.path.exists(path):
+                try:
+                    data = make_thumbnail(fetch_image(image_link))
+                except Exception as e:
+                    remember_failure(key, e)
+                    raise
+                write_atomically(path, data)
+                with _fetch_locks_guard:
+                    _writes_since_eviction += 1
+                    if _writes_since_eviction >= \
+                            app.config['IMAGE_CACHE_EVICTION_INTERVAL']:
+                        _writes_since_eviction = 0
+                        evict = True
+    finally:
+        with _fetch_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _fetch_locks[key]
+
+    if evict:
+        evict_thumbnails(keep=path)
+    return path
+
+
+@app.route('/images/<kind>/<int:entity_id>/<key>.jpg', methods=['GET'])
+def image_thumbnail(kind, entity_id, key):
+    model = IMAGE_MODELS.get(kind)
+    if model is None:
+        abort(404)
+
+    image_link = db.session.query(model.image_link).filter(
+        model.id == entity_id, model.deleted_at.is_(None)).scalar()
+    if not image_link or urlparse(image_link).scheme not in ('http', 'https'):
+        abort(404)
+
+    current_key = thumbnail_key(image_link)
+    if key != current_key:
+        # the image link changed since this url was rendered
+        return redirect(url_for('image_thumbnail', kind=kind,
+                                entity_id=entity_id, key=current_key))
+
+    try:
+        path = get_thumbnail(key, image_link)
+    except Exception as e:
+        log_error(f'Error - [GET] /images/{kind}/{entity_id} - {e}')
+        # fall back to hot-linking rather than breaking the page
+        return redirect(image_link)
+
+    response = send_file(path, mimetype='image/jpeg', conditional=True,
+                         cache_timeout=app.config['IMAGE_CACHE_MAX_AGE'])
+    response.cache_control.public = True
+    response.headers['Cache-Control'] += ', immutable'
+    return response
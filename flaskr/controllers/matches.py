@@ -0,0 +1,45 @@
+from flask import abort, flash, render_template
+from flaskr.app import app
+from flaskr.logs import log_error
+from flaskr import matching, queries
+
+#  Matches
+#  ----------------------------------------------------------------
+
+
+@app.route('/artists/<int:artist_id>/matches', methods=['GET'])
+def artist_matches(artist_id):
+    try:
+        artist = queries.get_artist(artist_id)
+        if not artist:
+            abort(404, 'Artist does not exist')
+        matches = matching.venues_for_artist(
+            artist, app.config['MATCH_RESULTS'])
+        return render_template('pages/matches.html', entity=artist,
+                               kind='venues', matches=matches)
+    except Exception as e:
+        log_error(f'Error - [GET] /artists/{artist_id}/matches - {e}')
+        err_message = getattr(
+            e, 'message', 'Matching venues could not be found at this time')
+        err_status = getattr(e, 'code', 500)
+        flash(err_message)
+        abort(err_status)
+
+
+@app.route('/venues/<int:venue_id>/matches', methods=['GET'])
+def venue_matches(venue_id):
+    try:
+        venue = queries.get_venue(venue_id)
+        if not venue:
+            abort(404, 'Venue does not exist')
+        matches = matching.artists_for_venue(
+            venue, app.config['MATCH_RESULTS'])
+        return render_template('pages/matches.html', entity=venue,
+                               kind='artists', matches=matches)
+    except Exception as e:
+        log_error(f'Error - [GET] /venues/{venue_id}/matches - {e}')
+        err_message = getattr(
+            e, 'message', 'Matching artists could not be found at this time')
+        err_status = getattr(e, 'code', 500)
+        flash(err_message)
+        abort(err_status)
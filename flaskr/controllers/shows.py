@@ -2,8 +2,12 @@
 from flask import abort, flash, redirect, render_template, request, url_for
 from flaskr.db import db
 from flaskr.app import app
-from flaskr.models import Show, Artist, Venue
-from flaskr.forms import ShowForm
+from flaskr.logs import log_error
+from flaskr.compress import stream_template
+from flaskr.models import Show
+from flaskr.forms import ShowForm, ShowSearchForm
+from flaskr.show_search import SearchFilters, search_shows
+from flaskr import queries
 
 #  Shows
 #  ----------------------------------------------------------------
@@ -12,25 +16,48 @@ from flaskr.forms import ShowForm
 @app.route('/shows', methods=['GET'])
 def shows():
     try:
-        shows = db.session.query(
-            Show.id,
-            Show.start_time,
-            Show.end_time,
-            Artist.id.label('artist_id'),
-            Artist.name.label('artist_name'),
-            Artist.image_link.label('artist_image_link'),
-            Venue.id.label('venue_id'),
-            Venue.name.label('venue_name')
-        ).select_from(Show).join(Artist, Venue).all()
+        shows = db.session.execute(queries.show_listing_stmt()).all()
 
-        return render_template('pages/shows.html', shows=shows)
+        return stream_template('pages/shows.html', shows=shows)
     except Exception as e:
-        db.session.close()
-        print(f'Error - [GET] /shows - {e}')
+        log_error(f'Error - [GET] /shows - {e}')
         flash('Shows could not be fetched at this time. Refresh or try again later.')
         abort(500)
-    finally:
-        db.session.close()
+
+
+#  Search Shows
+#  ----------------------------------------------------------------
+
+
+@app.route('/shows/search', methods=['GET'])
+def search_shows_page():
+    try:
+        # e.g. start_date=2024-05-01&state=NY&city=brooklyn&genres=3&after=812
+        form = ShowSearchForm(request.args)
+        form.genres.choices = queries.genre_choices()
+        if request.args and not form.validate():
+            app.logger.info(f'Invalid show search: {form.errors}')
+            return render_template('pages/search_shows.html', form=form,
+                                   shows=[], next_after=None), 400
+        shows, next_after = search_shows(
+            SearchFilters.from_form(form),
+            request.args.get('after', type=int))
+        # the query string for the next page, the cursor swapped in
+        next_args = request.args.to_dict(flat=False)
+        next_args['after'] = next_after
+        return render_template('pages/search_shows.html', form=form,
+                               shows=shows, next_after=next_after,
+                               next_args=next_args)
+    except LookupError as e:
+        # the page cursor was deleted or archived, start over
+        flash(str(e))
+        args = request.args.to_dict(flat=False)
+        args.pop('after', None)
+        return redirect(url_for('search_shows_page', **args))
+    except Exception as e:
+        log_error(f'Error - [GET] /shows/search - {e}')
+        flash('Shows could not be searched at this time. Refresh or try again later.')
+        abort(500)
 
 
 #  Create Show
@@ -59,8 +86,6 @@ def create_show_submission():
         return render_template('pages/home.html')
     except Exception as e:
         db.session.rollback()
-        print(f'Error - GET /shows/create - {e}')
+        log_error(f'Error - GET /shows/create - {e}')
         flash('An error occurred. Show could not be listed.')
         return redirect(url_for('create_shows'))
-    finally:
-        db.session.close()
@@ -1,9 +1,14 @@
 import pytz
 from datetime import datetime
 from flask import abort, flash, json, redirect, render_template, request, url_for
+from sqlalchemy.orm.exc import StaleDataError
 from flaskr.db import db
 from flaskr.app import app
-from flaskr.models import Venue, Genre, Show, Artist
+from flaskr.logs import log_error
+from flaskr.compress import stream_template
+from flaskr import archive, dedup, deletion, edits, queries
+from flaskr.recommendations import similar_entities
+from flaskr.models import Venue, Artist
 from flaskr.forms import VenueForm
 
 #  Venues
@@ -13,36 +18,14 @@ from flaskr.forms import VenueForm
 @app.route('/venues', methods=['GET'])
 def venues():
     try:
-        all_venues = Venue.query.all()
-        places = {}
-        now = datetime.now(pytz.utc)
-
-        # massage data for expected format
-        for venue in all_venues:
-            num_upcoming_shows = len([
-                show for show in venue.shows if show.start_time >= now])
-            new_venue_data = {
-                'id': venue.id,
-                'name': venue.name,
-                'num_upcoming_shows': num_upcoming_shows
-            }
-            if places.get(f'{venue.state}{venue.city}', None):
-                places[f'{venue.state}{venue.city}']['venues'].append(
-                    new_venue_data)
-            else:
-                places[f'{venue.state}{venue.city}'] = {
-                    'city': venue.city,
-                    'state': venue.state,
-                    'venues': [new_venue_data]
-                }
-        data = places.values()
-        return render_template('pages/venues.html', areas=data)
+        all_venues = db.session.execute(
+            queries.venue_listing_stmt(datetime.now(pytz.utc))).all()
+        data = queries.venue_areas(all_venues)
+        return stream_template('pages/venues.html', areas=data)
     except Exception as e:
-        print(f'Error - [GET] /venues - {e}')
+        log_error(f'Error - [GET] /venues - {e}')
         flash('Venues could not be fetched at this time.')
         abort(500)
-    finally:
-        db.session.close()
 
 #  Search
 #  ----------------------------------------------------------------
@@ -52,30 +35,23 @@ def venues():
 def search_venues():
     try:
         search_term = request.form.get('search_term', '')
-        data = Venue.query.filter(Venue.name.ilike(f'%{search_term}%'))
+        # only the columns the results page needs, in a single round trip
+        # optional genre filter, e.g. genres=1&genres=3&genre_match=all
+        genre_ids = request.form.getlist('genres', type=int)
+        match_all = request.form.get('genre_match') == 'all'
+        data = queries.search_venues(search_term, genre_ids, match_all)
         response = {
-            "count": data.count(),
-            "data": data.all()
+            "count": len(data),
+            "data": data
         }
         return render_template('pages/search_venues.html',
                                results=response, search_term=search_term)
     except Exception as e:
-        print(f'Error - [POST] /venues/search - {e}')
+        log_error(f'Error - [POST] /venues/search - {e}')
         flash('Venues could not be searched at this time. Refresh or try again later.')
         abort(500)
-    finally:
-        db.session.close()
 
 
-def select_show_details_for_venue(show):
-    artist = show.artist
-    return {
-        'artist_id': artist.id,
-        'artist_name': artist.name,
-        'artist_image_link': artist.image_link,
-        'start_time': show.start_time,
-    }
-
 #  Venue
 #  ----------------------------------------------------------------
 
@@ -83,16 +59,16 @@ def select_show_details_for_venue(show):
 @app.route('/venues/<int:venue_id>', methods=['GET'])
 def show_venue(venue_id):
     try:
-        venue = Venue.query.get(venue_id)
+        venue = queries.get_venue(venue_id)
         if not venue:
             abort(404, 'Venue does not exist')
 
         now = datetime.now(pytz.utc)
 
-        past_shows = [select_show_details_for_venue(
-            show) for show in venue.shows if show.end_time <= now]
-        upcoming_shows = [select_show_details_for_venue(
-            show) for show in venue.shows if show.start_time >= now]
+        # recent past shows only, older ones are paged in on request
+        past_shows = archive.past_shows(
+            'venue_id', venue_id, now, app.config['SHOW_PAST_PREVIEW'])
+        upcoming_shows = archive.upcoming_shows('venue_id', venue_id, now)
         data = {
             'id': venue.id,
             'name': venue.name,
@@ -108,20 +84,46 @@ def show_venue(venue_id):
             'image_link': venue.image_link,
             'past_shows': past_shows,
             'upcoming_shows': upcoming_shows,
-            'past_shows_count': len(past_shows),
+            'past_shows_count': archive.past_show_count(
+                'venue_id', venue_id, now),
             'upcoming_shows_count': len(upcoming_shows),
+            'similar': similar_entities('venues', venue_id),
         }
 
         return render_template('pages/show_venue.html', venue=data)
     except Exception as e:
-        print(f'Error - [GET] venues/{venue_id} - {e}')
+        log_error(f'Error - [GET] venues/{venue_id} - {e}')
         err_message = getattr(
             e, 'message', 'Venue could not be fetched at this time')
         err_status = getattr(e, 'code', 500)
         flash(err_message)
         abort(err_status)
-    finally:
-        db.session.close()
+
+
+@app.route('/venues/<int:venue_id>/archive', methods=['GET'])
+def venue_archive(venue_id):
+    try:
+        name = db.session.query(Venue.name).filter(
+            Venue.id == venue_id, Venue.deleted_at.is_(None)).scalar()
+        if name is None:
+            abort(404, 'Venue does not exist')
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = app.config['SHOW_ARCHIVE_PAGE_SIZE']
+        # one extra row tells whether there's a next page
+        shows = archive.past_shows('venue_id', venue_id,
+                                   datetime.now(pytz.utc), per_page + 1,
+                                   (page - 1) * per_page)
+        return render_template('pages/past_shows.html', kind='venues',
+                               entity={'id': venue_id, 'name': name},
+                               shows=shows[:per_page], page=page,
+                               has_next=len(shows) > per_page)
+    except Exception as e:
+        log_error(f'Error - [GET] /venues/{venue_id}/archive - {e}')
+        err_message = getattr(
+            e, 'message', 'Past shows could not be fetched at this time')
+        err_status = getattr(e, 'code', 500)
+        flash(err_message)
+        abort(err_status)
 
 
 #  Create Venue
@@ -132,15 +134,12 @@ def show_venue(venue_id):
 def create_venue_form():
     view = ''
     try:
-        all_genres = Genre.query.all()
         form = VenueForm()
-        form.genres.choices = [(genre.id, genre.name) for genre in all_genres]
+        form.genres.choices = queries.genre_choices()
         return render_template('forms/new_venue.html', form=form)
     except Exception as e:
-        print(f'Error - [GET] venues/create - {e}')
+        log_error(f'Error - [GET] venues/create - {e}')
         abort(500)
-    finally:
-        db.session.close()
 
 
 @app.route('/venues/create', methods=['POST'])
@@ -162,15 +161,17 @@ def create_venue_submission():
             website=venue_data.get('website', None),
         )
 
-        venue_genre_data = venue_data.getlist('genres')
-        genres = [Genre.query.get(id) for id in venue_genre_data]
-        venue.genres = genres
-
         # validate form inputs
         form = VenueForm(data=venue_data)
-        form.genres.choices = [(genre.id, genre.name)
-                               for genre in Genre.query.all()]
+        form.genres.choices = queries.genre_choices()
         if form.validate_on_submit():
+            # the ids as checked (and coerced) by the form
+            venue.genres = queries.genres_by_ids(form.genres.data)
+            duplicate = dedup.find_duplicate(venue)
+            if duplicate:
+                db.session.rollback()
+                flash(f'Venue {duplicate.name} is already listed, see /venues/{duplicate.id}.')
+                return render_template('forms/new_venue.html', form=form)
             db.session.add(venue)
             db.session.commit()
             flash(f'Venue {venue.name} was successfully listed!')
@@ -182,11 +183,9 @@ def create_venue_submission():
     except Exception as e:
         db.session.rollback()
         venue_name = venue_data.get('name')
-        print(f'Error - [POST] venues/create - {e}')
+        log_error(f'Error - [POST] venues/create - {e}')
         flash(f'Venue {venue_name} could not be created.')
         abort(500)
-    finally:
-        db.session.close()
 
 
 #  Update Venue
@@ -196,7 +195,7 @@ def create_venue_submission():
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     try:
-        data = Venue.query.get(venue_id)
+        data = queries.get_venue(venue_id)
         if not data:
             abort(404, 'Venue does not exist')
 
@@ -212,91 +211,104 @@ def edit_venue(venue_id):
             'phone': data.phone,
             'seeking_talent': data.seeking_talent,
             'seeking_description': data.seeking_description,
-            'website': data.website,
+            'website_link': data.website,
+            'version': data.version,
         }
 
         # prepopulate form with existing values from artist data
         form = VenueForm(data=venue)
-        all_genres = Genre.query.all()
-        form.genres.choices = [(genre.id, genre.name) for genre in all_genres]
+        form.genres.choices = queries.genre_choices()
         return render_template('forms/edit_venue.html', form=form, venue=venue)
     except Exception as e:
         db.session.rollback()
-        print(f'Error - [GET] venues/{venue_id}/edit - {e}')
+        log_error(f'Error - [GET] venues/{venue_id}/edit - {e}')
         err_message = getattr(
             e, 'message', 'Venue could not be fetched at this time')
         err_status = getattr(e, 'code', 500)
         flash(err_message)
         abort(err_status)
-    finally:
-        db.session.close()
+
+
+def edit_venue_conflict(form, venue):
+    '''Re-render an edit made against an outdated version of the venue'''
+    db.session.rollback()
+    # resubmitting overwrites the other edit, so make that a deliberate choice
+    form.version.data = str(venue.version)
+    flash(f'{venue.name} was changed by someone else while you were editing '
+          'it. Check their changes and resubmit to overwrite them.')
+    return render_template('forms/edit_venue.html',
+                           form=form, venue=venue), 409
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     try:
-        venue = Venue.query.get(venue_id)
+        venue = queries.get_venue(venue_id)
 
         if not venue:
             abort(404, 'Venue does not exist')
 
-        form_data = request.form
-
-        venue.name = form_data.get('name')
-        venue.facebook_link = form_data.get('facebook_link')
-        venue.image_link = form_data.get('image_link')
-        venue.genres = [Genre.query.get(id)
-                        for id in form_data.getlist('genres')]
-        venue.city = form_data.get('city')
-        venue.state = form_data.get('state')
-        venue.phone = form_data.get('phone')
-        venue.seeking_talent = form_data.get('seeking_venue') == 'y'
-        venue.seeking_description = form_data.get('seeking_description')
-        venue.website = form_data.get('website')
-
-        # validate form inputs
-        form = VenueForm(data=form_data)
-        all_genres = Genre.query.all()
-        form.genres.choices = [(genre.id, genre.name) for genre in all_genres]
-        if form.validate_on_submit():
-            db.session.commit()
-            return redirect(url_for('show_venue', venue_id=venue_id))
-        else:
-            print(form.errors)
-            db.session.rollback()
+        # validate the form inputs
+        form = VenueForm(data=request.form)
+        form.genres.choices = queries.genre_choices()
+        if not form.validate_on_submit():
+            app.logger.info(f'Invalid form: {form.errors}')
             flash(f'Invalid venue details. Fix errors before resubmitting.')
             return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+        if form.version.data and form.version.data != str(venue.version):
+            return edit_venue_conflict(form, venue)
+
+        form_data = request.form
+        # only write the fields that changed
+        changed = edits.apply_changes(venue, {
+            'name': form_data.get('name'),
+            'facebook_link': form_data.get('facebook_link'),
+            'image_link': form_data.get('image_link'),
+            'address': form_data.get('address'),
+            'city': form_data.get('city'),
+            'state': form_data.get('state'),
+            'phone': form_data.get('phone'),
+            'seeking_talent': form_data.get('seeking_talent') == 'y',
+            'seeking_description': form_data.get('seeking_description'),
+            'website': form_data.get('website_link'),
+        })
+        genres_changed = edits.apply_genres(
+            venue, form_data.getlist('genres'))
+        if changed or genres_changed:
+            try:
+                db.session.commit()
+            except StaleDataError:
+                # saved by someone else since it was loaded above
+                return edit_venue_conflict(form, venue)
+        return redirect(url_for('show_venue', venue_id=venue_id))
     except Exception as e:
         db.session.rollback()
-        print(f'Error - [POST] venues/{venue_id}/edit - {e}')
+        log_error(f'Error - [POST] venues/{venue_id}/edit - {e}')
         err_message = getattr(
             e, 'message', 'Could not edit venue at this time. Try again later.')
         err_status = getattr(e, 'code', 500)
         flash(err_message)
         abort(err_status)
-    finally:
-        db.session.close()
 
 
 #  Delete Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     success = False
     status = 500
     try:
-        venue = Venue.query.get(venue_id)
-        if not venue:
-            abort(404, 'Venue does not exist')
-        db.session.delete(venue)
-        db.session.commit()
-        success = True
-        status = 200
+        # a single UPDATE, neither the venue nor its shows are loaded
+        if deletion.soft_delete(Venue, [venue_id]):
+            db.session.commit()
+            success = True
+            status = 200
+        else:
+            status = 404
     except Exception as e:
         db.session.rollback()
-        print(f'Error - [DELETE] venues/{venue_id} - {e}')
-    finally:
-        db.session.close()
-        return json.dumps(success), status
+        log_error(f'Error - [DELETE] venues/{venue_id} - {e}')
+    return json.dumps(success), status
@@ -1,6 +1,114 @@
+from flask import g, has_app_context, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlalchemy.util import perf_counter
 from flaskr.app import app
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
+
+#  Session lifecycle
+#  ----------------------------------------------------------------
+#  Each request gets one session/transaction, opened lazily on first use and
+#  closed here at teardown, so handlers don't need their own try/finally.
+
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+def is_read_request():
+    return request.method in READ_METHODS
+
+
+# process-wide compiled statement cache counters
+statement_cache_stats = {
+    'hits': 0,
+    'misses': 0,
+    'compile_time': 0.0,
+}
+
+
+def statement_cache_hit_rate():
+    lookups = statement_cache_stats['hits'] + statement_cache_stats['misses']
+    return statement_cache_stats['hits'] / lookups if lookups else 0.0
+
+
+def average_compile_time():
+    misses = statement_cache_stats['misses']
+    return statement_cache_stats['compile_time'] / misses if misses else 0.0
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    cache_hit = getattr(context, 'cache_hit', None)
+    if cache_hit is CACHE_HIT:
+        statement_cache_stats['hits'] += 1
+    elif cache_hit is CACHE_MISS:
+        statement_cache_stats['misses'] += 1
+        # time since the compiler started, i.e. what a cache hit saves
+        statement_cache_stats['compile_time'] += \
+            perf_counter() - context.compiled._gen_time
+
+    # round trips issued while handling the current request
+    if has_app_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+        if cache_hit is CACHE_HIT:
+            g.sql_cache_hits = g.get('sql_cache_hits', 0) + 1
+
+
+@app.before_request
+def begin_request_session():
+    g.sql_statements = 0
+    g.sql_cache_hits = 0
+    if request.endpoint == 'static' or not is_read_request():
+        return
+    if app.config['SQLALCHEMY_READ_AUTOFLUSH_OFF']:
+        # reads never have pending changes, so skip the pre-query flush checks
+        db.session.autoflush = False
+    if app.config['SQLALCHEMY_READ_ONLY_GETS']:
+        # applied when the session first uses a connection, so requests
+        # that never query (assets, cached images) don't check one out
+        db.session.info['read_only'] = True
+
+
+@event.listens_for(Session, 'after_begin')
+def begin_read_only(session, transaction, connection):
+    if session.info.get('read_only') and \
+            connection.dialect.name == 'postgresql':
+        # the transaction's first statement of ours, though the pool's
+        # pre-ping may already have run in it; turning a transaction read
+        # only is allowed after queries, and it ends with the transaction
+        connection.exec_driver_sql('SET TRANSACTION READ ONLY')
+
+
+@app.after_request
+def report_statement_count(response):
+    if app.debug:
+        cache_hits = g.get('sql_cache_hits', 0)
+        response.headers['X-SQL-Statements'] = str(g.get('sql_statements', 0))
+        response.headers['X-SQL-Cache-Hits'] = str(cache_hits)
+        # estimated compile time the statement cache saved this request
+        response.headers['X-SQL-Compile-Saved'] = \
+            '{:.3f}ms'.format(cache_hits * average_compile_time() * 1000)
+        response.headers['X-SQL-Cache-Hit-Rate'] = \
+            '{:.2f}'.format(statement_cache_hit_rate())
+    return response
+
+
+@app.after_request
+def commit_request_session(response):
+    # anything still pending is committed for successful writes when
+    # running a transaction per request, otherwise it's discarded. Done
+    # before the response goes out, so a failed commit is still a 500
+    if app.config['SQLALCHEMY_TRANSACTION_PER_REQUEST'] and \
+            not is_read_request() and response.status_code < 400:
+        db.session.commit()
+    return response
+
+
+@app.teardown_request
+def end_request_session(exc):
+    db.session.remove()
@@ -0,0 +1,277 @@
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+import click
+from sqlalchemy import bindparam, delete, event, inspect, or_, update
+from sqlalchemy.orm import Session
+from flaskr.app import app
+from flaskr.autocomplete import normalize
+from flaskr.db import db
+from flaskr.models import Artist, Recommendation, Show, ShowArchive, Venue
+
+#----------------------------------------------------------------------------#
+# Duplicate detection.
+#----------------------------------------------------------------------------#
+
+# Every venue/artist carries a dedup_key, its normalized name plus address or
+# phone, and a new one with the key of an existing one is refused. Near
+# duplicates that differ by a typo or a word are left to an offline job
+# (`flask dedup find`): entities are blocked by city/state and, within a
+# block, sorted by name so each is only compared with its few neighbours,
+# keeping the number of comparisons close to linear. `flask dedup merge`
+# folds a duplicate into the entity to keep.
+
+STOP_WORDS = {'the', 'a', 'an', 'and'}
+ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'road': 'rd', 'boulevard': 'blvd',
+    'drive': 'dr', 'lane': 'ln', 'place': 'pl', 'court': 'ct',
+    'suite': 'ste', 'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+}
+
+
+def normalize_name(name):
+    return ' '.join(word for word in normalize(name).split()
+                    if word not in STOP_WORDS)
+
+
+def normalize_address(address):
+    return ' '.join(ABBREVIATIONS.get(word, word)
+                    for word in normalize(address).split())
+
+
+def phone_digits(phone):
+    # national number only, so +1 and punctuation don't matter
+    return re.sub(r'\D', '', phone or '')[-10:]
+
+
+def venue_key(venue):
+    name = normalize_name(venue.name)
+    place = normalize_address(venue.address) or phone_digits(venue.phone)
+    return f'{name}|{place}'[:255] if name else None
+
+
+def artist_key(artist):
+    name = normalize_name(artist.name)
+    place = phone_digits(artist.phone) or \
+        f'{normalize(artist.city)} {(artist.state or "").upper()}'.strip()
+    return f'{name}|{place}'[:255] if name else None
+
+
+# key function and the attributes it reads, per model
+DEDUP_KEYS = {
+    Venue: (venue_key, ('name', 'address', 'phone')),
+    Artist: (artist_key, ('name', 'phone', 'city', 'state')),
+}
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+}
+
+
+@event.listens_for(Session, 'before_flush')
+def sync_dedup_keys(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if type(obj) not in DEDUP_KEYS:
+            continue
+        key, attrs = DEDUP_KEYS[type(obj)]
+        state = inspect(obj)
+        if obj in session.new or any(
+                state.attrs[attr].history.has_changes() for attr in attrs):
+            obj.dedup_key = key(obj)
+
+
+def find_duplicate(obj):
+    '''An existing venue/artist with the same dedup key as obj, or None'''
+    model = type(obj)
+    key = DEDUP_KEYS[model][0](obj)
+    if key is None:
+        return None
+    # obj may already be pending in the session, don't flush it to look
+    with db.session.no_autoflush:
+        query = db.session.query(model.id, model.name).filter(
+            model.dedup_key == key, model.deleted_at.is_(None))
+        if obj.id is not None:
+            query = query.filter(model.id != obj.id)
+        return query.order_by(model.id).first()
+
+
+#  Fuzzy matching
+#  ----------------------------------------------------------------
+
+
+def blocks(model):
+    '''Entities grouped by normalized city and state'''
+    grouped = defaultdict(list)
+    rows = db.session.query(model.id, model.name, model.city,
+                            model.state).filter(
+        model.deleted_at.is_(None)).order_by(model.id)
+    for row in rows.yield_per(app.config['DEDUP_BATCH_SIZE']):
+        name = normalize_name(row.name)
+        if name:
+            grouped[(normalize(row.city), (row.state or '').upper())].append(
+                (name, row.id, row.name))
+    return grouped.values()
+
+
+def similar_pairs(block, threshold, window):
+    '''(score, a, b) pairs scoring at least threshold, comparing each entry
+    with the next `window` entries in name order and in sorted-word order'''
+    seen = set()
+    sort_keys = (lambda entry: entry[0],
+                 lambda entry: ' '.join(sorted(entry[0].split())))
+    for sort_key in sort_keys:
+        ordered = sorted(block, key=sort_key)
+        for i, (name, entity_id, label) in enumerate(ordered):
+            for other_name, other_id, other_label in \
+                    ordered[i + 1:i + 1 + window]:
+                pair = (min(entity_id, other_id), max(entity_id, other_id))
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                matcher = SequenceMatcher(None, name, other_name)
+                # cheap upper bounds first
+                if matcher.real_quick_ratio() < threshold or \
+                        matcher.quick_ratio() < threshold:
+                    continue
+                score = matcher.ratio()
+                if score >= threshold:
+                    yield score, (entity_id, label), (other_id, other_label)
+
+
+def find_similar(kind, threshold, window):
+    pairs = []
+    for block in blocks(MODELS[kind]):
+        pairs.extend(similar_pairs(block, threshold, window))
+    return sorted(pairs, key=lambda pair: -pair[0])
+
+
+#  Merging
+#  ----------------------------------------------------------------
+
+# details copied from the duplicate when the kept entity has none
+MERGED_FIELDS = ('address', 'phone', 'website', 'facebook_link',
+                 'image_link', 'seeking_description')
+
+SHOW_COLUMNS = {
+    'venues': 'venue_id',
+    'artists': 'artist_id',
+}
+
+
+def merge(kind, keep_id, duplicate_id):
+    '''Fold a duplicate into the entity to keep, returning shows moved'''
+    model = MODELS[kind]
+    # deleted entities can't be merged either way; the row locks make a
+    # concurrent delete wait for the merge
+    entities = {entity.id: entity for entity in db.session.query(
+        model).filter(model.id.in_((keep_id, duplicate_id)),
+                      model.deleted_at.is_(None)).with_for_update()}
+    keep, duplicate = entities.get(keep_id), entities.get(duplicate_id)
+    if keep is None or duplicate is None or keep is duplicate:
+        raise ValueError(f'Need two existing {kind} to merge')
+
+    column = SHOW_COLUMNS[kind]
+    # through the orm, so listings and the change log follow
+    shows = db.session.query(Show).filter(
+        getattr(Show, column) == duplicate_id).all()
+    for show in shows:
+        setattr(show, column, keep_id)
+    db.session.execute(update(ShowArchive).where(
+        getattr(ShowArchive, column) == duplicate_id).values(
+        {column: keep_id}))
+
+    keep.genres = keep.genres + [genre for genre in duplicate.genres
+                                 if genre not in keep.genres]
+    for field in MERGED_FIELDS:
+        if hasattr(model, field) and not getattr(keep, field) and \
+                getattr(duplicate, field):
+            setattr(keep, field, getattr(duplicate, field))
+
+    db.session.execute(delete(Recommendation).where(
+        Recommendation.entity_type == kind,
+        or_(Recommendation.entity_id == duplicate_id,
+            Recommendation.neighbour_id == duplicate_id)))
+    # repoint the shows before the delete could cascade to them
+    db.session.flush()
+    db.session.delete(duplicate)
+    db.session.commit()
+    return len(shows)
+
+
+#  Commands
+#  ----------------------------------------------------------------
+
+
+@app.cli.group()
+def dedup():
+    '''Duplicate venues/artists.'''
+
+
+@dedup.command('keys')
+def keys_command():
+    '''Recompute every venue and artist dedup key.'''
+    batch_size = app.config['DEDUP_BATCH_SIZE']
+    try:
+        for kind, model in MODELS.items():
+            key = DEDUP_KEYS[model][0]
+            table = model.__table__
+            # leave updated_at alone, the catalogue itself isn't changing
+            stmt = update(table).where(table.c.id == bindparam('_id')).values(
+                dedup_key=bindparam('_key'), updated_at=table.c.updated_at)
+            total = 0
+            last_id = 0
+            while True:
+                batch = db.session.query(model).filter(
+                    model.id > last_id).order_by(model.id).limit(
+                    batch_size).all()
+                if not batch:
+                    break
+                db.session.execute(stmt, [{'_id': obj.id, '_key': key(obj)}
+                                          for obj in batch])
+                db.session.commit()
+                last_id = batch[-1].id
+                total += len(batch)
+            click.echo(f'Updated {total} {kind} keys')
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
+
+
+@dedup.command('find')
+@click.argument('kind', type=click.Choice(sorted(MODELS)))
+@click.option('--threshold', type=float,
+              default=lambda: app.config['DEDUP_MATCH_THRESHOLD'])
+@click.option('--window', type=int,
+              default=lambda: app.config['DEDUP_WINDOW'])
+def find_command(kind, threshold, window):
+    '''List likely duplicate venues or artists, best matches first.'''
+    try:
+        pairs = find_similar(kind, threshold, window)
+    finally:
+        db.session.remove()
+    for score, (a_id, a_name), (b_id, b_name) in pairs:
+        click.echo(f'{score:.2f}  {a_id:>6} {a_name!r:40} {b_id:>6} {b_name!r}')
+    click.echo(f'{len(pairs)} candidate pairs')
+
+
+@dedup.command('merge')
+@click.argument('kind', type=click.Choice(sorted(MODELS)))
+@click.argument('keep_id', type=int)
+@click.argument('duplicate_id', type=int)
+def merge_command(kind, keep_id, duplicate_id):
+    '''Move a duplicate's shows and genres to KEEP_ID and delete it.'''
+    try:
+        moved = merge(kind, keep_id, duplicate_id)
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
+    click.echo(f'Merged {kind} {duplicate_id} into {keep_id}, '
+               f'moving {moved} shows')
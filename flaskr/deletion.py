@@ -0,0 +1,141 @@
+import time
+import click
+import pytz
+from datetime import datetime, timedelta
+from sqlalchemy import delete, or_, select, update
+from flaskr.app import app
+from flaskr.changes import ENTITY_TYPES, log_deletes
+from flaskr.db import db
+from flaskr.hooks import Change, record_changes
+from flaskr.listing import remove_entity_listings
+from flaskr.models import Artist, Recommendation, Venue
+
+#----------------------------------------------------------------------------#
+# Deleting venues and artists.
+#----------------------------------------------------------------------------#
+
+# Deleting a venue or artist is a single UPDATE setting deleted_at, however
+# many shows it has: nothing is loaded, its show listings are dropped and
+# the change log, caches and indexes are told it (and its shows) are gone.
+# From then on every query skips it. `flask deleted purge` removes rows
+# deleted longer than DELETED_RETENTION_DAYS ago in batches, one DELETE per
+# batch, leaving the shows, genre links and listings to the database's
+# ON DELETE CASCADE. Bulk statements bypass the ORM, so objects already
+# loaded in the session aren't updated.
+
+MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+}
+
+
+def soft_delete(model, ids):
+    '''Mark the given venues/artists deleted, returning the ids that were'''
+    session = db.session
+    ids = session.execute(select(model.id).where(
+        model.id.in_(list(ids)), model.deleted_at.is_(None))).scalars().all()
+    if not ids:
+        return []
+    table = model.__table__
+    # bump the version, so edits still in flight fail rather than revive it
+    session.execute(update(table).where(table.c.id.in_(ids)).values(
+        deleted_at=datetime.now(pytz.utc), version=table.c.version + 1))
+    remove_entity_listings(session.connection(), model, ids)
+    log_deletes(session, model, ids)
+    record_changes(session, [Change('deleted', model, entity_id, {})
+                             for entity_id in ids])
+    return ids
+
+
+def hard_delete(model, ids):
+    '''
+    DELETE the given venues/artists in one statement, the database removing
+    their shows, genre links and listings
+    '''
+    ids = list(ids)
+    if not ids:
+        return
+    # recommendations don't reference their entities through foreign keys
+    db.session.execute(delete(Recommendation).where(
+        Recommendation.entity_type == ENTITY_TYPES[model],
+        or_(Recommendation.entity_id.in_(ids),
+            Recommendation.neighbour_id.in_(ids))))
+    db.session.execute(delete(model.__table__).where(
+        model.__table__.c.id.in_(ids)))
+
+
+def delete_now(model, ids):
+    '''Soft delete, for the bookkeeping, then remove the rows right away'''
+    ids = soft_delete(model, ids)
+    hard_delete(model, ids)
+    return ids
+
+
+def purge_deleted(model, cutoff, batch_size):
+    '''Remove rows soft deleted before cutoff, yielding progress'''
+    total = 0
+    while True:
+        ids = db.session.execute(select(model.id).where(
+            model.deleted_at < cutoff).order_by(model.id).limit(
+            batch_size)).scalars().all()
+        if not ids:
+            break
+        hard_delete(model, ids)
+        # one short transaction per batch
+        db.session.commit()
+        total += len(ids)
+        yield total
+
+
+#  Commands
+#  ----------------------------------------------------------------
+
+
+@app.cli.group()
+def deleted():
+    '''Deleting and purging venues/artists.'''
+
+
+@deleted.command('delete')
+@click.argument('kind', type=click.Choice(sorted(MODELS)))
+@click.argument('ids', type=int, nargs=-1, required=True)
+@click.option('--purge', is_flag=True,
+              help='Remove the rows now instead of after the retention period.')
+def delete_command(kind, ids, purge):
+    '''Delete many venues or artists at once.'''
+    model = MODELS[kind]
+    try:
+        deleted_ids = (delete_now if purge else soft_delete)(model, ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
+    missing = sorted(set(ids) - set(deleted_ids))
+    click.echo(f'Deleted {len(deleted_ids)} {kind}' + (
+        f', not found or already deleted: {missing}' if missing else ''))
+
+
+@deleted.command('purge')
+@click.option('--days', type=int,
+              default=lambda: app.config['DELETED_RETENTION_DAYS'],
+              help='Purge venues/artists deleted more than this many days ago.')
+@click.option('--batch-size', type=int,
+              default=lambda: app.config['DELETED_PURGE_BATCH'])
+def purge_command(days, batch_size):
+    '''Remove deleted venues and artists past the retention period.'''
+    cutoff = datetime.now(pytz.utc) - timedelta(days=days)
+    try:
+        for kind, model in MODELS.items():
+            start = time.perf_counter()
+            purged = 0
+            for purged in purge_deleted(model, cutoff, batch_size):
+                click.echo(f'\rPurged {purged} {kind}', nl=False)
+            click.echo(f'\rPurged {purged} {kind} deleted before '
+                       f'{cutoff:%Y-%m-%d} in {time.perf_counter() - start:.1f}s')
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
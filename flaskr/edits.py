@@ -0,0 +1,34 @@
+from flaskr import queries
+from flaskr.db import db
+
+#----------------------------------------------------------------------------#
+# Edits.
+#----------------------------------------------------------------------------#
+
+# Edit forms post every field, but only what actually changed is written:
+# unchanged columns stay out of the UPDATE, an unchanged entity isn't
+# updated at all, and genre links are added/removed individually rather than
+# the whole list being replaced.
+
+
+def apply_changes(entity, values):
+    '''Set the attributes whose value differs, returning their names'''
+    changed = [field for field, value in values.items()
+               if getattr(entity, field) != value]
+    for field in changed:
+        setattr(entity, field, values[field])
+    return changed
+
+
+def apply_genres(entity, genre_ids):
+    '''Link/unlink only the genres that changed, returning whether any did'''
+    wanted = {int(genre_id) for genre_id in genre_ids}
+    # everything goes out in the commit's single flush (one UPDATE, one
+    # version bump), not in autoflushes before the queries below
+    with db.session.no_autoflush:
+        current = {genre.id: genre for genre in entity.genres}
+        added = queries.genres_by_ids(wanted - current.keys())
+    for genre_id in current.keys() - wanted:
+        entity.genres.remove(current[genre_id])
+    entity.genres.extend(added)
+    return wanted != current.keys()
@@ -1,8 +1,8 @@
 from datetime import datetime, timedelta
 import pytz
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, URL, ValidationError
+from wtforms import StringField, SelectField, SelectMultipleField, DateField, DateTimeField, BooleanField, HiddenField
+from wtforms.validators import DataRequired, Optional, URL, ValidationError
 import re
 from flaskr.enums import State
 
@@ -56,6 +56,39 @@ class ShowForm(FlaskForm):
     )
 
 
+class ShowSearchForm(FlaskForm):
+    # submitted as a GET query string, nothing to protect
+    class Meta:
+        csrf = False
+
+    start_date = DateField(
+        'start_date', validators=[Optional()]
+    )
+    end_date = DateField(
+        'end_date', validators=[Optional()]
+    )
+    city = StringField(
+        'city'
+    )
+    state = SelectField(
+        'state', validators=[Optional()],
+        choices=[('', 'Any state')] + State.choices()
+    )
+    genres = SelectMultipleField(
+        'genres', coerce=int
+    )
+
+    def validate_end_date(self, field):
+        if field.data and self.start_date.data and \
+                field.data < self.start_date.data:
+            raise ValidationError('Must not be before the start date')
+
+    def validate_city(self, field):
+        # city names repeat across states, and the index wants both
+        if field.data and field.data.strip() and not self.state.data:
+            raise ValidationError('Pick a state to search a city')
+
+
 class VenueForm(FlaskForm):
     name = StringField(
         'name', validators=[DataRequired()]
@@ -93,6 +126,9 @@ class VenueForm(FlaskForm):
         'seeking_description'
     )
 
+    # row version the edit was made against, see edit_*_submission
+    version = HiddenField('version')
+
     def validate_phone(self, field):
         if not phone_validator(field):
             raise ValidationError('Invalid phone')
@@ -137,6 +173,9 @@ class ArtistForm(FlaskForm):
         'seeking_description'
     )
 
+    # row version the edit was made against, see edit_*_submission
+    version = HiddenField('version')
+
     def validate_phone(self, field):
         if not phone_validator(field):
             raise ValidationError('Invalid phone')
@@ -0,0 +1,67 @@
+from collections import namedtuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+#----------------------------------------------------------------------------#
+# Commit hooks.
+#----------------------------------------------------------------------------#
+
+# In-process caches and indexes need to hear about writes, but only once
+# they're durable. Changed rows are snapshotted as they're flushed (after
+# the flush their ids are known, after the commit their attributes are
+# expired) and handed to the registered callbacks once the transaction
+# commits. A rollback throws the pending changes away.
+
+Change = namedtuple('Change', ['action', 'model', 'id', 'values'])
+
+_callbacks = []
+
+
+def on_commit(callback):
+    '''Register callback(changes) to run after each commit that wrote rows'''
+    _callbacks.append(callback)
+    return callback
+
+
+def changes_for(changes, *models):
+    '''The changes to instances of any of the given models'''
+    return [change for change in changes if issubclass(change.model, models)]
+
+
+def snapshot(action, obj):
+    state = inspect(obj)
+    # only what's already loaded, never trigger a lazy load mid-flush
+    values = {attr.key: state.dict[attr.key]
+              for attr in state.mapper.column_attrs if attr.key in state.dict}
+    return Change(action, type(obj), values.get('id'), values)
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_changes(session, flush_context):
+    pending = session.info.setdefault('pending_changes', [])
+    pending.extend(snapshot('created', obj) for obj in session.new)
+    pending.extend(snapshot('updated', obj) for obj in session.dirty
+                   if session.is_modified(obj, include_collections=True))
+    pending.extend(snapshot('deleted', obj) for obj in session.deleted)
+
+
+def record_changes(session, changes):
+    '''
+    Queue changes made by bulk statements, which bypass the flush, for the
+    callbacks of the session's next commit
+    '''
+    session.info.setdefault('pending_changes', []).extend(changes)
+
+
+@event.listens_for(Session, 'after_commit')
+def dispatch_changes(session):
+    changes = session.info.pop('pending_changes', None)
+    if not changes:
+        return
+    for callback in _callbacks:
+        callback(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changes(session):
+    session.info.pop('pending_changes', None)
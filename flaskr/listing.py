@@ -0,0 +1,99 @@
+from sqlalchemy import delete, event, inspect, insert, select, update
+from sqlalchemy.orm import Session
+from flaskr.models import Artist, Show, ShowListing, Venue
+
+#----------------------------------------------------------------------------#
+# Show listing projection.
+#----------------------------------------------------------------------------#
+
+# Show pages read ShowListing, one row per live show carrying the artist and
+# venue columns they display, instead of joining Show, Artist and Venue on
+# every request. The rows are rewritten from the source tables in the same
+# flush as any show write, and an artist/venue rename, new image, location
+# or genres are copied onto their listings. Deleted artists/venues take
+# their listings with them, right away when soft deleted and through the
+# foreign keys' ON DELETE CASCADE when purged.
+
+# projected columns of each artist/venue, by source attribute
+DENORMALIZED = {
+    Artist: (ShowListing.artist_id, {
+        'name': 'artist_name',
+        'image_link': 'artist_image_link',
+        'genre_mask': 'artist_genre_mask',
+    }),
+    Venue: (ShowListing.venue_id, {
+        'name': 'venue_name',
+        'image_link': 'venue_image_link',
+        'city': 'venue_city',
+        'state': 'venue_state',
+    }),
+}
+
+
+def listing_rows(show_ids):
+    '''Select the listing rows of the given shows from the source tables'''
+    return select(
+        Show.id, Show.start_time, Show.end_time,
+        Artist.id, Artist.name, Artist.image_link, Artist.genre_mask,
+        Venue.id, Venue.name, Venue.image_link, Venue.city, Venue.state,
+    ).join(Artist, Artist.id == Show.artist_id).join(
+        Venue, Venue.id == Show.venue_id).where(
+        Show.id.in_(show_ids), Artist.deleted_at.is_(None),
+        Venue.deleted_at.is_(None))
+
+
+LISTING_COLUMNS = [
+    'id', 'start_time', 'end_time',
+    'artist_id', 'artist_name', 'artist_image_link', 'artist_genre_mask',
+    'venue_id', 'venue_name', 'venue_image_link', 'venue_city', 'venue_state',
+]
+
+
+def refresh_listings(connection, show_ids):
+    '''Rewrite the listings of the given shows from the source tables'''
+    show_ids = list(show_ids)
+    if not show_ids:
+        return
+    connection.execute(delete(ShowListing).where(
+        ShowListing.id.in_(show_ids)))
+    connection.execute(insert(ShowListing).from_select(
+        LISTING_COLUMNS, listing_rows(show_ids)))
+
+
+def remove_listings(connection, show_ids):
+    show_ids = list(show_ids)
+    if show_ids:
+        connection.execute(delete(ShowListing).where(
+            ShowListing.id.in_(show_ids)))
+
+
+def remove_entity_listings(connection, model, ids):
+    '''Drop the listings of every show of the given artists/venues'''
+    ids = list(ids)
+    if ids:
+        key_column = DENORMALIZED[model][0]
+        connection.execute(delete(ShowListing).where(key_column.in_(ids)))
+
+
+@event.listens_for(Session, 'after_flush')
+def sync_show_listings(session, flush_context):
+    connection = session.connection()
+    changed_shows = set()
+    deleted_shows = set()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Show):
+            changed_shows.add(obj.id)
+        elif type(obj) in DENORMALIZED and obj not in session.new:
+            key_column, columns = DENORMALIZED[type(obj)]
+            state = inspect(obj)
+            values = {listing_column: getattr(obj, attr)
+                      for attr, listing_column in columns.items()
+                      if state.attrs[attr].history.has_changes()}
+            if values:
+                connection.execute(update(ShowListing).where(
+                    key_column == obj.id).values(**values))
+    for obj in session.deleted:
+        if isinstance(obj, Show):
+            deleted_shows.add(obj.id)
+    refresh_listings(connection, changed_shows - deleted_shows)
+    remove_listings(connection, deleted_shows)
@@ -0,0 +1,192 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+from werkzeug.exceptions import HTTPException
+from flaskr.app import app
+
+#----------------------------------------------------------------------------#
+# Logging.
+#----------------------------------------------------------------------------#
+
+# Request threads only put records on an in-memory queue; a listener thread
+# formats them as one json object per line and appends them to LOG_FILE.
+# A full queue drops records rather than make a request wait. Every
+# gunicorn worker appends to the same file, so none of them rotates it:
+# logrotate (or the like) moves it aside and each worker's handler reopens
+# LOG_FILE once it sees the file it has open is no longer there.
+# Records logged while handling a request carry its id (also returned as
+# X-Request-ID), method and route, and every request is summarized on the
+# `flaskr.access` logger with its status, latency and SQL statement count.
+# Fast, successful requests are only logged at LOG_ACCESS_SAMPLE_RATE.
+
+access_logger = logging.getLogger('flaskr.access')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# LogRecord attributes that aren't extra fields
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord(
+    '', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).isoformat(
+                timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items()
+                     if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    '''Tag records with the request being handled, on the request's thread'''
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.route = request.url_rule.rule if request.url_rule else None
+        return True
+
+
+class AccessSampler(logging.Filter):
+    '''Keep a sample of routine access records, and every notable one'''
+
+    def filter(self, record):
+        if record.name != access_logger.name or \
+                record.levelno > logging.INFO or \
+                getattr(record, 'latency_ms', 0) >= \
+                app.config['LOG_SLOW_REQUEST_MS']:
+            return True
+        return random.random() < app.config['LOG_ACCESS_SAMPLE_RATE']
+
+
+class DroppingQueueHandler(QueueHandler):
+    '''Drops (and counts) records when the queue is full, never blocks'''
+
+    dropped = 0
+
+    def prepare(self, record):
+        # render the message and traceback now, the arguments may have
+        # changed by the time the listener gets to them
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+_pipeline = {}
+
+
+def start_listener():
+    log_queue = queue.Queue(app.config['LOG_QUEUE_SIZE'])
+    file_handler = WatchedFileHandler(app.config['LOG_FILE'], delay=True)
+    file_handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    _pipeline['listener'] = listener
+    return log_queue
+
+
+def stop_listener():
+    listener = _pipeline.pop('listener', None)
+    if listener is not None:
+        # writes out whatever is still queued
+        listener.stop()
+
+
+def restart_in_child():
+    # only the forking thread survives a fork, the listener has to be
+    # started again (with a fresh queue, the old one's lock may be held)
+    if 'handler' in _pipeline:
+        _pipeline.pop('listener', None)
+        _pipeline['handler'].queue = start_listener()
+
+
+def configure_logging():
+    handler = DroppingQueueHandler(start_listener())
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(AccessSampler())
+    _pipeline['handler'] = handler
+    level = getattr(logging, app.config['LOG_LEVEL'])
+    for logger in (app.logger, access_logger):
+        logger.setLevel(level)
+        logger.addHandler(handler)
+    access_logger.propagate = False
+    # flask's own handler writes to stderr on the request thread
+    app.logger.removeHandler(default_handler)
+    atexit.register(stop_listener)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=restart_in_child)
+
+
+def log_error(message):
+    '''
+    Log the exception being handled: aborts with a client error status at
+    info without a traceback, anything else as an error with one
+    '''
+    e = sys.exc_info()[1]
+    if isinstance(e, HTTPException) and e.code < 500:
+        app.logger.info(message)
+    else:
+        app.logger.exception(message)
+
+
+#  Request logging
+#  ----------------------------------------------------------------
+
+
+@app.before_request
+def start_request_log():
+    # keep the id a proxy or client sent, if it's sane
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = request_id if 0 < len(request_id) <= 64 \
+        else uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def log_request(response):
+    if request.endpoint == 'static' or 'request_started' not in g:
+        return response
+    response.headers[REQUEST_ID_HEADER] = g.request_id
+    latency = (time.perf_counter() - g.request_started) * 1000
+    level = logging.ERROR if response.status_code >= 500 else logging.INFO
+    access_logger.log(level, f'{request.method} {request.path} '
+                             f'{response.status_code}', extra={
+                                 'path': request.path,
+                                 'status': response.status_code,
+                                 'latency_ms': round(latency, 2),
+                                 'sql_statements': g.get('sql_statements', 0),
+                                 'sql_cache_hits': g.get('sql_cache_hits', 0),
+                             })
+    return response
@@ -0,0 +1,164 @@
+import threading
+import time
+import pytz
+import numpy as np
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from flaskr.app import app
+from flaskr.db import db
+from flaskr.hooks import changes_for, on_commit
+from flaskr.models import Artist, Show, Venue
+
+#----------------------------------------------------------------------------#
+# Matchmaking.
+#----------------------------------------------------------------------------#
+
+# Venues seeking talent are ranked for an artist (and artists seeking venues
+# for a venue) by genre overlap, location and how active they've been lately.
+# Candidates are kept in a column-oriented index of numpy arrays, with genres
+# as the candidate's genre_mask, so scoring is a handful of vectorized ops.
+
+# popcount of every 16-bit value, for counting bits four lookups at a time
+_POPCOUNT_16 = np.array([bin(i).count('1') for i in range(1 << 16)],
+                        dtype=np.uint8)
+
+
+def popcount(values):
+    '''Number of set bits in each element of a uint64 array'''
+    counts = np.zeros(values.shape, dtype=np.uint8)
+    for shift in (0, 16, 32, 48):
+        counts += _POPCOUNT_16[(values >> np.uint64(shift)) &
+                               np.uint64(0xFFFF)]
+    return counts
+
+
+def location_key(city, state):
+    return ((city or '').strip().casefold(), (state or '').strip().upper())
+
+
+class CandidateIndex:
+    '''Snapshot of one side of the market, one array slot per candidate'''
+
+    def __init__(self, ids, names, cities, states, genre_masks, recent_shows):
+        states = list(states)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.names = list(names)
+        self.genre_masks = np.asarray(genre_masks, dtype=np.uint64)
+        self.recent_shows = np.asarray(recent_shows, dtype=np.float64)
+
+        # intern locations as small ints so comparisons are vectorized
+        self.state_codes = {}
+        self.city_codes = {}
+        self.states = np.array([
+            self.state_codes.setdefault((state or '').strip().upper(),
+                                        len(self.state_codes))
+            for state in states], dtype=np.int32)
+        self.cities = np.array([
+            self.city_codes.setdefault(location_key(city, state),
+                                       len(self.city_codes))
+            for city, state in zip(cities, states)], dtype=np.int32)
+
+        most_active = self.recent_shows.max() if len(self.recent_shows) else 0
+        self.activity = np.log1p(self.recent_shows) / np.log1p(most_active) \
+            if most_active else np.zeros(len(self.ids))
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def score(self, genre_mask, city, state):
+        '''Score every candidate against the given genres and location'''
+        weights = app.config['MATCH_WEIGHTS']
+        genre_mask = np.uint64(genre_mask)
+        wanted = max(int(popcount(np.array([genre_mask]))[0]), 1)
+        overlap = popcount(self.genre_masks & genre_mask)
+
+        state_code = self.state_codes.get((state or '').strip().upper(), -1)
+        city_code = self.city_codes.get(location_key(city, state), -1)
+
+        return (weights['genre'] * (overlap / wanted) +
+                weights['city'] * (self.cities == city_code) +
+                weights['state'] * (self.states == state_code) +
+                weights['activity'] * self.activity), overlap
+
+    def top(self, genre_mask, city, state, limit):
+        '''The best `limit` candidates, best first'''
+        if not len(self):
+            return []
+        scores, overlap = self.score(genre_mask, city, state)
+        # only suggest candidates sharing at least one genre
+        scores = np.where(overlap > 0, scores, -np.inf)
+
+        limit = min(limit, len(self))
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [{
+            'id': int(self.ids[i]),
+            'name': self.names[i],
+            'score': float(scores[i]),
+            'shared_genres': int(overlap[i]),
+        } for i in best if np.isfinite(scores[i])]
+
+
+def recent_show_counts(show_column):
+    since = datetime.now(pytz.utc) - \
+        timedelta(days=app.config['MATCH_RECENT_DAYS'])
+    return dict(db.session.query(show_column, func.count(Show.id)).filter(
+        Show.start_time >= since).group_by(show_column).all())
+
+
+def build_index(model, seeking_column, show_column):
+    candidates = db.session.query(
+        model.id, model.name, model.city, model.state,
+        model.genre_mask).filter(
+        seeking_column.is_(True), model.deleted_at.is_(None)).order_by(
+        model.id).all()
+    recent = recent_show_counts(show_column)
+    return CandidateIndex(
+        ids=[c.id for c in candidates],
+        names=[c.name for c in candidates],
+        cities=[c.city for c in candidates],
+        states=[c.state for c in candidates],
+        genre_masks=[c.genre_mask for c in candidates],
+        recent_shows=[recent.get(c.id, 0) for c in candidates],
+    )
+
+
+INDEX_BUILDERS = {
+    'venues': lambda: build_index(Venue, Venue.seeking_talent,
+                                  Show.venue_id),
+    'artists': lambda: build_index(Artist, Artist.seeking_venue,
+                                   Show.artist_id),
+}
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(kind):
+    '''Cached candidate index, rebuilt once it's older than the ttl'''
+    index = _indexes.get(kind)
+    ttl = app.config['MATCH_INDEX_TTL']
+    if index is None or time.monotonic() - index.built_at > ttl:
+        with _indexes_lock:
+            index = _indexes.get(kind)
+            if index is None or time.monotonic() - index.built_at > ttl:
+                index = _indexes[kind] = INDEX_BUILDERS[kind]()
+    return index
+
+
+@on_commit
+def invalidate_indexes(changes):
+    # any venue/artist/show write can change scores, so start over
+    if changes_for(changes, Venue, Artist, Show):
+        _indexes.clear()
+
+
+def venues_for_artist(artist, limit):
+    return get_index('venues').top(artist.genre_mask,
+                                   artist.city, artist.state, limit)
+
+
+def artists_for_venue(venue, limit):
+    return get_index('artists').top(venue.genre_mask,
+                                    venue.city, venue.state, limit)
@@ -1,3 +1,6 @@
+from sqlalchemy import DDL, PrimaryKeyConstraint, event, inspect
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 from flaskr.db import db
 from datetime import datetime
@@ -8,18 +11,43 @@ from datetime import datetime
 
 venue_genres = db.Table('venue_genres',
                         db.Column('venue_id', db.Integer, db.ForeignKey(
-                            'Venue.id'), nullable=False),
+                            'Venue.id', ondelete='CASCADE'), primary_key=True),
                         db.Column('genre_id', db.Integer, db.ForeignKey(
-                            'Genre.id'), nullable=False)
+                            'Genre.id'), primary_key=True),
+                        # reverse lookups, i.e. venues of a genre
+                        db.Index('ix_venue_genres_genre_id_venue_id',
+                                 'genre_id', 'venue_id')
                         )
 
 artist_genres = db.Table('artist_genres',
                          db.Column('artist_id', db.Integer, db.ForeignKey(
-                             'Artist.id'), nullable=False),
+                             'Artist.id', ondelete='CASCADE'), primary_key=True),
                          db.Column('genre_id', db.Integer, db.ForeignKey(
-                             'Genre.id'), nullable=False)
+                             'Genre.id'), primary_key=True),
+                         # reverse lookups, i.e. artists of a genre
+                         db.Index('ix_artist_genres_genre_id_artist_id',
+                                  'genre_id', 'artist_id')
                          )
 
+# genre ids 1..63 map to bits 0..62 of the (signed 64-bit) genre_mask columns
+MAX_GENRE_BITS = 63
+
+
+def in_genre_mask(genre_id):
+    return 0 < int(genre_id) <= MAX_GENRE_BITS
+
+
+def genre_mask_for(genre_ids):
+    '''
+    Bitmask with a bit set for each of the given genre ids that has one,
+    filters look the others up in venue_genres/artist_genres
+    '''
+    mask = 0
+    for genre_id in genre_ids:
+        if genre_id is not None and in_genre_mask(genre_id):
+            mask |= 1 << (int(genre_id) - 1)
+    return mask
+
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
@@ -40,15 +68,40 @@ class Venue(db.Model):
     website = db.Column(db.String(500), nullable=True)
 
     shows = db.relationship('Show', backref='venue',
-                            passive_deletes=True, lazy="joined")
+                            passive_deletes=True)
     genres = db.relationship(
         'Genre', secondary=venue_genres, backref=db.backref('venue'))
+    # denormalized copy of `genres`, kept in sync on flush
+    genre_mask = db.Column(db.BigInteger, nullable=False,
+                           default=0, server_default='0')
+    # normalized name + address/phone, for spotting duplicates on insert
+    # (see flaskr/dedup.py)
+    dedup_key = db.Column(db.String(255))
+    version = db.Column(db.Integer, nullable=False,
+                        default=1, server_default='1')
+    # set when deleted, the row itself is purged later (see
+    # flaskr/deletion.py); queries only ever look at rows without one
+    deleted_at = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
 
     created_at = db.Column(db.TIMESTAMP(timezone=True),
                            server_default=func.now())
     updated_at = db.Column(db.TIMESTAMP(timezone=True),
                            onupdate=func.now())
 
+    __table_args__ = (
+        # narrow index so genre filters can run as index-only scans
+        db.Index('ix_Venue_genre_mask_id', 'genre_mask', 'id'),
+        db.Index('ix_Venue_dedup_key', 'dedup_key'),
+        # small, only deleted rows waiting to be purged are in it
+        db.Index('ix_Venue_deleted_at', 'deleted_at',
+                 postgresql_where=db.text('deleted_at IS NOT NULL')),
+        # newest first on the home page
+        db.Index('ix_Venue_created_at', 'created_at'),
+    )
+    # bumped on every update, which only applies while it still matches
+    # (optimistic locking, see the edit handlers)
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self) -> str:
         return f'<Venue id: {self.id}, name: {self.name}>'
 
@@ -71,15 +124,40 @@ class Artist(db.Model):
     website = db.Column(db.String(500), nullable=True)
 
     shows = db.relationship('Show', backref='artist',
-                            passive_deletes=True, lazy="joined")
+                            passive_deletes=True)
     genres = db.relationship(
         'Genre', secondary=artist_genres, backref=db.backref('artist'))
+    # denormalized copy of `genres`, kept in sync on flush
+    genre_mask = db.Column(db.BigInteger, nullable=False,
+                           default=0, server_default='0')
+    # normalized name + address/phone, for spotting duplicates on insert
+    # (see flaskr/dedup.py)
+    dedup_key = db.Column(db.String(255))
+    version = db.Column(db.Integer, nullable=False,
+                        default=1, server_default='1')
+    # set when deleted, the row itself is purged later (see
+    # flaskr/deletion.py); queries only ever look at rows without one
+    deleted_at = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
 
     created_at = db.Column(db.TIMESTAMP(timezone=True),
                            server_default=func.now())
     updated_at = db.Column(db.TIMESTAMP(timezone=True),
                            onupdate=func.now())
 
+    __table_args__ = (
+        # narrow index so genre filters can run as index-only scans
+        db.Index('ix_Artist_genre_mask_id', 'genre_mask', 'id'),
+        db.Index('ix_Artist_dedup_key', 'dedup_key'),
+        # small, only deleted rows waiting to be purged are in it
+        db.Index('ix_Artist_deleted_at', 'deleted_at',
+                 postgresql_where=db.text('deleted_at IS NOT NULL')),
+        # newest first on the home page
+        db.Index('ix_Artist_created_at', 'created_at'),
+    )
+    # bumped on every update, which only applies while it still matches
+    # (optimistic locking, see the edit handlers)
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self) -> str:
         return f'<Artist id: {self.id}, name: {self.name}>'
 
@@ -87,13 +165,15 @@ class Artist(db.Model):
 class Show(db.Model):
     __tablename__ = 'Show'
 
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(
         'Artist.id', ondelete='CASCADE'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey(
         'Venue.id', ondelete='CASCADE'), nullable=False)
 
     end_time = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    # the table is partitioned by month of start_time on postgres (see
+    # flaskr/archive.py), which also puts it in the primary key there
     start_time = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
 
     created_at = db.Column(db.TIMESTAMP(timezone=True),
@@ -101,10 +181,110 @@ class Show(db.Model):
     updated_at = db.Column(db.TIMESTAMP(timezone=True),
                            onupdate=func.now())
 
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        {'postgresql_partition_by': 'RANGE (start_time)',
+         'info': {'partition_key': ('start_time',)}},
+    )
+
     def __repr__(self) -> str:
         return f'<Show id: {self.id}>'
 
 
+@compiles(PrimaryKeyConstraint, 'postgresql')
+def partitioned_primary_key(constraint, compiler, **kw):
+    '''
+    Postgres wants the partition key in a partitioned table's primary key;
+    elsewhere (sqlite) the table isn't partitioned and the key stays `id`,
+    which is unique on its own either way
+    '''
+    partition_key = constraint.table.info.get('partition_key', ())
+    if not partition_key or not len(constraint):
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+    text = ''
+    if constraint.name is not None:
+        name = compiler.preparer.format_constraint(constraint)
+        if name is not None:
+            text += f'CONSTRAINT {name} '
+    names = [column.name for column in constraint.columns] + \
+        [name for name in partition_key if name not in constraint.columns]
+    text += 'PRIMARY KEY ({})'.format(
+        ', '.join(compiler.preparer.quote(name) for name in names))
+    return text + compiler.define_constraint_deferrability(constraint)
+
+
+# rows outside every monthly partition land here rather than failing
+event.listen(Show.__table__, 'after_create', DDL(
+    'CREATE TABLE IF NOT EXISTS "Show_default" PARTITION OF "Show" DEFAULT'
+).execute_if(dialect='postgresql'))
+
+
+class ShowArchive(db.Model):
+    '''Past shows moved out of `Show` once older than the retention window'''
+    __tablename__ = 'ShowArchive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'Venue.id', ondelete='CASCADE'), nullable=False)
+    start_time = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    end_time = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_ShowArchive_venue_id_start_time',
+                 'venue_id', 'start_time'),
+        db.Index('ix_ShowArchive_artist_id_start_time',
+                 'artist_id', 'start_time'),
+    )
+
+    def __repr__(self) -> str:
+        return f'<ShowArchive id: {self.id}>'
+
+
+class ShowListing(db.Model):
+    '''
+    Read-only projection of a live show with its artist and venue columns,
+    kept in step with Show/Artist/Venue writes (see flaskr/listing.py)
+    '''
+    __tablename__ = 'ShowListing'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    start_time = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    end_time = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'Artist.id', ondelete='CASCADE'), nullable=False)
+    artist_name = db.Column(db.String)
+    artist_image_link = db.Column(db.String(500))
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'Venue.id', ondelete='CASCADE'), nullable=False)
+    venue_name = db.Column(db.String)
+    venue_image_link = db.Column(db.String(500))
+    # search filters (see flaskr/show_search.py)
+    venue_city = db.Column(db.String(120))
+    venue_state = db.Column(db.String(120))
+    artist_genre_mask = db.Column(db.BigInteger, nullable=False,
+                                  default=0, server_default='0')
+
+    __table_args__ = (
+        # the search's keys: (start_time, id) order for keyset pages, the
+        # genre mask included so filtering on it stays an index-only scan
+        db.Index('ix_ShowListing_start_time_id', start_time, id,
+                 postgresql_include=['artist_genre_mask']),
+        db.Index('ix_ShowListing_location_start_time_id', venue_state,
+                 func.lower(venue_city), start_time, id,
+                 postgresql_include=['artist_genre_mask']),
+        db.Index('ix_ShowListing_venue_id_start_time',
+                 'venue_id', 'start_time'),
+        db.Index('ix_ShowListing_artist_id_start_time',
+                 'artist_id', 'start_time'),
+    )
+
+    def __repr__(self) -> str:
+        return f'<ShowListing id: {self.id}>'
+
+
 class Genre(db.Model):
     __tablename__ = 'Genre'
 
@@ -113,3 +293,48 @@ class Genre(db.Model):
 
     def __repr__(self) -> str:
         return f'<Genre id: {self.id}, name: {self.name}>'
+
+
+class Recommendation(db.Model):
+    '''Precomputed nearest neighbours of an artist or venue'''
+    __tablename__ = 'Recommendation'
+
+    # 'artists' or 'venues'; neighbours are of the same kind
+    entity_type = db.Column(db.String(20), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    neighbour_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<Recommendation {self.entity_type} {self.entity_id} #{self.rank}: {self.neighbour_id}>'
+
+
+class ChangeLog(db.Model):
+    '''One row per venue/artist/show created, updated or deleted'''
+    __tablename__ = 'ChangeLog'
+
+    # doubles as the sync cursor of the /changes feed
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'),
+                   primary_key=True)
+    # 'venues', 'artists' or 'shows'
+    entity_type = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    # 'created', 'updated' or 'deleted'
+    action = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False,
+                           server_default=func.now())
+
+    def __repr__(self) -> str:
+        return f'<ChangeLog {self.id}: {self.action} {self.entity_type} {self.entity_id}>'
+
+
+@event.listens_for(Session, 'before_flush')
+def sync_genre_masks(session, flush_context, instances):
+    '''Recompute genre_mask for venues/artists whose genres changed'''
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, (Venue, Artist)):
+            continue
+        if obj in session.new or \
+                inspect(obj).attrs.genres.history.has_changes():
+            obj.genre_mask = genre_mask_for(genre.id for genre in obj.genres)
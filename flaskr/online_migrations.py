@@ -0,0 +1,149 @@
+import logging
+import time
+from contextlib import contextmanager
+from alembic import op
+import sqlalchemy as sa
+
+#----------------------------------------------------------------------------#
+# Online migration helpers.
+#----------------------------------------------------------------------------#
+
+# For use in migrations/versions/* on tables too big to lock for the length
+# of a migration. Plain op.create_index/op.execute hold their locks until
+# the migration commits; these keep each lock short, or avoid it, on
+# postgres, and fall back to the plain operations elsewhere (e.g. sqlite).
+#
+#     from flaskr.online_migrations import (
+#         backfill, create_index_concurrently, lock_timeout)
+#
+#     def upgrade():
+#         with lock_timeout('5s'):
+#             op.add_column('Show', sa.Column('venue_city', sa.String(120)))
+#         backfill('Show', 'venue_city = (SELECT city FROM "Venue" ...)',
+#                  where='venue_city IS NULL')
+#         create_index_concurrently('ix_Show_venue_city', 'Show',
+#                                   ['venue_city'])
+
+logger = logging.getLogger('alembic.online')
+
+# rows updated per backfill transaction
+BACKFILL_BATCH_SIZE = 5000
+# seconds to sleep between backfill batches, leaving room for other writers
+BACKFILL_PAUSE = 0.05
+
+
+def is_postgres():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+@contextmanager
+def lock_timeout(timeout):
+    '''
+    Give up (and fail the migration) rather than queue behind long running
+    queries for a lock, e.g. lock_timeout('5s'). Every query arriving after
+    a queued ALTER waits for it too, so waiting long is worse than retrying.
+    The setting is transaction-local: it lasts until the migration's
+    transaction commits (or an autocommit_block commits it), and a failed
+    transaction takes it with it, with nothing to restore.
+    '''
+    if is_postgres():
+        op.get_bind().execute(sa.text(
+            "SELECT set_config('lock_timeout', :timeout, true)"),
+            {'timeout': timeout})
+    yield
+
+
+def drop_invalid_index(name):
+    '''Drop what a failed CREATE INDEX CONCURRENTLY left behind'''
+    invalid = op.get_bind().execute(sa.text('''
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name AND NOT i.indisvalid
+    '''), {'name': name}).first()
+    if invalid:
+        logger.info('Dropping invalid index %s', name)
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def create_index_concurrently(name, table, columns, **kw):
+    '''
+    op.create_index without blocking writes to the table. On postgres it
+    runs outside the migration's transaction, which is committed first.
+    '''
+    if not is_postgres():
+        op.create_index(name, table, columns, **kw)
+        return
+    with op.get_context().autocommit_block():
+        drop_invalid_index(name)
+        start = time.perf_counter()
+        op.create_index(name, table, columns, postgresql_concurrently=True,
+                        **kw)
+        logger.info('Created index %s in %.1fs', name,
+                    time.perf_counter() - start)
+
+
+def drop_index_concurrently(name, table):
+    if not is_postgres():
+        op.drop_index(name, table_name=table)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+
+def backfill(table, assignments, where=None, key='id',
+             batch_size=BACKFILL_BATCH_SIZE, pause=BACKFILL_PAUSE):
+    '''
+    UPDATE "table" SET <assignments> [WHERE <where>] as a series of short
+    transactions over ranges of the integer `key` column, sleeping `pause`
+    seconds between them and logging progress. Safe to rerun: give a
+    `where` that skips rows already done.
+    '''
+    condition = f' AND ({where})' if where else ''
+    statement = sa.text(
+        f'UPDATE "{table}" SET {assignments} '
+        f'WHERE "{key}" > :low AND "{key}" <= :high{condition}')
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        low, high = bind.execute(sa.text(
+            f'SELECT min("{key}"), max("{key}") FROM "{table}"')).one()
+        if low is None:
+            return 0
+        updated = 0
+        start = time.perf_counter()
+        for batch_low in range(low - 1, high, batch_size):
+            updated += bind.execute(statement, {
+                'low': batch_low, 'high': batch_low + batch_size}).rowcount
+            done = min(batch_low + batch_size, high) - low + 1
+            logger.info('Backfilling %s: %d%% of key range, %d rows updated',
+                        table, done * 100 // (high - low + 1), updated)
+            if pause:
+                time.sleep(pause)
+        logger.info('Backfilled %d %s rows in %.1fs', updated, table,
+                    time.perf_counter() - start)
+        return updated
+
+
+def replace_foreign_key(name, table, referent_table, local_cols, remote_cols,
+                        ondelete=None, timeout='5s'):
+    '''
+    Recreate a foreign key, e.g. to change its ON DELETE. On postgres the new
+    key is added NOT VALID, which only needs a brief lock, and the existing
+    rows are checked afterwards by VALIDATE, which doesn't block writes.
+    '''
+    if not is_postgres():
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent_table, local_cols,
+                              remote_cols, ondelete=ondelete)
+        return
+    local = ', '.join(f'"{col}"' for col in local_cols)
+    remote = ', '.join(f'"{col}"' for col in remote_cols)
+    action = f' ON DELETE {ondelete}' if ondelete else ''
+    with lock_timeout(timeout):
+        op.execute(
+            f'ALTER TABLE "{table}" DROP CONSTRAINT "{name}", '
+            f'ADD CONSTRAINT "{name}" FOREIGN KEY ({local}) '
+            f'REFERENCES "{referent_table}" ({remote}){action} NOT VALID')
+    # commit the swap first, so its lock isn't held while rows are checked
+    with op.get_context().autocommit_block():
+        start = time.perf_counter()
+        op.execute(f'ALTER TABLE "{table}" VALIDATE CONSTRAINT "{name}"')
+        logger.info('Validated %s in %.1fs', name, time.perf_counter() - start)
@@ -0,0 +1,366 @@
+import json
+import os
+import random
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import click
+import pytz
+from sqlalchemy import event, func, insert, select, text
+from flaskr.app import app
+from flaskr.db import db
+from flaskr.listing import refresh_listings
+from flaskr.models import (
+    Artist, Genre, Show, ShowListing, Venue, artist_genres, genre_mask_for,
+    venue_genres)
+
+#----------------------------------------------------------------------------#
+# Query plan checks.
+#----------------------------------------------------------------------------#
+
+# `flask plans check` requests every read route against the configured
+# database, captures the SELECTs each one issues and asks the database for
+# their plans: EXPLAIN (FORMAT JSON) on postgres, EXPLAIN QUERY PLAN on
+# sqlite for local runs. A statement fails the check when it reads a large
+# table (PLAN_LARGE_TABLE_ROWS or more) in full, unless its route lists
+# the table as one it reads whole, or when its estimated cost grew past
+# PLAN_COST_TOLERANCE times the stored baseline's (postgres only, sqlite
+# has no costs). `--update` stores the current plans as the baseline.
+# Run it on a scratch database filled by `flask plans seed`, with
+# statistics up to date, so the plans are the ones a real catalogue gets.
+# tests/test_query_plans.py runs the same check on a small seeded sqlite
+# database, against the baseline in tests/query_plans.json.
+
+# (path, tables the page reads in full by design); {venue_id} and
+# {artist_id} are filled in with seeded entities that have shows
+ROUTES = [
+    ('/', ()),
+    # every venue with its upcoming show count
+    ('/venues', ('Venue', 'ShowListing')),
+    ('/artists', ('Artist',)),
+    ('/shows', ('ShowListing',)),
+    ('/shows/search?state=CA', ()),
+    ('/shows/search?state=CA&city=San+Francisco&genres=1&genres=2', ()),
+    ('/venues/{venue_id}', ()),
+    ('/venues/{venue_id}/archive', ()),
+    ('/venues/{venue_id}/edit', ()),
+    # candidates are scored in memory, against all upcoming shows
+    ('/venues/{venue_id}/matches', ('Artist', 'Show')),
+    ('/venues/{venue_id}/shows.ics', ()),
+    ('/artists/{artist_id}', ()),
+    ('/artists/{artist_id}/archive', ()),
+    ('/artists/{artist_id}/edit', ()),
+    ('/artists/{artist_id}/matches', ('Venue', 'Show')),
+    ('/artists/{artist_id}/shows.ics', ()),
+    # the prefix index is built from every name on first use
+    ('/venues/autocomplete?q=the', ('Venue',)),
+    ('/artists/autocomplete?q=the', ('Artist',)),
+    ('/changes', ()),
+    ('/export/venues.csv', ('Venue',)),
+    ('/export/artists.csv', ('Artist',)),
+    ('/export/shows.csv', ('Show',)),
+]
+
+# searches are POSTed, but only read; a substring match reads every name
+FORM_ROUTES = [
+    ('/venues/search', {'search_term': 'hall'}, ('Venue',)),
+    ('/artists/search', {'search_term': 'band'}, ('Artist',)),
+]
+
+# monthly and default partitions of Show, e.g. Show_y2024m05
+PARTITION_SUFFIX = re.compile(r'_(y\d{4}m\d{2}|default)$')
+
+
+@contextmanager
+def capture_selects():
+    '''Collect the (statement, parameters) of SELECTs run in the block'''
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if re.match(r'\s*(SELECT|WITH)\b', statement, re.IGNORECASE):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+
+def route_statements():
+    '''{route: [(statement, parameters)]} for every checked route'''
+    ids = db.session.execute(select(
+        ShowListing.venue_id, ShowListing.artist_id).order_by(
+        ShowListing.start_time.desc()).limit(1)).first()
+    db.session.remove()
+    if ids is None:
+        raise click.ClickException('No shows to plan against, run '
+                                   '`flask plans seed` first.')
+    client = app.test_client()
+    captured = {}
+    requests = [('GET', path, None, scans) for path, scans in ROUTES] + \
+        [('POST', path, form, scans) for path, form, scans in FORM_ROUTES]
+    for method, route, form, scans in requests:
+        path = route.format(venue_id=ids.venue_id, artist_id=ids.artist_id)
+        with capture_selects() as statements:
+            response = client.open(path, method=method, data=form)
+            # streamed pages run their queries while the body is read
+            response.get_data()
+        if response.status_code != 200:
+            click.echo(f'{method} {path}: status {response.status_code}',
+                       err=True)
+        # keyed by the route, not the ids, to match the baseline's
+        captured[f'{method} {route}'] = (statements, set(scans))
+    return captured
+
+
+#  Plans
+#  ----------------------------------------------------------------
+
+
+def table_sizes(connection):
+    '''Estimated rows per table (and partition) on postgres, counted on
+    sqlite'''
+    if connection.dialect.name == 'postgresql':
+        return dict(connection.execute(text(
+            "SELECT relname, reltuples FROM pg_class "
+            "WHERE relkind IN ('r', 'p')")).all())
+    return {table.name: connection.execute(
+        select(func.count()).select_from(table)).scalar()
+        for table in db.metadata.sorted_tables}
+
+
+def postgres_plan(connection, statement, parameters):
+    '''(total cost, relations read by sequential scans)'''
+    plan = connection.exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {statement}', parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]['Plan']
+    scanned = []
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            scanned.append(node['Relation Name'])
+        nodes.extend(node.get('Plans', ()))
+    return root['Total Cost'], scanned
+
+
+def sqlite_plan(connection, statement, parameters):
+    '''(None, tables read in full), sqlite doesn't report costs'''
+    rows = connection.exec_driver_sql(
+        f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    limited = re.search(r'\bLIMIT\b', statement, re.IGNORECASE)
+    scanned = []
+    for row in rows:
+        # e.g. "SCAN Venue" or "SCAN ShowListing USING INDEX ..." read every
+        # row, "SEARCH ..." only a range, and a walk in index order stops
+        # as soon as a LIMIT is reached
+        match = re.match(r'SCAN (?:TABLE )?"?(\w+)"?( USING .*INDEX)?',
+                         row[-1])
+        if match and not (match.group(2) and limited):
+            scanned.append(match.group(1))
+    return None, scanned
+
+
+PLANNERS = {
+    'postgresql': postgres_plan,
+    'sqlite': sqlite_plan,
+}
+
+
+def route_plans(captured):
+    '''{route: {statement: {'cost', 'scans'}}} with large table scans only'''
+    connection = db.session.connection()
+    planner = PLANNERS.get(connection.dialect.name)
+    if planner is None:
+        raise click.ClickException(
+            f'No planner for {connection.dialect.name}')
+    sizes = table_sizes(connection)
+    large = app.config['PLAN_LARGE_TABLE_ROWS']
+    plans = {}
+    for route, (statements, _) in captured.items():
+        plans[route] = {}
+        for statement, parameters in statements:
+            cost, scanned = planner(connection, statement, parameters)
+            scans = sorted({name for name in scanned
+                            if sizes.get(name, 0) >= large})
+            # a statement run more than once keeps its worst plan
+            seen = plans[route].get(statement)
+            if seen is None or (cost or 0) > (seen['cost'] or 0):
+                plans[route][statement] = {'cost': cost, 'scans': scans}
+    return plans
+
+
+def regressions(captured, plans, baseline):
+    '''Messages for every plan that's worse than it should be'''
+    tolerance = app.config['PLAN_COST_TOLERANCE']
+    found = []
+    for route, statements in plans.items():
+        allowed = captured[route][1]
+        before = baseline.get(route, {})
+        for statement, plan in statements.items():
+            summary = ' '.join(statement.split())[:120]
+            for table in plan['scans']:
+                if PARTITION_SUFFIX.sub('', table) not in allowed:
+                    found.append(f'{route}: full scan of {table} in '
+                                 f'{summary}')
+            old_cost = before.get(statement, {}).get('cost')
+            if plan['cost'] is not None and old_cost and \
+                    plan['cost'] > old_cost * tolerance:
+                found.append(f'{route}: cost {plan["cost"]:.0f} up from '
+                             f'{old_cost:.0f} in {summary}')
+    return found
+
+
+def load_baseline(path, dialect):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get(dialect)
+
+
+def save_baseline(path, dialect, plans):
+    stored = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            stored = json.load(f)
+    stored[dialect] = plans
+    with open(path, 'w') as f:
+        json.dump(stored, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+#  Seeding
+#  ----------------------------------------------------------------
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'),
+    ('Brooklyn', 'NY'), ('Austin', 'TX'), ('Chicago', 'IL'),
+    ('Seattle', 'WA'), ('Nashville', 'TN'), ('New Orleans', 'LA'),
+]
+NAME_WORDS = ['The', 'Blue', 'Velvet', 'Electric', 'Hall', 'Band', 'Room',
+              'Echo', 'Lounge', 'Collective', 'Jazz', 'Club', 'Garden']
+
+
+def seed_entities(model, genre_table, key, count, genre_ids, rng):
+    '''Insert count venues/artists with genres, returning their ids'''
+    last_id = db.session.execute(select(func.max(model.id))).scalar() or 0
+    rows = []
+    links = []
+    for i in range(count):
+        city, state = rng.choice(CITIES)
+        genres = rng.sample(genre_ids, min(len(genre_ids), rng.randint(1, 3)))
+        name = ' '.join(rng.sample(NAME_WORDS, 3))
+        row = {'name': f'{name} {i}', 'city': city, 'state': state,
+               'phone': f'555-{i // 10000 % 1000:03d}-{i % 10000:04d}',
+               'genre_mask': genre_mask_for(genres)}
+        if model is Venue:
+            row['address'] = f'{i} Main St'
+        rows.append(row)
+        links.append(genres)
+    db.session.execute(insert(model), rows)
+    ids = db.session.execute(select(model.id).where(
+        model.id > last_id).order_by(model.id)).scalars().all()
+    db.session.execute(insert(genre_table), [
+        {key: entity_id, 'genre_id': genre_id}
+        for entity_id, genres in zip(ids, links) for genre_id in genres])
+    return ids
+
+
+def seed(venues, artists, shows, batch_size, rng):
+    genre_ids = db.session.execute(select(Genre.id)).scalars().all()
+    if not genre_ids:
+        raise click.ClickException('Seed the genres first (python setup.py).')
+    venue_ids = seed_entities(Venue, venue_genres, 'venue_id', venues,
+                              genre_ids, rng)
+    artist_ids = seed_entities(Artist, artist_genres, 'artist_id', artists,
+                               genre_ids, rng)
+    db.session.commit()
+    now = datetime.now(pytz.utc)
+    done = 0
+    while done < shows:
+        last_id = db.session.execute(select(func.max(Show.id))).scalar() or 0
+        rows = []
+        for _ in range(min(batch_size, shows - done)):
+            # two years back to one ahead, like a catalogue in use
+            start = now + timedelta(hours=rng.randint(-2 * 365 * 24,
+                                                      365 * 24))
+            rows.append({'artist_id': rng.choice(artist_ids),
+                         'venue_id': rng.choice(venue_ids),
+                         'start_time': start,
+                         'end_time': start + timedelta(hours=2)})
+        db.session.execute(insert(Show), rows)
+        refresh_listings(db.session.connection(), db.session.execute(
+            select(Show.id).where(Show.id > last_id)).scalars().all())
+        db.session.commit()
+        done += len(rows)
+        yield done
+
+
+#  Commands
+#  ----------------------------------------------------------------
+
+
+@app.cli.group()
+def plans():
+    '''Query plan regression checks.'''
+
+
+@plans.command('seed')
+@click.option('--venues', type=int, default=2000)
+@click.option('--artists', type=int, default=5000)
+@click.option('--shows', type=int, default=50000)
+@click.option('--batch-size', type=int, default=5000)
+@click.option('--random-seed', type=int, default=0)
+@click.confirmation_option(
+    prompt='Add generated venues, artists and shows to the database?')
+def seed_command(venues, artists, shows, batch_size, random_seed):
+    '''Fill a scratch database with a representative catalogue.'''
+    rng = random.Random(random_seed)
+    seeded = 0
+    try:
+        for seeded in seed(venues, artists, shows, batch_size, rng):
+            click.echo(f'\rSeeded {seeded} shows', nl=False)
+        click.echo(f'\rSeeded {venues} venues, {artists} artists and '
+                   f'{seeded} shows')
+        # fresh statistics, or the planner is guessing
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
+
+
+@plans.command('check')
+@click.option('--baseline', 'path',
+              default=lambda: app.config['PLAN_BASELINE'],
+              help='Baseline file, per database dialect.')
+@click.option('--update', is_flag=True,
+              help='Store the current plans as the baseline.')
+def check_command(path, update):
+    '''Fail on full scans of large tables and plan cost regressions.'''
+    captured = route_statements()
+    try:
+        plans = route_plans(captured)
+        dialect = db.engine.dialect.name
+    finally:
+        db.session.remove()
+    click.echo(f'Planned {sum(map(len, plans.values()))} statements '
+               f'from {len(plans)} routes')
+    if update:
+        save_baseline(path, dialect, plans)
+        click.echo(f'Stored the {dialect} baseline in {path}')
+        return
+    baseline = load_baseline(path, dialect)
+    if baseline is None:
+        click.echo(f'No {dialect} baseline in {path}, only checking scans '
+                   '(store one with --update)')
+    found = regressions(captured, plans, baseline or {})
+    for message in found:
+        click.echo(message, err=True)
+    if found:
+        raise click.ClickException(f'{len(found)} plan regressions')
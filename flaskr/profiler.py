@@ -0,0 +1,237 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+import click
+from flask import g, request
+from itsdangerous import BadSignature, TimestampSigner
+from flaskr.app import app
+
+#----------------------------------------------------------------------------#
+# Request profiling.
+#----------------------------------------------------------------------------#
+
+# Off unless asked for: a request is profiled when it carries a valid
+# `X-Profile` token (see `flask profile token`) or is picked at random at
+# PROFILE_SAMPLE_RATE. The profiler runs until the response has been sent,
+# so streamed pages are covered too. Each profile is saved to PROFILE_DIR
+# as collapsed stacks (flamegraph.pl/speedscope input) or a cProfile dump,
+# with a json summary of where the time went: sql, template or python.
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SALT = 'fyyur-profile'
+
+SQL_MODULES = ('sqlalchemy', 'psycopg2', 'sqlite3')
+TEMPLATE_MODULES = ('jinja2',)
+
+
+def frame_category(filename):
+    if any(f'{os.sep}{name}{os.sep}' in filename for name in SQL_MODULES):
+        return 'sql'
+    if filename.endswith('.html') or \
+            any(f'{os.sep}{name}{os.sep}' in filename
+                for name in TEMPLATE_MODULES):
+        return 'template'
+    return 'python'
+
+
+def stack_category(categories):
+    '''Time spent anywhere under the db layer is sql, under jinja template'''
+    if 'sql' in categories:
+        return 'sql'
+    if 'template' in categories:
+        return 'template'
+    return 'python'
+
+
+class SamplingProfiler:
+    '''Samples one thread's stack from a background thread'''
+
+    extension = 'folded'
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.interval = app.config['PROFILE_INTERVAL']
+        self.stacks = Counter()
+        self.categories = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.sample(frame)
+
+    def sample(self, frame):
+        names = []
+        categories = set()
+        while frame is not None:
+            code = frame.f_code
+            categories.add(frame_category(code.co_filename))
+            module = frame.f_globals.get('__name__') or \
+                os.path.basename(code.co_filename)
+            names.append(f'{module}:{code.co_name}')
+            frame = frame.f_back
+        category = stack_category(categories)
+        self.categories[category] += 1
+        self.stacks[';'.join([category] + names[::-1])] += 1
+
+    def breakdown(self):
+        samples = sum(self.categories.values()) or 1
+        return {category: self.elapsed * count / samples
+                for category, count in self.categories.items()}
+
+    def save(self, path):
+        with open(path, 'w') as out:
+            for stack, count in self.stacks.most_common():
+                out.write(f'{stack} {count}\n')
+
+
+class CProfileProfiler:
+    '''Deterministic profile of the request thread'''
+
+    extension = 'prof'
+
+    def __init__(self, thread_id):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.elapsed = time.perf_counter() - self.started
+
+    def breakdown(self):
+        totals = Counter()
+        stats = pstats.Stats(self.profile).stats
+        for (filename, _, _), (_, _, own_time, _, _) in stats.items():
+            totals[frame_category(filename)] += own_time
+        return dict(totals)
+
+    def save(self, path):
+        self.profile.dump_stats(path)
+
+
+PROFILERS = {
+    'sample': SamplingProfiler,
+    'cprofile': CProfileProfiler,
+}
+
+
+def signer():
+    return TimestampSigner(app.config['PROFILE_SECRET'], salt=PROFILE_SALT)
+
+
+def requested():
+    '''Whether this request carries a valid, unexpired profile token'''
+    token = request.headers.get(PROFILE_HEADER)
+    if not token or not app.config['PROFILE_SECRET']:
+        return False
+    try:
+        signer().unsign(token, max_age=app.config['PROFILE_TOKEN_MAX_AGE'])
+    except BadSignature:
+        return False
+    return True
+
+
+def should_profile():
+    if request.endpoint in (None, 'static'):
+        return False
+    return requested() or random.random() < app.config['PROFILE_SAMPLE_RATE']
+
+
+def enforce_retention(directory, max_profiles):
+    '''Drop the oldest profiles beyond the limit'''
+    profiles = {}
+    for entry in os.scandir(directory):
+        files = profiles.setdefault(entry.name.split('.', 1)[0], [])
+        files.append((entry.stat().st_mtime, entry.path))
+    oldest_first = sorted(profiles.values(), key=max)
+    for files in oldest_first[:max(len(oldest_first) - max_profiles, 0)]:
+        for _, path in files:
+            os.remove(path)
+
+
+def finish(profiler, name, method, path):
+    profiler.stop()
+    try:
+        directory = app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        profiler.save(os.path.join(directory,
+                                   f'{name}.{profiler.extension}'))
+        summary = {
+            'method': method,
+            'path': path,
+            'elapsed': profiler.elapsed,
+            'breakdown': profiler.breakdown(),
+        }
+        with open(os.path.join(directory, f'{name}.json'), 'w') as out:
+            json.dump(summary, out, indent=2)
+        enforce_retention(directory, app.config['PROFILE_MAX_FILES'])
+        app.logger.info(f'Profiled {method} {path} as {name}: ' + ', '.join(
+            f'{category} {seconds * 1000:.1f}ms'
+            for category, seconds in summary['breakdown'].items()))
+    except Exception as e:
+        app.logger.exception(f'Error - profiling {method} {path} - {e}')
+
+
+@app.before_request
+def start_profiler():
+    if not should_profile():
+        return
+    profiler = PROFILERS[app.config['PROFILE_MODE']](threading.get_ident())
+    g.profiler = profiler
+    g.profile_name = time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:8]
+    profiler.start()
+
+
+@app.after_request
+def attach_profiler(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    name = g.profile_name
+    method, path = request.method, request.path
+    # keep profiling while a streamed body is being rendered and sent
+    response.call_on_close(lambda: finish(profiler, name, method, path))
+    response.headers['X-Profile-Id'] = name
+    return response
+
+
+@app.teardown_request
+def stop_profiler(exc):
+    # the request failed before a response could take the profiler over
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        finish(profiler, g.profile_name, request.method, request.path)
+
+
+@app.cli.group()
+def profile():
+    '''Request profiling.'''
+
+
+@profile.command('token')
+def token_command():
+    '''Print a token that profiles requests sending it as X-Profile.'''
+    if not app.config['PROFILE_SECRET']:
+        raise click.ClickException('Set PROFILE_SECRET first.')
+    click.echo(signer().sign('profile').decode('utf-8'))
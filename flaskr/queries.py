@@ -0,0 +1,240 @@
+from sqlalchemy import func, lambda_stmt, or_, select
+from flaskr.app import app
+from flaskr.cache import ResultCache
+from flaskr.db import db
+from flaskr.hooks import changes_for, on_commit
+from flaskr.models import (
+    Artist, Genre, ShowListing, Venue, artist_genres, genre_mask_for,
+    in_genre_mask, venue_genres)
+
+#----------------------------------------------------------------------------#
+# Cached statements.
+#----------------------------------------------------------------------------#
+
+# Hot lookups are built as lambda statements: SQLAlchemy constructs and
+# compiles each one once per process and afterwards only swaps in the bound
+# parameters, instead of rebuilding the query on every request. Deleted
+# venues/artists (deleted_at set) are left out of all of them. The listing
+# and search statements come from *_stmt builders, so the async read path
+# (flaskr/asgi.py) runs the very same ones.
+
+
+def get_venue(venue_id):
+    '''Venue by id, or None'''
+    stmt = lambda_stmt(lambda: select(Venue).where(
+        Venue.id == venue_id, Venue.deleted_at.is_(None)))
+    return db.session.execute(stmt).scalars().unique().one_or_none()
+
+
+def get_artist(artist_id):
+    '''Artist by id, or None'''
+    stmt = lambda_stmt(lambda: select(Artist).where(
+        Artist.id == artist_id, Artist.deleted_at.is_(None)))
+    return db.session.execute(stmt).scalars().unique().one_or_none()
+
+
+def genre_choices():
+    '''(id, name) pairs for populating the genres select field'''
+    stmt = lambda_stmt(lambda: select(Genre.id, Genre.name).order_by(Genre.id))
+    return [(genre.id, genre.name) for genre in db.session.execute(stmt)]
+
+
+def genres_by_ids(genre_ids):
+    '''Genres for a list of ids in a single query'''
+    genre_ids = [int(genre_id) for genre_id in genre_ids]
+    if not genre_ids:
+        return []
+    stmt = lambda_stmt(lambda: select(Genre).where(Genre.id.in_(genre_ids)))
+    return db.session.execute(stmt).scalars().all()
+
+
+def recent_venues_stmt(limit=10):
+    return lambda_stmt(lambda: select(Venue.id, Venue.name).where(
+        Venue.deleted_at.is_(None)).order_by(
+        Venue.created_at.desc()).limit(limit))
+
+
+def recent_venues(limit=10):
+    return db.session.execute(recent_venues_stmt(limit)).all()
+
+
+def recent_artists_stmt(limit=10):
+    return lambda_stmt(lambda: select(Artist.id, Artist.name).where(
+        Artist.deleted_at.is_(None)).order_by(
+        Artist.created_at.desc()).limit(limit))
+
+
+def recent_artists(limit=10):
+    return db.session.execute(recent_artists_stmt(limit)).all()
+
+
+GENRE_LINKS = {
+    Venue: venue_genres.c.venue_id,
+    Artist: artist_genres.c.artist_id,
+}
+
+
+def with_genres(stmt, model, genre_ids, match_all):
+    '''
+    Narrow a lambda statement to rows having any/all of the genres, by
+    genre_mask, and by the association table for ids past the mask's bits
+    '''
+    if not genre_ids:
+        return stmt
+    mask = genre_mask_for(genre_ids)
+    unmasked = tuple(genre_id for genre_id in genre_ids
+                     if not in_genre_mask(genre_id))
+    if not unmasked:
+        if match_all:
+            return stmt + (lambda s: s.where(
+                model.genre_mask.op('&')(mask) == mask))
+        return stmt + (lambda s: s.where(model.genre_mask.op('&')(mask) != 0))
+
+    link = GENRE_LINKS[model]
+    genre_id = link.table.c.genre_id
+    if match_all:
+        count = len(unmasked)
+        stmt += lambda s: s.where(
+            model.genre_mask.op('&')(mask) == mask,
+            select(func.count()).where(
+                link == model.id, genre_id.in_(unmasked)).scalar_subquery()
+            == count)
+        return stmt
+    return stmt + (lambda s: s.where(or_(
+        model.genre_mask.op('&')(mask) != 0,
+        select(genre_id).where(
+            link == model.id, genre_id.in_(unmasked)).exists())))
+
+
+def search_venues_stmt(search_term, genre_ids, match_all):
+    pattern = f'%{search_term}%'
+    stmt = lambda_stmt(lambda: select(Venue.id, Venue.name).where(
+        Venue.name.ilike(pattern), Venue.deleted_at.is_(None)))
+    stmt = with_genres(stmt, Venue, genre_ids, match_all)
+    return stmt + (lambda s: s.order_by(Venue.name))
+
+
+def search_artists_stmt(search_term, genre_ids, match_all):
+    pattern = f'%{search_term}%'
+    stmt = lambda_stmt(lambda: select(Artist.id, Artist.name).where(
+        Artist.name.ilike(pattern), Artist.deleted_at.is_(None)))
+    stmt = with_genres(stmt, Artist, genre_ids, match_all)
+    return stmt + (lambda s: s.order_by(Artist.name))
+
+
+#  Search cache
+#  ----------------------------------------------------------------
+#  Popular terms are served from memory. Keys are the normalized term and
+#  filters, so "  Hop" and "hop" share an entry, and a kind's entries are
+#  dropped whenever one of its rows is written.
+
+SEARCHES = {
+    'venues': (Venue, search_venues_stmt),
+    'artists': (Artist, search_artists_stmt),
+}
+
+search_caches = {
+    kind: ResultCache(app.config['SEARCH_CACHE_SIZE'],
+                      app.config['SEARCH_CACHE_TTL'])
+    for kind in SEARCHES
+}
+
+
+def normalize_term(search_term):
+    # the match is case-insensitive already, only spacing needs folding
+    return ' '.join((search_term or '').split()).lower()
+
+
+def search_key(search_term, genre_ids, match_all):
+    '''The normalized (search_term, genre_ids, match_all) of a search'''
+    genre_ids = tuple(sorted(set(int(genre_id) for genre_id in genre_ids)))
+    return normalize_term(search_term), genre_ids, bool(
+        match_all and genre_ids)
+
+
+def cached_search(kind, search_term, genre_ids, match_all):
+    key = search_key(search_term, genre_ids, match_all)
+    stmt = SEARCHES[kind][1](*key)
+    return search_caches[kind].get(
+        key, lambda: tuple(db.session.execute(stmt).all()))
+
+
+@on_commit
+def invalidate_searches(changes):
+    for kind, (model, _) in SEARCHES.items():
+        if changes_for(changes, model):
+            search_caches[kind].clear()
+
+
+def search_venues(search_term, genre_ids=(), match_all=False):
+    return cached_search('venues', search_term, genre_ids, match_all)
+
+
+def search_artists(search_term, genre_ids=(), match_all=False):
+    return cached_search('artists', search_term, genre_ids, match_all)
+
+
+def list_artists_stmt():
+    return lambda_stmt(lambda: select(Artist.id, Artist.name).where(
+        Artist.deleted_at.is_(None)).order_by(Artist.name))
+
+
+def list_artists():
+    return db.session.execute(list_artists_stmt()).all()
+
+
+def venue_listing_stmt(now):
+    '''
+    Venues with their number of upcoming shows, counted in the db rather
+    than by loading every show; listings leave out shows of deleted artists
+    '''
+    upcoming = select(
+        ShowListing.venue_id,
+        func.count(ShowListing.id).label('num_upcoming_shows')
+    ).where(ShowListing.start_time >= now).group_by(
+        ShowListing.venue_id).subquery()
+    return select(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        func.coalesce(upcoming.c.num_upcoming_shows,
+                      0).label('num_upcoming_shows')
+    ).outerjoin(upcoming, upcoming.c.venue_id == Venue.id).where(
+        Venue.deleted_at.is_(None)).order_by(
+        Venue.state, Venue.city, Venue.id)
+
+
+def venue_areas(venues):
+    '''Venue listing rows grouped by city and state, for the venues page'''
+    places = {}
+    for venue in venues:
+        new_venue_data = {
+            'id': venue.id,
+            'name': venue.name,
+            'num_upcoming_shows': venue.num_upcoming_shows
+        }
+        if places.get(f'{venue.state}{venue.city}', None):
+            places[f'{venue.state}{venue.city}']['venues'].append(
+                new_venue_data)
+        else:
+            places[f'{venue.state}{venue.city}'] = {
+                'city': venue.city,
+                'state': venue.state,
+                'venues': [new_venue_data]
+            }
+    return places.values()
+
+
+def show_listing_stmt():
+    # one indexed scan of the listing projection, no joins
+    return select(
+        ShowListing.id,
+        ShowListing.start_time,
+        ShowListing.end_time,
+        ShowListing.artist_id,
+        ShowListing.artist_name,
+        ShowListing.artist_image_link,
+        ShowListing.venue_id,
+        ShowListing.venue_name
+    ).order_by(ShowListing.start_time)
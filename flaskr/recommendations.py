@@ -0,0 +1,183 @@
+import time
+import click
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+from flaskr.app import app
+from flaskr.db import db
+from flaskr.models import (Artist, Recommendation, Show, Venue,
+                           artist_genres, venue_genres)
+
+#----------------------------------------------------------------------------#
+# Recommendations.
+#----------------------------------------------------------------------------#
+
+# Shows link artists and venues into a bipartite graph. Two artists are
+# similar when they play the same venues and share genres (likewise venues
+# hosting the same artists). Similarities are computed offline as cosine
+# similarity over sparse feature rows, a chunk of rows at a time to bound
+# memory, and only the top-K neighbours per entity are stored.
+
+
+def row_normalize(matrix):
+    '''Scale each row of a sparse matrix to unit length'''
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.diags(inverse) @ matrix
+
+
+def positions(ids):
+    return {entity_id: i for i, entity_id in enumerate(ids)}
+
+
+def build_matrices():
+    '''Sparse artist x venue show counts and genre membership matrices'''
+    artist_ids = [row.id for row in db.session.query(Artist.id).filter(
+        Artist.deleted_at.is_(None)).order_by(Artist.id)]
+    venue_ids = [row.id for row in db.session.query(Venue.id).filter(
+        Venue.deleted_at.is_(None)).order_by(Venue.id)]
+    artist_pos, venue_pos = positions(artist_ids), positions(venue_ids)
+
+    pairs = db.session.query(Show.artist_id, Show.venue_id,
+                             func.count(Show.id)).join(
+        Artist, Artist.id == Show.artist_id).join(
+        Venue, Venue.id == Show.venue_id).filter(
+        Artist.deleted_at.is_(None), Venue.deleted_at.is_(None)).group_by(
+        Show.artist_id, Show.venue_id).all()
+    plays = sparse.csr_matrix((
+        [count for _, _, count in pairs],
+        ([artist_pos[a] for a, _, _ in pairs],
+         [venue_pos[v] for _, v, _ in pairs])),
+        shape=(len(artist_ids), len(venue_ids)), dtype=np.float64)
+
+    num_genres = (db.session.query(
+        func.max(artist_genres.c.genre_id)).scalar() or 0)
+    num_genres = max(num_genres, db.session.query(
+        func.max(venue_genres.c.genre_id)).scalar() or 0)
+
+    def genre_matrix(association, entity_column, entity_pos, size):
+        # genre links of deleted entities have no row to go in
+        rows = [(e, g) for e, g in db.session.query(
+            association.c[entity_column],
+            association.c.genre_id).distinct() if e in entity_pos]
+        return sparse.csr_matrix((
+            np.ones(len(rows)),
+            ([entity_pos[e] for e, _ in rows], [g - 1 for _, g in rows])),
+            shape=(size, num_genres))
+
+    artist_genre_matrix = genre_matrix(
+        artist_genres, 'artist_id', artist_pos, len(artist_ids))
+    venue_genre_matrix = genre_matrix(
+        venue_genres, 'venue_id', venue_pos, len(venue_ids))
+    return (artist_ids, venue_ids, plays,
+            artist_genre_matrix, venue_genre_matrix)
+
+
+def features(co_occurrence, genres):
+    weights = app.config['RECOMMENDATION_WEIGHTS']
+    return row_normalize(sparse.hstack([
+        weights['shows'] * row_normalize(co_occurrence),
+        weights['genres'] * row_normalize(genres),
+    ]).tocsr())
+
+
+def top_neighbours(matrix, k, chunk_size):
+    '''Yield (row, [(neighbour_row, score), ...]) best first, per row'''
+    transposed = matrix.T.tocsc()
+    for start in range(0, matrix.shape[0], chunk_size):
+        # chunk x n similarities, kept sparse: only rows sharing a feature
+        similarities = (matrix[start:start + chunk_size] @ transposed).tocsr()
+        for offset in range(similarities.shape[0]):
+            row = start + offset
+            begin, end = similarities.indptr[offset:offset + 2]
+            columns = similarities.indices[begin:end]
+            scores = similarities.data[begin:end]
+            keep = (columns != row) & (scores > 0)
+            columns, scores = columns[keep], scores[keep]
+            if len(scores) > k:
+                best = np.argpartition(-scores, k - 1)[:k]
+                columns, scores = columns[best], scores[best]
+            order = np.argsort(-scores, kind='stable')
+            yield row, list(zip(columns[order], scores[order]))
+
+
+def store_neighbours(entity_type, ids, neighbours):
+    '''Replace stored neighbours for an entity type, in batches'''
+    db.session.query(Recommendation).filter(
+        Recommendation.entity_type == entity_type).delete(
+        synchronize_session=False)
+    batch = []
+    total = 0
+    for row, ranked in neighbours:
+        for rank, (column, score) in enumerate(ranked):
+            batch.append({
+                'entity_type': entity_type,
+                'entity_id': ids[row],
+                'rank': rank,
+                'neighbour_id': ids[column],
+                'score': float(score),
+            })
+        if len(batch) >= app.config['RECOMMENDATION_INSERT_BATCH']:
+            db.session.bulk_insert_mappings(Recommendation, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.bulk_insert_mappings(Recommendation, batch)
+        total += len(batch)
+    return total
+
+
+def build_recommendations():
+    k = app.config['RECOMMENDATION_NEIGHBOURS']
+    chunk_size = app.config['RECOMMENDATION_CHUNK_SIZE']
+    (artist_ids, venue_ids, plays,
+     artist_genre_matrix, venue_genre_matrix) = build_matrices()
+
+    counts = {}
+    counts['artists'] = store_neighbours('artists', artist_ids, top_neighbours(
+        features(plays, artist_genre_matrix), k, chunk_size))
+    counts['venues'] = store_neighbours('venues', venue_ids, top_neighbours(
+        features(plays.T.tocsr(), venue_genre_matrix), k, chunk_size))
+    db.session.commit()
+    return counts
+
+
+@app.cli.group()
+def recommendations():
+    '''Similar artist/venue recommendations.'''
+
+
+@recommendations.command('build')
+def build_command():
+    '''Recompute and store the top neighbours of every artist and venue.'''
+    start = time.perf_counter()
+    try:
+        counts = build_recommendations()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
+    click.echo(f'Stored {counts["artists"]} artist and {counts["venues"]} '
+               f'venue neighbours in {time.perf_counter() - start:.1f}s')
+
+
+#  Lookup
+#  ----------------------------------------------------------------
+
+RECOMMENDATION_MODELS = {
+    'artists': Artist,
+    'venues': Venue,
+}
+
+
+def similar_entities(entity_type, entity_id):
+    '''Stored neighbours, best first, in one primary key range scan'''
+    model = RECOMMENDATION_MODELS[entity_type]
+    return db.session.query(
+        model.id, model.name, model.image_link).join(
+        Recommendation, Recommendation.neighbour_id == model.id).filter(
+        Recommendation.entity_type == entity_type,
+        Recommendation.entity_id == entity_id,
+        model.deleted_at.is_(None)).order_by(
+        Recommendation.rank).all()
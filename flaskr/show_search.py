@@ -0,0 +1,150 @@
+import click
+import pytz
+from datetime import datetime, time, timedelta
+from sqlalchemy import func, or_, select, tuple_
+from flaskr.app import app
+from flaskr.archive import LISTING_COLUMNS, shows
+from flaskr.db import db
+from flaskr.models import (
+    ShowListing, artist_genres, genre_mask_for, in_genre_mask)
+
+#----------------------------------------------------------------------------#
+# Show search.
+#----------------------------------------------------------------------------#
+
+# Upcoming shows by date range, venue city/state and artist genres, read
+# from ShowListing. A page is found in two steps: the ids, in (start_time,
+# id) order, from an index-only scan of ix_ShowListing_start_time_id or,
+# given a place, ix_ShowListing_location_start_time_id (both carry the
+# genre mask), then the page's rows by primary key. Pages are keyset
+# paginated, continuing after the last show of the previous page, so a
+# page deep into the results costs the same as the first one.
+# `flask shows explain-search` prints the plan the database picks.
+
+
+class SearchFilters:
+
+    def __init__(self, start=None, end=None, city=None, state=None,
+                 genre_ids=()):
+        self.start = start
+        self.end = end
+        self.city = (city or '').strip().lower() or None
+        self.state = state or None
+        self.genre_ids = tuple(genre_ids)
+
+    @classmethod
+    def from_form(cls, form):
+        '''From a validated ShowSearchForm, dates taken as whole UTC days'''
+        start = end = None
+        if form.start_date.data:
+            start = datetime.combine(form.start_date.data, time(),
+                                     tzinfo=pytz.utc)
+        if form.end_date.data:
+            end = datetime.combine(form.end_date.data + timedelta(days=1),
+                                   time(), tzinfo=pytz.utc)
+        return cls(start, end, form.city.data, form.state.data,
+                   form.genres.data or ())
+
+
+def id_query(filters, after=None):
+    '''The (start_time, id) keys of matching shows, in order'''
+    start = filters.start or datetime.now(pytz.utc)
+    stmt = select(ShowListing.start_time, ShowListing.id).where(
+        ShowListing.start_time >= start)
+    if filters.end:
+        stmt = stmt.where(ShowListing.start_time < filters.end)
+    if filters.state:
+        stmt = stmt.where(ShowListing.venue_state == filters.state)
+    if filters.city:
+        # the indexed expression, matched as is
+        stmt = stmt.where(
+            func.lower(ShowListing.venue_city) == filters.city)
+    if filters.genre_ids:
+        mask = genre_mask_for(filters.genre_ids)
+        condition = ShowListing.artist_genre_mask.op('&')(mask) != 0
+        unmasked = [genre_id for genre_id in filters.genre_ids
+                    if not in_genre_mask(genre_id)]
+        if unmasked:
+            # past the mask's bits, looked up per show off the index
+            condition = or_(condition, select(artist_genres.c.genre_id).where(
+                artist_genres.c.artist_id == ShowListing.artist_id,
+                artist_genres.c.genre_id.in_(unmasked)).exists())
+        stmt = stmt.where(condition)
+    if after is not None:
+        stmt = stmt.where(tuple_(ShowListing.start_time, ShowListing.id) >
+                          tuple_(*after))
+    return stmt.order_by(ShowListing.start_time, ShowListing.id)
+
+
+def search_shows(filters, after_id=None, limit=None):
+    '''
+    A page of matching shows, soonest first, and the id to continue after
+    (None on the last page). Raises LookupError if after_id is gone.
+    '''
+    limit = limit or app.config['SHOW_SEARCH_PAGE_SIZE']
+    after = None
+    if after_id is not None:
+        after = db.session.execute(select(
+            ShowListing.start_time, ShowListing.id).where(
+            ShowListing.id == after_id)).first()
+        if after is None:
+            raise LookupError(f'Show {after_id} is no longer listed')
+    # one extra key tells whether there's a next page
+    keys = db.session.execute(
+        id_query(filters, after).limit(limit + 1)).all()
+    ids = [key.id for key in keys[:limit]]
+    if not ids:
+        return [], None
+    rows = db.session.execute(select(
+        *LISTING_COLUMNS, ShowListing.venue_city,
+        ShowListing.venue_state).where(ShowListing.id.in_(ids)).order_by(
+        ShowListing.start_time, ShowListing.id)).all()
+    return rows, ids[-1] if len(keys) > limit else None
+
+
+#  Plans
+#  ----------------------------------------------------------------
+
+
+def explain(stmt):
+    '''The database's plan for a statement, as lines of text'''
+    connection = db.session.connection()
+    dialect = connection.dialect
+    compiled = stmt.compile(dialect=dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    if dialect.name == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+    else:
+        prefix = 'EXPLAIN QUERY PLAN '
+    rows = connection.exec_driver_sql(prefix + str(compiled), params).all()
+    # postgres returns a line per row, sqlite (id, parent, _, detail) rows
+    return [row[-1] for row in rows]
+
+
+@shows.command('explain-search')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']))
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']))
+@click.option('--city')
+@click.option('--state')
+@click.option('--genre', 'genre_ids', type=int, multiple=True)
+def explain_search_command(start, end, city, state, genre_ids):
+    '''Print the plan of a show search's id query.'''
+    # --end is inclusive, as on the search form
+    filters = SearchFilters(
+        start and start.replace(tzinfo=pytz.utc),
+        end and (end + timedelta(days=1)).replace(tzinfo=pytz.utc), city,
+        state, genre_ids)
+    stmt = id_query(filters).limit(app.config['SHOW_SEARCH_PAGE_SIZE'] + 1)
+    try:
+        plan = explain(stmt)
+    finally:
+        db.session.remove()
+    for line in plan:
+        click.echo(line)
+    # postgres only skips the heap for pages marked all-visible by vacuum,
+    # so expect some heap fetches right after a bulk load
+    if not any('Index Only Scan' in line or 'COVERING INDEX' in line
+               for line in plan):
+        click.echo('Warning: not an index-only scan', err=True)
@@ -2,3 +2,30 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// typeahead for the navbar search boxes
+document.addEventListener('DOMContentLoaded', function () {
+  var inputs = document.querySelectorAll('input[data-autocomplete]');
+  Array.prototype.forEach.call(inputs, function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var timer = null;
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        var q = input.value.trim();
+        if (!q) { list.innerHTML = ''; return; }
+        fetch(input.dataset.autocomplete + '?q=' + encodeURIComponent(q))
+          .then(function (res) { return res.json(); })
+          .then(function (res) {
+            list.innerHTML = '';
+            res.data.forEach(function (item) {
+              var option = document.createElement('option');
+              option.value = item.name;
+              list.appendChild(option);
+            });
+          })
+          .catch(function () {});
+      }, 100);
+    });
+  });
+});
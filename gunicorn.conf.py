@@ -0,0 +1,52 @@
+'''
+gunicorn settings, read from the working directory by `gunicorn wsgi:app`.
+Sizing comes from flaskr/config.py (and the environment variables it reads).
+
+With preload_app the master imports the app once and forks the workers from
+it, so they share its memory copy-on-write instead of each loading their own
+copy (and they share one SECRET_KEY, so sessions and CSRF tokens are valid
+across workers). Connections must not be shared though: a pooled socket
+used by two processes corrupts both sides' traffic.
+'''
+import gc
+import os
+import runpy
+
+# the settings only, importing flaskr here would load the whole app (and
+# not `config`, that's a gunicorn setting itself)
+app_config = runpy.run_path(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'flaskr', 'config.py'))
+
+bind = app_config['GUNICORN_BIND']
+workers = app_config['GUNICORN_WORKERS']
+worker_class = app_config['GUNICORN_WORKER_CLASS']
+threads = app_config['GUNICORN_THREADS']
+preload_app = app_config['GUNICORN_PRELOAD']
+timeout = app_config['GUNICORN_TIMEOUT']
+max_requests = app_config['GUNICORN_MAX_REQUESTS']
+max_requests_jitter = app_config['GUNICORN_MAX_REQUESTS_JITTER']
+
+
+def when_ready(server):
+    if preload_app:
+        # move everything loaded so far out of the collector's reach, so
+        # collections in the workers don't write to (and copy) those pages
+        gc.freeze()
+
+
+def dispose_engine():
+    from flaskr.db import db
+    db.engine.dispose()
+
+
+def pre_fork(server, worker):
+    # close any connection the master opened while loading the app, so
+    # there's none for the worker to inherit
+    if preload_app:
+        dispose_engine()
+
+
+def post_fork(server, worker):
+    # and start the worker on a pool of its own
+    if preload_app:
+        dispose_engine()
@@ -74,10 +74,19 @@ def run_migrations_online():
     connectable = current_app.extensions['migrate'].db.get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # the app's statement_timeout would cut off index builds and
+            # backfills, migrations bound their waits with lock_timeout
+            # instead (see flaskr/online_migrations.py)
+            connection.exec_driver_sql('SET statement_timeout = 0')
+
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            # commit per migration, so one with an autocommit block (e.g.
+            # a concurrent index build) doesn't commit half of another
+            transaction_per_migration=True,
             **current_app.extensions['migrate'].configure_args
         )
 
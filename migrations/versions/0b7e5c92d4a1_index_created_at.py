@@ -0,0 +1,26 @@
+"""index Venue and Artist created_at
+
+Revision ID: 0b7e5c92d4a1
+Revises: f2a9c4d17e63
+Create Date: 2026-10-19 21:37:52.114806
+
+"""
+from flaskr.online_migrations import (
+    create_index_concurrently, drop_index_concurrently)
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7e5c92d4a1'
+down_revision = 'f2a9c4d17e63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index_concurrently('ix_Artist_created_at', 'Artist', ['created_at'], unique=False)
+    create_index_concurrently('ix_Venue_created_at', 'Venue', ['created_at'], unique=False)
+
+
+def downgrade():
+    drop_index_concurrently('ix_Venue_created_at', 'Venue')
+    drop_index_concurrently('ix_Artist_created_at', 'Artist')
@@ -0,0 +1,73 @@
+import pytest
+from flaskr import app as flask_app
+from flaskr.db import db
+from flaskr.models import Artist, Genre, Venue
+
+
+@pytest.fixture
+def database_uri(tmp_path):
+    return f'sqlite:///{tmp_path / "fyyur.db"}'
+
+
+@pytest.fixture
+def engine_options():
+    # the postgres connect_args don't apply
+    return {}
+
+
+@pytest.fixture
+def async_engine_options():
+    # nor do the asyncpg server settings
+    return {}
+
+
+@pytest.fixture
+def app(database_uri, engine_options, async_engine_options, tmp_path):
+    '''The app on a fresh database, inside an app context'''
+    flask_app.config.update(
+        SQLALCHEMY_DATABASE_URI=database_uri,
+        SQLALCHEMY_ENGINE_OPTIONS=engine_options,
+        ASYNC_ENGINE_OPTIONS=async_engine_options,
+        SQLALCHEMY_ECHO=False,
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        IMAGE_CACHE_DIR=str(tmp_path / 'image_cache'),
+    )
+    with flask_app.app_context():
+        db.create_all()
+        db.session.add_all(Genre(name=name) for name in
+                           ('Blues', 'Classical', 'Folk', 'Jazz', 'Rock'))
+        db.session.commit()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_venue(app):
+    def make_venue(**values):
+        venue = Venue(**dict({'name': 'The Musical Hop',
+                              'city': 'San Francisco', 'state': 'CA',
+                              'address': '1015 Folsom Street',
+                              'phone': '123-123-1234'}, **values))
+        db.session.add(venue)
+        db.session.commit()
+        return venue.id
+    return make_venue
+
+
+@pytest.fixture
+def make_artist(app):
+    def make_artist(**values):
+        artist = Artist(**dict({'name': 'Guns N Petals',
+                                'city': 'San Francisco', 'state': 'CA',
+                                'phone': '326-123-5000'}, **values))
+        db.session.add(artist)
+        db.session.commit()
+        return artist.id
+    return make_artist
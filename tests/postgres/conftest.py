@@ -0,0 +1,26 @@
+import os
+import pytest
+from flaskr import config
+
+# Tests of what only postgres does, run against the scratch database in
+# TEST_POSTGRES_URL (e.g. postgresql://localhost/fyyur_test), whose tables
+# are created and dropped around each test. Skipped when it isn't set.
+
+
+@pytest.fixture
+def database_uri():
+    url = os.environ.get('TEST_POSTGRES_URL')
+    if not url:
+        pytest.skip('TEST_POSTGRES_URL is not set')
+    return url
+
+
+@pytest.fixture
+def engine_options():
+    # as in production, pre-ping included
+    return config.SQLALCHEMY_ENGINE_OPTIONS
+
+
+@pytest.fixture
+def async_engine_options():
+    return config.ASYNC_ENGINE_OPTIONS
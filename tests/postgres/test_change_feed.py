@@ -0,0 +1,53 @@
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from flaskr import changes
+from flaskr.db import db
+from flaskr.models import Venue
+
+
+def add_venue(app, name, pause=False):
+    '''Commit a new venue on the thread's own session, optionally pausing
+    in the commit with its entries written but not committed'''
+    with app.app_context():
+        db.session.info['pause'] = pause
+        db.session.add(Venue(name=name))
+        db.session.commit()
+        db.session.remove()
+
+
+def test_entries_become_visible_in_id_order(app):
+    paused, release = threading.Event(), threading.Event()
+
+    # runs after write_change_log, registered at import
+    @event.listens_for(Session, 'before_commit')
+    def pause(session):
+        if session.info.pop('pause', False):
+            paused.set()
+            release.wait(10)
+
+    try:
+        first = threading.Thread(target=add_venue,
+                                 args=(app, 'First', True))
+        first.start()
+        assert paused.wait(10)
+        second = threading.Thread(target=add_venue, args=(app, 'Second'))
+        second.start()
+
+        # the second commit waits for the first, which took smaller ids
+        second.join(0.5)
+        assert second.is_alive()
+        assert changes.changes_since(0, 10) == []
+        db.session.remove()
+
+        release.set()
+        first.join(10)
+        second.join(10)
+    finally:
+        release.set()
+        event.remove(Session, 'before_commit', pause)
+
+    venues = dict(db.session.query(Venue.name, Venue.id))
+    assert [(entry.entity_id, entry.action)
+            for entry in changes.changes_since(0, 10)] == [
+        (venues['First'], 'created'), (venues['Second'], 'created')]
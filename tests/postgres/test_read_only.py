@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from sqlalchemy import event, insert, text
+from sqlalchemy.exc import DBAPIError, InternalError
+from flaskr import asgi
+from flaskr.db import db
+from flaskr.models import Genre
+
+
+def test_read_only_transactions(app):
+    # the second time on a pooled connection the pre-ping has already run
+    # a query on
+    for _ in range(2):
+        db.session.info['read_only'] = True
+        assert db.session.execute(
+            text('SHOW transaction_read_only')).scalar() == 'on'
+        with pytest.raises(InternalError, match='read-only transaction'):
+            db.session.execute(insert(Genre).values(name='Soul'))
+        db.session.remove()
+
+    assert db.session.execute(
+        text('SHOW transaction_read_only')).scalar() == 'off'
+
+
+def test_gets_are_read_only(app, client, make_venue):
+    make_venue()
+    db.session.remove()
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args:
+                 statements.append(statement))
+
+    for _ in range(2):
+        response = client.get('/venues')
+        assert response.status_code == 200
+        assert b'The Musical Hop' in response.data
+
+    assert statements.count('SET TRANSACTION READ ONLY') == 2
+
+
+def test_async_read_path_is_read_only(app):
+    async def run():
+        try:
+            async with asgi.get_engine().connect() as connection:
+                assert await connection.scalar(
+                    text('SHOW transaction_read_only')) == 'on'
+                with pytest.raises(DBAPIError,
+                                   match='read-only transaction'):
+                    await connection.execute(
+                        insert(Genre).values(name='Soul'))
+        finally:
+            await asgi.dispose_engine()
+
+    asyncio.run(run())
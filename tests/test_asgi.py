@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+import pytest
+import pytz
+from flaskr import asgi
+from flaskr.cache import AsyncResultCache
+from flaskr.db import db
+from flaskr.models import Show
+
+
+def asgi_request(method, path, form=None):
+    '''(status, body) of a request to the async read path'''
+    body = urlencode(form or {}, doseq=True).encode()
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        try:
+            await asgi.application(
+                {'type': 'http', 'method': method, 'path': path},
+                receive, send)
+        finally:
+            # connections belong to this event loop
+            await asgi.dispose_engine()
+
+    asyncio.run(run())
+    return sent[0]['status'], sent[1]['body'].decode('utf-8')
+
+
+@pytest.fixture
+def catalogue(app, make_venue, make_artist, monkeypatch):
+    monkeypatch.setattr(asgi, 'search_caches', {
+        kind: AsyncResultCache(16, 60) for kind in asgi.search_caches})
+    venue_id = make_venue()
+    make_venue(name='Park Square Live', city='New York', state='NY',
+               address='34 Whiskey Moore Ave')
+    artist_id = make_artist()
+    start = datetime.now(pytz.utc) + timedelta(days=7)
+    db.session.add(Show(venue_id=venue_id, artist_id=artist_id,
+                        start_time=start, end_time=start + timedelta(hours=2)))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('method, path, form', [
+    ('GET', '/', None),
+    ('GET', '/venues', None),
+    ('GET', '/artists', None),
+    ('GET', '/shows', None),
+    ('POST', '/venues/search', {'search_term': 'hop'}),
+    ('POST', '/venues/search', {'search_term': '', 'genres': ['4', 'x'],
+                                'genre_match': 'all'}),
+    ('POST', '/artists/search', {'search_term': 'petals'}),
+])
+def test_pages_match_the_sync_handlers(client, catalogue, method, path,
+                                       form):
+    expected = client.open(path, method=method, data=form)
+
+    status, body = asgi_request(method, path, form)
+
+    assert status == expected.status_code == 200
+    assert body == expected.get_data(as_text=True)
+
+
+def test_searches_are_cached(catalogue, make_venue):
+    first = asgi_request('POST', '/venues/search', {'search_term': 'hop'})
+    make_venue(name='Hop Hall', address='1 Main St')
+    second = asgi_request('POST', '/venues/search', {'search_term': 'hop'})
+
+    assert first == second
+    assert asgi.search_caches['venues'].hits == 1
+
+
+def test_unknown_paths_are_not_found(app):
+    status, body = asgi_request('POST', '/venues/create')
+
+    assert status == 404
@@ -0,0 +1,40 @@
+import json
+import pytest
+from flaskr import assets
+
+
+@pytest.fixture
+def dist(app, tmp_path, monkeypatch):
+    '''A built dist directory with one fingerprinted stylesheet'''
+    directory = tmp_path / 'dist'
+    (directory / 'css').mkdir(parents=True)
+    (directory / 'css' / 'main.0123456789ab.css').write_text('body {}')
+    (directory / 'manifest.json').write_text(json.dumps(
+        {'css/main.css': 'css/main.0123456789ab.css'}))
+    monkeypatch.setattr(assets, 'dist_dir', lambda: str(directory))
+    monkeypatch.setattr(assets, '_manifest', None)
+    return directory
+
+
+def test_fingerprinted_assets_are_immutable(dist, client):
+    response = client.get('/assets/css/main.0123456789ab.css')
+
+    assert response.status_code == 200
+    assert response.data == b'body {}'
+    assert response.cache_control.max_age == \
+        client.application.config['ASSETS_MAX_AGE']
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+def test_unfingerprinted_files_are_revalidated(dist, client):
+    # a font the built css points at with ../fonts/
+    response = client.get('/assets/fonts/fontawesome-webfont.svg')
+
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+    assert client.get('/assets/fonts/fontawesome-webfont.svg', headers={
+        'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_only_fingerprinted_builds_are_served_from_dist(dist, client):
+    assert client.get('/assets/manifest.json').status_code == 404
@@ -0,0 +1,33 @@
+from flaskr.autocomplete import PrefixIndex
+
+
+def test_name_start_matches_rank_first(app):
+    # more mid-name "the" words than the search looks past, all sorting
+    # before the one name that starts with it
+    rows = [(i, f'Alpha The A{i:02d}') for i in range(60)]
+    rows.append((100, 'The Zoo'))
+    index = PrefixIndex(rows)
+
+    results = index.search('the', 10)
+
+    assert results[0] == (100, 'The Zoo')
+    assert len(results) == 10
+
+
+def test_words_inside_names_match(app):
+    index = PrefixIndex([(1, 'The Musical Hop'), (2, 'Park Square Live')])
+
+    assert index.search('hop', 10) == [(1, 'The Musical Hop')]
+    assert index.search('live', 10) == [(2, 'Park Square Live')]
+    assert index.search('jazz', 10) == []
+
+
+def test_renamed_and_removed_entities(app):
+    index = PrefixIndex([(1, 'The Musical Hop'), (2, 'The Dueling Pianos')])
+
+    index.add(1, 'Hop Club')
+    index.remove(2)
+
+    assert index.search('the', 10) == []
+    assert index.search('hop', 10) == [(1, 'Hop Club')]
+    assert index.starts == [('hop club', 1)]
@@ -0,0 +1,20 @@
+import asyncio
+from flaskr.cache import AsyncResultCache
+
+
+def test_concurrent_async_misses_are_computed_once():
+    cache = AsyncResultCache(16, 60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'value'
+
+    async def run():
+        return await asyncio.gather(*[cache.get('key', compute)
+                                      for _ in range(5)])
+
+    assert asyncio.run(run()) == ['value'] * 5
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (4, 1)
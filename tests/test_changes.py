@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import func, select
+from flaskr import deletion
+from flaskr.db import db
+from flaskr.models import ChangeLog, Show, Venue
+
+
+def logged():
+    return db.session.execute(select(
+        ChangeLog.entity_type, ChangeLog.entity_id, ChangeLog.action).order_by(
+        ChangeLog.id)).all()
+
+
+def test_entries_are_written_as_the_transaction_commits(app):
+    venue = Venue(name='The Dueling Pianos Bar', city='New York', state='NY',
+                  address='335 Delancey Street', phone='914-003-1132')
+    db.session.add(venue)
+    db.session.flush()
+
+    assert db.session.scalar(select(func.count(ChangeLog.id))) == 0
+
+    db.session.commit()
+
+    assert logged() == [('venues', venue.id, 'created')]
+
+
+def test_rolled_back_changes_are_not_logged(app, make_venue):
+    db.session.add(Venue(name='Park Square Live Music & Coffee',
+                         city='San Francisco', state='CA',
+                         address='34 Whiskey Moore Ave',
+                         phone='415-000-1234'))
+    db.session.flush()
+    db.session.rollback()
+
+    venue_id = make_venue()
+
+    assert logged() == [('venues', venue_id, 'created')]
+
+
+def test_soft_delete_logs_the_venue_and_its_shows(app, make_venue,
+                                                   make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    start = datetime.now(pytz.utc) + timedelta(days=7)
+    show = Show(venue_id=venue_id, artist_id=artist_id, start_time=start,
+                end_time=start + timedelta(hours=2))
+    db.session.add(show)
+    db.session.commit()
+    last_id = db.session.scalar(select(func.max(ChangeLog.id)))
+
+    deletion.soft_delete(Venue, [venue_id])
+    db.session.commit()
+
+    entries = db.session.execute(select(
+        ChangeLog.entity_type, ChangeLog.entity_id, ChangeLog.action).where(
+        ChangeLog.id > last_id)).all()
+    assert sorted(entries) == [('shows', show.id, 'deleted'),
+                               ('venues', venue_id, 'deleted')]
+
+
+def test_feed_pages_by_cursor(app, client, make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+
+    first = client.get('/changes?limit=1').get_json()
+    second = client.get(f'/changes?since={first["next"]}').get_json()
+
+    assert [(change['entity'], change['id'], change['action'])
+            for change in first['changes'] + second['changes']] == [
+        ('venues', venue_id, 'created'), ('artists', artist_id, 'created')]
+    assert first['has_more']
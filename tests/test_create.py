@@ -0,0 +1,38 @@
+import pytest
+from flaskr.db import db
+from flaskr.models import Artist, Venue
+
+VENUE = {
+    'name': 'The Dueling Pianos Bar', 'city': 'New York', 'state': 'NY',
+    'address': '335 Delancey Street', 'phone': '914-003-1132',
+    'facebook_link': 'https://www.facebook.com/theduelingpianos',
+}
+ARTIST = {
+    'name': 'Matt Quevedo', 'city': 'New York', 'state': 'NY',
+    'phone': '300-400-5000',
+    'facebook_link': 'https://www.facebook.com/mattquevedo923251523',
+}
+
+
+@pytest.mark.parametrize('path, values, model', [
+    ('/venues/create', VENUE, Venue),
+    ('/artists/create', ARTIST, Artist),
+])
+def test_create_with_genres(client, path, values, model):
+    response = client.post(path, data=dict(values, genres=['1', '4']))
+
+    assert response.status_code == 200
+    entity = db.session.query(model).filter_by(name=values['name']).one()
+    assert sorted(genre.name for genre in entity.genres) == ['Blues', 'Jazz']
+
+
+@pytest.mark.parametrize('path, values, model', [
+    ('/venues/create', VENUE, Venue),
+    ('/artists/create', ARTIST, Artist),
+])
+def test_non_numeric_genres_are_a_form_error(client, path, values, model):
+    response = client.post(path, data=dict(values, genres=['1', 'jazz']))
+
+    assert response.status_code == 200
+    assert b'Invalid' in response.data
+    assert db.session.query(model).count() == 0
@@ -0,0 +1,29 @@
+from sqlalchemy import event
+from flaskr.db import db
+
+
+def count_checkouts(app):
+    # the request shares the test's session, let go of its connection
+    db.session.remove()
+    checkouts = []
+    event.listen(db.engine, 'checkout', lambda *args: checkouts.append(1))
+    return checkouts
+
+
+def test_requests_without_queries_dont_check_out_a_connection(app, client):
+    checkouts = count_checkouts(app)
+
+    assert client.get('/shows/create').status_code == 200
+
+    assert checkouts == []
+
+
+def test_read_requests_still_query(app, client, make_venue):
+    make_venue()
+    checkouts = count_checkouts(app)
+
+    response = client.get('/venues')
+
+    assert response.status_code == 200
+    assert b'The Musical Hop' in response.data
+    assert len(checkouts) == 1
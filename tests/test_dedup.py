@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from flaskr import dedup, deletion
+from flaskr.db import db
+from flaskr.models import Show, Venue
+
+
+def add_show(venue_id, artist_id):
+    start = datetime.now(pytz.utc) + timedelta(days=7)
+    show = Show(venue_id=venue_id, artist_id=artist_id, start_time=start,
+                end_time=start + timedelta(hours=2))
+    db.session.add(show)
+    db.session.commit()
+    return show.id
+
+
+def test_merge_moves_shows_to_the_kept_venue(app, make_venue, make_artist):
+    keep_id = make_venue()
+    duplicate_id = make_venue(name='The Musical Hop Club', phone=None,
+                              website='https://themusicalhop.com')
+    show_id = add_show(duplicate_id, make_artist())
+
+    assert dedup.merge('venues', keep_id, duplicate_id) == 1
+
+    assert db.session.get(Show, show_id).venue_id == keep_id
+    assert db.session.get(Venue, duplicate_id) is None
+    assert db.session.get(Venue, keep_id).website == \
+        'https://themusicalhop.com'
+
+
+@pytest.mark.parametrize('deleted', ['keep', 'duplicate'])
+def test_deleted_venues_are_not_merged(app, make_venue, make_artist,
+                                       deleted):
+    ids = {'keep': make_venue(),
+           'duplicate': make_venue(name='The Musical Hop Club')}
+    show_id = add_show(ids['duplicate'], make_artist())
+    deletion.soft_delete(Venue, [ids[deleted]])
+    db.session.commit()
+
+    with pytest.raises(ValueError):
+        dedup.merge('venues', ids['keep'], ids['duplicate'])
+
+    db.session.rollback()
+    assert db.session.get(Venue, ids['duplicate']) is not None
+    assert db.session.get(Show, show_id).venue_id == ids['duplicate']
@@ -0,0 +1,213 @@
+import io
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from PIL import Image
+from flaskr.controllers import images
+from flaskr.controllers.images import cache_path, thumbnail_key
+
+
+def png(color, size=(600, 300)):
+    out = io.BytesIO()
+    Image.new('RGB', size, color).save(out, format='PNG')
+    return out.getvalue()
+
+
+class ImageStub(BaseHTTPRequestHandler):
+    '''Serves /red.png and /blue.png, redirects /to-localhost, 404s the
+    rest, counting requests per path; /slow/ paths wait for the server's
+    gate first'''
+
+    images = {'/red.png': png('red'), '/blue.png': png('blue')}
+
+    def do_GET(self):
+        self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        if self.path.startswith('/slow/'):
+            self.server.gate.wait(5)
+        if self.path == '/to-localhost':
+            self.send_response(302)
+            self.send_header('Location', f'http://localhost:'
+                             f'{self.server.server_port}/red.png')
+            self.end_headers()
+            return
+        body = self.images.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(app, monkeypatch):
+    monkeypatch.setattr(images, '_failed_fetches', {})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ImageStub)
+    server.hits = {}
+    server.gate = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    # the stub is on loopback, which is otherwise refused
+    app.config['IMAGE_FETCH_TRUSTED_HOSTS'] = ('127.0.0.1',)
+    yield server
+    app.config['IMAGE_FETCH_TRUSTED_HOSTS'] = ()
+    server.shutdown()
+    server.server_close()
+
+
+def stub_url(server, path):
+    return f'http://127.0.0.1:{server.server_port}{path}'
+
+
+def thumbnail(client, kind, entity_id, image_link):
+    return client.get(f'/images/{kind}/{entity_id}/'
+                      f'{thumbnail_key(image_link)}.jpg')
+
+
+def test_thumbnail_is_fetched_once_then_cached(client, make_venue, stub):
+    link = stub_url(stub, '/red.png')
+    venue_id = make_venue(image_link=link)
+
+    first = thumbnail(client, 'venues', venue_id, link)
+    second = thumbnail(client, 'venues', venue_id, link)
+
+    assert first.status_code == second.status_code == 200
+    assert first.mimetype == 'image/jpeg'
+    assert 'immutable' in first.headers['Cache-Control']
+    assert Image.open(io.BytesIO(first.data)).size == (400, 200)
+    assert second.data == first.data
+    assert stub.hits == {'/red.png': 1}
+
+
+def test_least_recently_used_thumbnails_are_evicted(app, client, make_venue,
+                                                     stub, monkeypatch):
+    # earlier tests' writes count towards the interval too
+    monkeypatch.setattr(images, '_writes_since_eviction', 0)
+    red, blue = stub_url(stub, '/red.png'), stub_url(stub, '/blue.png')
+    red_id = make_venue(image_link=red)
+    blue_id = make_venue(name='Park Square', image_link=blue)
+    app.config.update(IMAGE_CACHE_MAX_BYTES=1,
+                      IMAGE_CACHE_EVICTION_INTERVAL=2)
+    try:
+        assert thumbnail(client, 'venues', red_id, red).status_code == 200
+        assert os.path.exists(cache_path(thumbnail_key(red)))
+        # the second write reaches the interval and trims the cache
+        assert thumbnail(client, 'venues', blue_id, blue).status_code == 200
+    finally:
+        app.config.update(IMAGE_CACHE_MAX_BYTES=256 * 1024 * 1024,
+                          IMAGE_CACHE_EVICTION_INTERVAL=50)
+    assert not os.path.exists(cache_path(thumbnail_key(red)))
+    assert os.path.exists(cache_path(thumbnail_key(blue)))
+    assert images._writes_since_eviction == 0
+
+
+def test_failed_fetch_redirects_to_source(client, make_venue, stub):
+    link = stub_url(stub, '/missing.png')
+    venue_id = make_venue(image_link=link)
+
+    response = thumbnail(client, 'venues', venue_id, link)
+
+    assert response.status_code == 302
+    assert response.headers['Location'] == link
+    assert not os.path.exists(cache_path(thumbnail_key(link)))
+
+
+
+def test_failed_fetches_are_remembered(client, make_venue, stub):
+    link = stub_url(stub, '/missing.png')
+    venue_id = make_venue(image_link=link)
+
+    first = thumbnail(client, 'venues', venue_id, link)
+    second = thumbnail(client, 'venues', venue_id, link)
+
+    assert first.status_code == second.status_code == 302
+    assert second.headers['Location'] == link
+    assert stub.hits == {'/missing.png': 1}
+
+
+def test_failed_fetches_are_retried_after_ttl(app, client, make_venue, stub):
+    link = stub_url(stub, '/missing.png')
+    venue_id = make_venue(image_link=link)
+    app.config['IMAGE_FETCH_FAILURE_TTL'] = 0
+    try:
+        thumbnail(client, 'venues', venue_id, link)
+        thumbnail(client, 'venues', venue_id, link)
+    finally:
+        app.config['IMAGE_FETCH_FAILURE_TTL'] = 60
+    assert stub.hits == {'/missing.png': 2}
+
+
+def test_concurrent_misses_share_one_fetch(stub):
+    link = stub_url(stub, '/slow/missing.png')
+    key = thumbnail_key(link)
+    errors = []
+
+    def get():
+        try:
+            images.get_thumbnail(key, link)
+        except ValueError as e:
+            errors.append(e)
+
+    first = threading.Thread(target=get)
+    first.start()
+    while not stub.hits:
+        threading.Event().wait(0.01)
+    # the first request holds the lock, these two queue behind it
+    waiters = [threading.Thread(target=get) for _ in range(2)]
+    for thread in waiters:
+        thread.start()
+    while images._fetch_locks[key][1] < 3:
+        threading.Event().wait(0.01)
+    stub.gate.set()
+    for thread in [first] + waiters:
+        thread.join()
+
+    assert len(errors) == 3
+    assert stub.hits == {'/slow/missing.png': 1}
+    assert images._fetch_locks == {}
+
+def test_private_addresses_are_not_fetched(app, client, make_venue, stub):
+    app.config['IMAGE_FETCH_TRUSTED_HOSTS'] = ()
+    link = stub_url(stub, '/red.png')
+    venue_id = make_venue(image_link=link)
+
+    response = thumbnail(client, 'venues', venue_id, link)
+
+    assert response.status_code == 302
+    assert stub.hits == {}
+
+
+def test_redirects_to_private_addresses_are_not_followed(client, make_venue,
+                                                          stub):
+    link = stub_url(stub, '/to-localhost')
+    venue_id = make_venue(image_link=link)
+
+    response = thumbnail(client, 'venues', venue_id, link)
+
+    assert response.status_code == 302
+    assert stub.hits == {'/to-localhost': 1}
+
+
+@pytest.mark.parametrize('address', [
+    '127.0.0.1', '10.0.0.8', '172.16.4.1', '192.168.1.1', '169.254.169.254',
+    '::1', 'fe80::1', '::ffff:127.0.0.1'])
+def test_public_address_refuses_non_public(app, monkeypatch, address):
+    monkeypatch.setattr(images.socket, 'getaddrinfo', lambda *args, **kw: [
+        (None, None, None, '', (address, 80))])
+    with pytest.raises(ValueError):
+        images.public_address('images.example.com', 80)
+
+
+def test_oversized_images_are_refused(app):
+    app.config['IMAGE_MAX_SOURCE_PIXELS'] = 100
+    try:
+        with pytest.raises(ValueError):
+            images.make_thumbnail(png('red', (20, 20)))
+    finally:
+        app.config['IMAGE_MAX_SOURCE_PIXELS'] = 40 * 1000 * 1000
@@ -0,0 +1,107 @@
+import logging
+import pytest
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from flaskr import online_migrations
+from flaskr.online_migrations import (
+    backfill, create_index_concurrently, drop_index_concurrently,
+    lock_timeout)
+
+
+@pytest.fixture
+def connection():
+    '''A sqlite connection with `op` bound to it, as in a migration'''
+    engine = sa.create_engine('sqlite://')
+    with engine.connect() as connection:
+        connection.execute(sa.text(
+            'CREATE TABLE "Item" (id INTEGER PRIMARY KEY, '
+            'name VARCHAR, size INTEGER)'))
+        connection.execute(sa.text(
+            'INSERT INTO "Item" (id, name) VALUES (:id, :name)'),
+            [{'id': i, 'name': f'item {i}'} for i in range(1, 26)])
+        context = MigrationContext.configure(connection)
+        with Operations.context(context):
+            yield connection
+
+
+def sizes(connection):
+    return connection.execute(sa.text(
+        'SELECT size FROM "Item" ORDER BY id')).scalars().all()
+
+
+def index_names(connection):
+    return {index['name'] for index in
+            sa.inspect(connection).get_indexes('Item')}
+
+
+def test_backfill_updates_in_batches(connection, caplog):
+    caplog.set_level(logging.INFO, logger='alembic.online')
+
+    updated = backfill('Item', 'size = length(name)', batch_size=10, pause=0)
+
+    assert updated == 25
+    assert sizes(connection) == [len(f'item {i}') for i in range(1, 26)]
+    progress = [record.getMessage() for record in caplog.records
+                if record.getMessage().startswith('Backfilling')]
+    assert progress == [
+        'Backfilling Item: 40% of key range, 10 rows updated',
+        'Backfilling Item: 80% of key range, 20 rows updated',
+        'Backfilling Item: 100% of key range, 25 rows updated',
+    ]
+
+
+def test_backfill_skips_rows_already_done(connection):
+    connection.execute(sa.text('UPDATE "Item" SET size = 0 WHERE id <= 20'))
+
+    updated = backfill('Item', 'size = length(name)', where='size IS NULL',
+                       batch_size=10, pause=0)
+
+    assert updated == 5
+    assert sizes(connection)[:20] == [0] * 20
+
+
+def test_backfill_of_empty_table(connection):
+    connection.execute(sa.text('DELETE FROM "Item"'))
+
+    assert backfill('Item', 'size = 1', pause=0) == 0
+
+
+def test_index_helpers_fall_back_to_plain_operations(connection):
+    create_index_concurrently('ix_Item_name', 'Item', ['name'])
+    assert 'ix_Item_name' in index_names(connection)
+
+    drop_index_concurrently('ix_Item_name', 'Item')
+    assert 'ix_Item_name' not in index_names(connection)
+
+
+def test_lock_timeout_is_a_no_op_on_sqlite(connection):
+    with lock_timeout('5s'):
+        connection.execute(sa.text('UPDATE "Item" SET size = 1'))
+
+    assert sizes(connection) == [1] * 25
+
+
+class RecordingBind:
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+
+
+def test_lock_timeout_is_transaction_local_on_postgres(monkeypatch):
+    bind = RecordingBind()
+    monkeypatch.setattr(online_migrations, 'is_postgres', lambda: True)
+    monkeypatch.setattr(online_migrations.op, 'get_bind', lambda: bind,
+                        raising=False)
+
+    with pytest.raises(RuntimeError, match='canceling statement'):
+        with lock_timeout('5s'):
+            raise RuntimeError('canceling statement due to lock timeout')
+
+    # set for the transaction only, and nothing run on the failed one
+    assert bind.statements == [(
+        "SELECT set_config('lock_timeout', :timeout, true)",
+        {'timeout': '5s'})]
@@ -0,0 +1,41 @@
+import pytest
+from flaskr import queries
+from flaskr.db import db
+from flaskr.models import Genre, MAX_GENRE_BITS, Venue
+
+
+@pytest.fixture
+def venues(app, monkeypatch):
+    '''Names of venues with genres 1 (Blues), 64 and both'''
+    for kind, cache in queries.search_caches.items():
+        monkeypatch.setitem(queries.search_caches, kind, type(cache)(
+            cache.max_size, cache.ttl))
+    past_mask = Genre(id=MAX_GENRE_BITS + 1, name='Zydeco')
+    blues = db.session.get(Genre, 1)
+    db.session.add_all([
+        Venue(name='Blues Hall', genres=[blues]),
+        Venue(name='Zydeco Hall', genres=[past_mask]),
+        Venue(name='Both Hall', genres=[blues, past_mask]),
+        Venue(name='No Genre Hall'),
+    ])
+    db.session.commit()
+
+
+def names(rows):
+    return sorted(row.name for row in rows)
+
+
+@pytest.mark.parametrize('genre_ids, match_all, expected', [
+    ([1], False, ['Blues Hall', 'Both Hall']),
+    ([64], False, ['Both Hall', 'Zydeco Hall']),
+    ([64], True, ['Both Hall', 'Zydeco Hall']),
+    ([1, 64], False, ['Blues Hall', 'Both Hall', 'Zydeco Hall']),
+    ([1, 64], True, ['Both Hall']),
+    # no venue has it, rather than every venue
+    ([65], True, []),
+    ([65], False, []),
+    ([64, 65], True, []),
+])
+def test_genre_filters(venues, genre_ids, match_all, expected):
+    assert names(queries.search_venues('hall', genre_ids, match_all)) == \
+        expected
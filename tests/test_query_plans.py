@@ -0,0 +1,57 @@
+import os
+import random
+import pytest
+from sqlalchemy import text
+from flaskr import autocomplete, matching, plans, queries
+from flaskr.db import db
+
+# The plans of every checked route on a small seeded catalogue, against
+# the sqlite baseline in query_plans.json. After a change that's meant to
+# alter plans, store new ones with UPDATE_PLAN_BASELINE=1 and review the
+# diff.
+BASELINE = os.path.join(os.path.dirname(__file__), 'query_plans.json')
+
+
+@pytest.fixture
+def planned(app, monkeypatch):
+    '''(captured statements, plans) of every route, on a seeded database'''
+    # scaled down with the catalogue
+    monkeypatch.setitem(app.config, 'PLAN_LARGE_TABLE_ROWS', 100)
+    # start from empty caches, so every route runs its queries
+    monkeypatch.setattr(autocomplete, '_indexes', {})
+    monkeypatch.setattr(matching, '_indexes', {})
+    for cache in queries.search_caches.values():
+        cache.clear()
+    for _ in plans.seed(200, 200, 1000, 500, random.Random(0)):
+        pass
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    captured = plans.route_statements()
+    try:
+        return captured, plans.route_plans(captured)
+    finally:
+        db.session.remove()
+
+
+@pytest.fixture
+def baseline(planned):
+    if os.environ.get('UPDATE_PLAN_BASELINE'):
+        plans.save_baseline(BASELINE, 'sqlite', planned[1])
+    baseline = plans.load_baseline(BASELINE, 'sqlite')
+    assert baseline is not None, f'No sqlite baseline in {BASELINE}'
+    return baseline
+
+
+def test_every_route_is_planned(planned, baseline):
+    captured, route_plans = planned
+
+    assert sorted(route_plans) == sorted(baseline)
+    assert all(statements for statements, _ in captured.values())
+
+
+def test_plans_match_the_baseline(planned, baseline):
+    assert planned[1] == baseline
+
+
+def test_no_plan_regressions(planned, baseline):
+    assert plans.regressions(*planned, baseline) == []
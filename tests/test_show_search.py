@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from flaskr.db import db
+from flaskr.models import Artist, Genre, MAX_GENRE_BITS, Show
+from flaskr.show_search import SearchFilters, search_shows
+
+
+@pytest.fixture
+def shows(app, make_venue):
+    '''Ids of upcoming shows by a blues artist and one past the mask'''
+    venue_id = make_venue()
+    start = datetime.now(pytz.utc) + timedelta(days=7)
+    ids = {}
+    for genre in (db.session.get(Genre, 1),
+                  Genre(id=MAX_GENRE_BITS + 1, name='Zydeco')):
+        show = Show(artist=Artist(name=f'{genre.name} Band', genres=[genre]),
+                    venue_id=venue_id, start_time=start,
+                    end_time=start + timedelta(hours=2))
+        db.session.add(show)
+        db.session.commit()
+        ids[genre.id] = show.id
+    return ids
+
+
+@pytest.mark.parametrize('genre_ids, expected', [
+    ((), [1, 64]),
+    ((1,), [1]),
+    ((64,), [64]),
+    ((1, 64), [1, 64]),
+    ((65,), []),
+])
+def test_genre_filter(shows, genre_ids, expected):
+    rows, _ = search_shows(SearchFilters(genre_ids=genre_ids))
+
+    assert sorted(row.id for row in rows) == \
+        sorted(shows[genre_id] for genre_id in expected)
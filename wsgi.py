@@ -0,0 +1,8 @@
+'''
+Entry point for production servers, e.g.
+
+    gunicorn wsgi:app
+
+which also picks up the settings in gunicorn.conf.py.
+'''
+from flaskr import app